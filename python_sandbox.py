@@ -1,27 +1,46 @@
 from mcp.server.fastmcp import FastMCP
 from sandbox import (
     execute_python_code,
+    enable_kernel,
+    reset_kernel,
+    sandbox_status,
+    new_session_id,
+    admission,
     download_document,
+    download_documents,
     read_word_content,
     edit_word_document,
+    check_word_operations,
     read_excel_content,
     edit_excel_document,
-    get_excel_sheets
+    check_excel_operations,
+    get_excel_sheets,
+    list_versions,
+    checkout_version,
+    run_action
 )
+from sandbox.config import session_path
 
 # Khởi tạo MCP Server
 mcp = FastMCP("Python Sandbox with Storage")
 
 @mcp.tool()
-def python_sandbox(
+async def python_sandbox(
     action: str,
     code: str = None,
     document_url: str = None,
+    documents: list = None,
     filename: str = None,
     session_id: str = None,
     operations: list = None,
     sheet_name: str = None,
-    max_rows: int = 10
+    max_rows: int = 10,
+    offset: int = 0,
+    usecols: str = None,
+    cell_range: str = None,
+    kernel: bool = False,
+    fast_save: bool = False,
+    version: int = None
 ) -> str:
     """
     Unified tool for Python execution and Office document manipulation (Word/Excel) in a sandboxed environment.
@@ -37,10 +56,17 @@ def python_sandbox(
       Use 'edit_word' or 'edit_excel' with 'custom_code' instead to ensure proper file handling, 
       formatting preservation, and consistent session persistence.
     - 'download': Downloads a file from 'document_url'. Optional: 'filename' (defaults to 'document').
+      To fetch several files at once, pass 'documents' instead: a list of
+      {"url": "...", "filename": "..."} (filename defaults to the name in the URL).
+      They are downloaded concurrently into the same session.
     - 'read_word': Extracts text and table info from a Word file in the session.
-    - 'read_excel': Reads an Excel file. Optional: 'sheet_name', 'max_rows' (default 10).
-      Tip: Call 'list_sheets' first to see available sheet names.
-    - 'list_sheets': Lists all sheet names in an Excel file.
+    - 'read_excel': Reads one page of an Excel sheet. Optional: 'sheet_name', 'max_rows' (page size,
+      default 10, at most 500), 'offset' (data rows to skip after the header), 'usecols' (e.g. "A:C,F"
+      or "Name,Age") and 'cell_range' (e.g. "B10:F200"; its first row is used as the header).
+      Rows are labelled with their Excel row numbers and the output ends with the next 'offset'.
+      Tip: Call 'list_sheets' first to see available sheet names and sizes.
+    - 'list_sheets': Lists all sheets in an Excel file with visibility, row/column extents and
+      approximate size, read from workbook metadata only. Use it to pick 'sheet_name' and 'max_rows'.
     - 'edit_word': Modifies a Word file. Requires 'operations' (list of dicts).
         Ops: {"type": "replace", "old": "text", "new": "text"}, 
              {"type": "replace_paragraph", "index": 0, "new_text": "..."},
@@ -48,8 +74,13 @@ def python_sandbox(
              {"type": "insert_heading", "text": "...", "level": 1}, 
              {"type": "delete_paragraph", "keyword": "..."},
              {"type": "custom_code", "code": "..."}
+        Consecutive 'replace' ops are applied together in one pass over body, nested tables,
+        headers and footers; only the matching runs are rewritten, so formatting is kept.
         Tip for 'custom_code': Use 'doc' (python-docx Document object) to modify content.
         The file is automatically saved after all operations.
+      Operations for edit_word/edit_excel are checked against a strict schema first (required
+      fields, types, allowed operators, no unknown fields); if any is invalid nothing runs and
+      the result lists one JSON error per line: {"index", "type", "field", "error"}.
     - 'edit_excel': Modifies an Excel file. Requires 'operations' (list of dicts).
         Ops: {"type": "add_column", "name": "ColumnName", "formula": "ColA * ColB"}, 
              {"type": "filter", "column": "Col", "operator": ">", "value": 10},
@@ -59,7 +90,15 @@ def python_sandbox(
              {"type": "custom_code", "code": "..."}
         Tip for 'custom_code': Use 'wb' (openpyxl workbook) and 'ws' (worksheet) for edits.
         Avoid 'ExcelWriter' or 'to_excel' as they lose formatting. Use 'ws.cell()' instead.
-        Available helpers: 'copy_cell_formatting(src, dst)', 'apply_smart_format(cell, val)'.
+        Available helpers: 'copy_cell_formatting(src, dst)', 'apply_smart_format(cell, val)',
+        'StyleCache().copy(src, dst, number_format)' for formatting many cells at once.
+        'write_frame(ws, df)' appends a DataFrame row by row (much faster than ws.cell loops);
+        'write_frame_file(path, {"Sheet": df})' writes a new xlsx in streaming write-only mode.
+    - 'versions': Lists the version history of the session: every edit_excel/edit_word save is a
+      version (number, parent, file, operations applied, sha256); the original is the first one.
+    - 'checkout': Restores 'version' as the current file (rollback). No container is started.
+    - 'reset_kernel': Clears the kernel of 'session_id' (globals, imports, loaded workbooks).
+    - 'status': Shows scheduler queue depth and wait times, warm pool and kernel state.
              
     SESSION_ID:
     - ALWAYS reuse the 'session_id' returned from previous calls to maintain data persistence 
@@ -72,21 +111,72 @@ def python_sandbox(
     - IMPORTANT: To start a NEW edit from the ORIGINAL document after multiple previous edits, 
       you MUST explicitly specify the original filename (e.g., 'document.docx'). Otherwise, 
       it will keep editing the latest '_edited' version.
+
+    VERSIONS:
+    - Each edit snapshots its result (reflink, or a copy) instead of only overwriting
+      '_edited'. Pass 'version=N' to read_excel/list_sheets/read_word to read an earlier version,
+      or to edit_excel/edit_word to branch from it (the new version's parent is N). Use
+      'checkout' to roll back, no re-download or re-edit needed.
+
+    SAVING:
+    - Edited files are written to a temporary file and renamed into place, so a timeout during
+      save never leaves a corrupted '_edited' file. The result reports save time and file size.
+    - Pass 'fast_save=True' on edits whose '_edited' output will be edited again: it saves with
+      low compression (faster, somewhat larger file). Leave it off for the final edit.
+
+    KERNEL MODE:
+    - Pass 'kernel=True' to bind the session to a long-lived interpreter. Globals, imported
+      modules and loaded workbooks/documents are kept between calls, so chained edits do not
+      reload the file each time. The kernel stops after being idle for a while or when it
+      exceeds its memory limit; use 'reset_kernel' to start over explicitly.
     """
+    if session_id:
+        # session_id là tên thư mục trên host: từ chối trước khi action nào dùng tới nó
+        try:
+            session_path(session_id)
+        except ValueError as e:
+            return f"Lỗi: {str(e)}"
+
+    if kernel:
+        session_id = enable_kernel(session_id)
+
     if action == "execute":
-        return execute_python_code(code, session_id)
+        session_id = session_id or new_session_id()
+        return await run_action(action, execute_python_code, code, session_id, admission=admission(session_id))
     elif action == "download":
-        return download_document(document_url, filename or "document", session_id)
+        if documents:
+            return await run_action(action, download_documents, documents, session_id)
+        return await run_action(action, download_document, document_url, filename or "document", session_id)
     elif action == "read_word":
-        return read_word_content(session_id, filename)
+        return await run_action(action, read_word_content, session_id, filename, version)
     elif action == "read_excel":
-        return read_excel_content(session_id, filename, sheet_name, max_rows)
+        return await run_action(action, read_excel_content, session_id, filename, sheet_name, max_rows,
+                                offset, usecols, cell_range, version)
     elif action == "list_sheets":
-        return get_excel_sheets(session_id, filename)
+        return await run_action(action, get_excel_sheets, session_id, filename, version)
     elif action == "edit_word":
-        return edit_word_document(session_id, operations, filename)
+        # Operations sai trả lỗi ngay, không chờ slot của scheduler
+        errors = check_word_operations(operations)
+        if errors:
+            return errors
+        session_id = session_id or new_session_id()
+        return await run_action(action, edit_word_document, session_id, operations, filename, fast_save,
+                                version, admission=admission(session_id))
     elif action == "edit_excel":
-        return edit_excel_document(session_id, operations, filename, sheet_name)
+        errors = check_excel_operations(operations)
+        if errors:
+            return errors
+        session_id = session_id or new_session_id()
+        return await run_action(action, edit_excel_document, session_id, operations, filename, sheet_name,
+                                fast_save, version, admission=admission(session_id))
+    elif action == "versions":
+        return await run_action(action, list_versions, session_id)
+    elif action == "checkout":
+        return await run_action(action, checkout_version, session_id, version)
+    elif action == "reset_kernel":
+        return await run_action(action, reset_kernel, session_id)
+    elif action == "status":
+        return sandbox_status()
     else:
         return f"Lỗi: Action '{action}' không hợp lệ."
 
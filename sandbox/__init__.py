@@ -1,14 +1,27 @@
-from .executor import execute_python_code
-from .downloader import download_document
-from .office_word import read_word_content, edit_word_document
-from .office_excel import read_excel_content, edit_excel_document, get_excel_sheets
+from .executor import execute_python_code, enable_kernel, reset_kernel, sandbox_status, new_session_id, admission
+from .downloader import download_document, download_documents
+from .dispatcher import run_action
+from .office_word import read_word_content, edit_word_document, check_word_operations
+from .office_excel import read_excel_content, edit_excel_document, get_excel_sheets, check_excel_operations
+from .history import list_versions, checkout_version
 
 __all__ = [
     'execute_python_code',
+    'enable_kernel',
+    'reset_kernel',
+    'sandbox_status',
+    'new_session_id',
+    'admission',
     'download_document',
+    'download_documents',
+    'run_action',
     'read_word_content',
     'edit_word_document',
+    'check_word_operations',
     'read_excel_content',
     'edit_excel_document',
-    'get_excel_sheets'
+    'check_excel_operations',
+    'get_excel_sheets',
+    'list_versions',
+    'checkout_version'
 ]
@@ -1,11 +1,33 @@
 import os
+import re
 import docker
+import certifi
+import urllib3
+import requests
 from minio import Minio
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+def parse_size(value: str) -> int:
+    """Đổi kích thước dạng Docker ("512m", "4g", "1024") sang số byte."""
+    value = str(value).strip().lower()
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+    if value and value[-1] == "b":
+        value = value[:-1]
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+def parse_limits(value: str) -> dict:
+    """Đổi chuỗi "execute=4,read_excel=8" thành dict {action: limit}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        name, _, limit = item.partition("=")
+        limits[name.strip()] = int(limit)
+    return limits
+
 # Docker Client - Tự động tìm Docker socket
 def get_docker_client():
     """Tạo Docker client, tự động tìm socket (Desktop hoặc standard)"""
@@ -27,18 +49,137 @@ MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_SECURE = os.getenv("MINIO_SECURE", "False").lower() == "true"
 BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "python-outputs")
+# Presigned URL có hiệu lực tối đa 7 ngày; được dùng lại cho tới khi còn ít hơn REFRESH_MARGIN giây
+MINIO_URL_EXPIRY_DAYS = int(os.getenv("MINIO_URL_EXPIRY_DAYS", "7"))
+MINIO_URL_REFRESH_MARGIN = int(os.getenv("MINIO_URL_REFRESH_MARGIN", "86400"))
+
+# Upload song song: số file upload cùng lúc, kích thước và số part multipart song song mỗi file
+MINIO_UPLOAD_WORKERS = int(os.getenv("MINIO_UPLOAD_WORKERS", "8"))
+MINIO_PART_SIZE = parse_size(os.getenv("MINIO_PART_SIZE", "16m"))
+MINIO_PART_PARALLELISM = int(os.getenv("MINIO_PART_PARALLELISM", "4"))
+# Retry có backoff cho từng request (từng part) và cho cả file
+MINIO_UPLOAD_RETRIES = int(os.getenv("MINIO_UPLOAD_RETRIES", "3"))
+MINIO_RETRY_BACKOFF = float(os.getenv("MINIO_RETRY_BACKOFF", "0.5"))
 
 MINIO_CLIENT = Minio(
     MINIO_ENDPOINT,
     access_key=MINIO_ACCESS_KEY,
     secret_key=MINIO_SECRET_KEY,
-    secure=MINIO_SECURE
+    secure=MINIO_SECURE,
+    http_client=urllib3.PoolManager(
+        timeout=urllib3.Timeout(connect=30, read=300),
+        maxsize=MINIO_UPLOAD_WORKERS * MINIO_PART_PARALLELISM,
+        cert_reqs='CERT_REQUIRED',
+        ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+        retries=urllib3.Retry(
+            total=MINIO_UPLOAD_RETRIES,
+            backoff_factor=MINIO_RETRY_BACKOFF,
+            status_forcelist=[500, 502, 503, 504]
+        )
+    )
 )
 
 # Workspace Config
 HOST_WORKSPACE_DIR = os.path.join(os.getcwd(), "mcp_workspace")
 if not os.path.exists(HOST_WORKSPACE_DIR):
     os.makedirs(HOST_WORKSPACE_DIR)
+# session_id là tên thư mục ngay dưới HOST_WORKSPACE_DIR (mount vào /app/data): chỉ chữ, số,
+# '_' và '-', để không trỏ được tới thư mục dùng chung (.cache, .pool, .partial) hay ra ngoài
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def session_path(session_id: str) -> str:
+    """Thư mục trên host của session; ValueError nếu session_id không hợp lệ."""
+    if not isinstance(session_id, str) or not SESSION_ID_PATTERN.fullmatch(session_id):
+        raise ValueError(f"session_id {session_id!r} không hợp lệ (chỉ gồm chữ, số, '_' và '-', tối đa 64 ký tự).")
+    return os.path.join(HOST_WORKSPACE_DIR, session_id)
+
+
+# Download Config - tải file theo stream, giới hạn kích thước
+DOWNLOAD_MAX_BYTES = parse_size(os.getenv("DOWNLOAD_MAX_BYTES", "2g"))
+DOWNLOAD_CHUNK_SIZE = parse_size(os.getenv("DOWNLOAD_CHUNK_SIZE", "1m"))
+DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", "10"))
+DOWNLOAD_READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", "30"))
+# Cache file tải về dùng chung giữa các session (0 = tắt); TTL > 0 thì bỏ qua revalidate trong TTL giây
+DOWNLOAD_CACHE_MAX_BYTES = parse_size(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", "10g"))
+DOWNLOAD_CACHE_TTL = float(os.getenv("DOWNLOAD_CACHE_TTL", "0"))
+# Cho phép hardlink khi filesystem không hỗ trợ reflink. Script sửa file tại chỗ sẽ
+# sửa luôn bản trong cache và các session khác, nên mặc định tắt (copy thay thế)
+DOWNLOAD_CACHE_HARDLINK = os.getenv("DOWNLOAD_CACHE_HARDLINK", "False").lower() == "true"
+# Tải nhiều file cùng lúc: số file tải song song và số kết nối tối đa tới cùng một host
+DOWNLOAD_BATCH_WORKERS = int(os.getenv("DOWNLOAD_BATCH_WORKERS", "8"))
+DOWNLOAD_MAX_CONNECTIONS_PER_HOST = int(os.getenv("DOWNLOAD_MAX_CONNECTIONS_PER_HOST", "4"))
+# Tải tiếp bằng Range khi mất kết nối; file lớn trên server hỗ trợ Range được tải song song nhiều đoạn
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "5"))
+DOWNLOAD_RETRY_BACKOFF = float(os.getenv("DOWNLOAD_RETRY_BACKOFF", "1"))
+DOWNLOAD_RANGE_PARTS = int(os.getenv("DOWNLOAD_RANGE_PARTS", "4"))
+DOWNLOAD_RANGE_MIN_SIZE = parse_size(os.getenv("DOWNLOAD_RANGE_MIN_SIZE", "64m"))
+# Khi tải song song, vị trí từng đoạn được ghi vào metadata sau mỗi chừng này byte hoặc giây
+# (và khi đoạn dừng); mất kết nối thì tải lại tối đa phần chưa ghi
+DOWNLOAD_PARTIAL_SAVE_BYTES = parse_size(os.getenv("DOWNLOAD_PARTIAL_SAVE_BYTES", "8m"))
+DOWNLOAD_PARTIAL_SAVE_INTERVAL = float(os.getenv("DOWNLOAD_PARTIAL_SAVE_INTERVAL", "1"))
+# File tải dở không được tải tiếp trong khoảng này (giây) sẽ bị xóa
+DOWNLOAD_PARTIAL_MAX_AGE = float(os.getenv("DOWNLOAD_PARTIAL_MAX_AGE", "86400"))
+
+
+def _http_session() -> requests.Session:
+    """HTTP session dùng chung (keep-alive); pool_block giữ số kết nối mỗi host trong giới hạn."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=DOWNLOAD_BATCH_WORKERS,
+        pool_maxsize=DOWNLOAD_MAX_CONNECTIONS_PER_HOST,
+        pool_block=True
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+HTTP_SESSION = _http_session()
+
+# Sandbox Container Config
+SANDBOX_IMAGE = os.getenv("SANDBOX_IMAGE", "python-sandbox")
+# Tham số cho ENTRYPOINT zygote của image: đường dẫn script cần chạy
+SANDBOX_COMMAND = os.getenv("SANDBOX_COMMAND", "/app/main.py")
+# Danh sách module zygote/kernel import sẵn (mặc định lấy theo image)
+SANDBOX_PRELOAD = os.getenv("SANDBOX_PRELOAD")
+SANDBOX_MEM_LIMIT = os.getenv("SANDBOX_MEM_LIMIT", "4g")
+SANDBOX_CPUS = float(os.getenv("SANDBOX_CPUS", "1"))
+SANDBOX_TIMEOUT = int(os.getenv("SANDBOX_TIMEOUT", "300"))
+
+# Warm Pool Config - container khởi động sẵn, chờ trong vòng lặp ENTRYPOINT
+# SANDBOX_POOL_MIN_SIZE=0 để tắt pool (mỗi lần chạy tạo container mới như trước)
+SANDBOX_POOL_MIN_SIZE = int(os.getenv("SANDBOX_POOL_MIN_SIZE", "2"))
+SANDBOX_POOL_MAX_SIZE = int(os.getenv("SANDBOX_POOL_MAX_SIZE", "8"))
+SANDBOX_POOL_HEALTH_INTERVAL = float(os.getenv("SANDBOX_POOL_HEALTH_INTERVAL", "10"))
+
+# Scheduler Config - ngân sách CPU/bộ nhớ cho các container chạy đồng thời
+# Để trống thì lấy theo Docker daemon (NCPU, 90% MemTotal)
+SANDBOX_SCHEDULER_CPUS = os.getenv("SANDBOX_SCHEDULER_CPUS")
+SANDBOX_SCHEDULER_MEMORY = os.getenv("SANDBOX_SCHEDULER_MEMORY")
+SANDBOX_SCHEDULER_MAX_QUEUE = int(os.getenv("SANDBOX_SCHEDULER_MAX_QUEUE", "32"))
+SANDBOX_SCHEDULER_QUEUE_TIMEOUT = float(os.getenv("SANDBOX_SCHEDULER_QUEUE_TIMEOUT", "120"))
+
+# Async Dispatch Config - các lệnh blocking (Docker, MinIO, HTTP) chạy trên thread pool giới hạn
+SANDBOX_WORKER_THREADS = int(os.getenv("SANDBOX_WORKER_THREADS", "32"))
+# Số lần chạy đồng thời tối đa cho từng action, ví dụ "execute=4,edit_excel=4,download=8"
+SANDBOX_ACTION_LIMITS = parse_limits(os.getenv("SANDBOX_ACTION_LIMITS", ""))
+SANDBOX_DEFAULT_ACTION_LIMIT = int(os.getenv("SANDBOX_DEFAULT_ACTION_LIMIT", "8"))
+
+# Kernel Mode Config - mỗi session một interpreter sống lâu (opt-in bằng kernel=True)
+SANDBOX_KERNEL_MEM_LIMIT = os.getenv("SANDBOX_KERNEL_MEM_LIMIT", SANDBOX_MEM_LIMIT)
+SANDBOX_KERNEL_IDLE_TIMEOUT = float(os.getenv("SANDBOX_KERNEL_IDLE_TIMEOUT", "900"))
+
+# Lưu file edit_excel/edit_word: ghi file tạm rồi đổi tên; mức nén deflate 0-9 của file kết quả.
+# fast_save=True dùng mức FAST (nén ít, ghi nhanh) cho file _edited trung gian trong chuỗi edit
+SANDBOX_SAVE_COMPRESSLEVEL = int(os.getenv("SANDBOX_SAVE_COMPRESSLEVEL", "6"))
+SANDBOX_SAVE_FAST_COMPRESSLEVEL = int(os.getenv("SANDBOX_SAVE_FAST_COMPRESSLEVEL", "1"))
+
+# Fast path cho list_sheets/read_excel/read_word: đọc file ngay trên host thay vì chạy container
+# "worker" = pool process có giới hạn bộ nhớ, "inline" = chạy trong process server, "off" = tắt
+SANDBOX_FAST_READ = os.getenv("SANDBOX_FAST_READ", "worker").lower()
+SANDBOX_FAST_READ_WORKERS = int(os.getenv("SANDBOX_FAST_READ_WORKERS", "2"))
+SANDBOX_FAST_READ_MEM_LIMIT = parse_size(os.getenv("SANDBOX_FAST_READ_MEM_LIMIT", "2g"))
+SANDBOX_FAST_READ_TIMEOUT = float(os.getenv("SANDBOX_FAST_READ_TIMEOUT", "30"))
 
 # Initialize Bucket
 def ensure_bucket_exists():
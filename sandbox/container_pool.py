@@ -0,0 +1,350 @@
+import io
+import os
+import sys
+import time
+import stat
+import uuid
+import shutil
+import atexit
+import tarfile
+import threading
+from collections import deque
+from .config import (
+    client,
+    HOST_WORKSPACE_DIR,
+    SANDBOX_IMAGE,
+    SANDBOX_COMMAND,
+    SANDBOX_MEM_LIMIT,
+    SANDBOX_CPUS,
+    SANDBOX_PRELOAD,
+    SANDBOX_POOL_MIN_SIZE,
+    SANDBOX_POOL_MAX_SIZE,
+    SANDBOX_POOL_HEALTH_INTERVAL,
+    parse_size,
+)
+from .scheduler import SCHEDULER
+
+# Thư mục chứa các "slot" được mount vào container của pool
+POOL_DIR = os.path.join(HOST_WORKSPACE_DIR, ".pool")
+POOL_LABEL = "mcp-sandbox.pool"
+
+
+def start_sandbox_container(data_dir: str, labels: dict = None, **options):
+    """Khởi động container sandbox với `data_dir` được mount vào /app/data.
+
+    Container không có network; zygote (ENTRYPOINT) import sẵn thư viện rồi đứng
+    chờ cho đến khi /app/main.py được nạp vào bằng put_archive. `options` ghi đè tham số mặc định
+    của `containers.run` (entrypoint, mem_limit, environment...).
+    """
+    environment = dict(options.pop("environment", None) or {})
+    if SANDBOX_PRELOAD is not None:
+        environment.setdefault("SANDBOX_PRELOAD", SANDBOX_PRELOAD)
+    run_options = dict(
+        command=SANDBOX_COMMAND,
+        detach=True,
+        network_mode="none",
+        mem_limit=SANDBOX_MEM_LIMIT,
+        nano_cpus=int(SANDBOX_CPUS * 1e9),
+        volumes={data_dir: {'bind': '/app/data', 'mode': 'rw'}},
+        working_dir="/app/data",
+        labels=labels or {},
+        environment=environment,
+        tty=True
+    )
+    run_options.update(options)
+    return client.containers.run(SANDBOX_IMAGE, **run_options)
+
+
+def make_archive(filename: str, content: str) -> io.BytesIO:
+    """Đóng gói một file text thành tar stream để nạp vào container bằng put_archive."""
+    encoded = content.encode('utf-8')
+    tar_stream = io.BytesIO()
+    with tarfile.open(fileobj=tar_stream, mode='w') as tar:
+        tar_info = tarfile.TarInfo(name=filename)
+        tar_info.size = len(encoded)
+        tar.addfile(tar_info, io.BytesIO(encoded))
+    tar_stream.seek(0)
+    return tar_stream
+
+
+def _inside(path: str, root: str) -> bool:
+    """True nếu `path` (sau khi giải symlink của các thư mục cha) vẫn nằm trong `root`."""
+    parent = os.path.realpath(os.path.dirname(path))
+    root = os.path.realpath(root)
+    return parent == root or parent.startswith(root + os.sep)
+
+
+def stage_session(session_dir: str, slot_dir: str) -> dict:
+    """Đưa file của session vào slot bằng hardlink (fallback: copy).
+
+    Chỉ file thường được stage: symlink (script có thể tạo ra để trỏ tới file của host),
+    FIFO, device... bị bỏ qua, và không bao giờ đi theo symlink khi link/copy.
+
+    Returns:
+        Snapshot {relpath: (inode, size, mtime_ns, linked)} của các file đã stage,
+        dùng cho `collect_session` để biết file nào bị script thay đổi.
+    """
+    staged = {}
+    for root, dirs, files in os.walk(session_dir):
+        rel_root = os.path.relpath(root, session_dir)
+        target_root = slot_dir if rel_root == "." else os.path.join(slot_dir, rel_root)
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            src = os.path.join(root, name)
+            dst = os.path.join(target_root, name)
+            try:
+                if not stat.S_ISREG(os.lstat(src).st_mode):
+                    continue
+                try:
+                    os.link(src, dst, follow_symlinks=False)
+                    linked = True
+                except OSError:
+                    shutil.copy2(src, dst, follow_symlinks=False)
+                    linked = False
+                st = os.lstat(dst)
+            except FileNotFoundError:
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                # src bị đổi thành symlink giữa lstat và link/copy
+                os.remove(dst)
+                continue
+            rel = name if rel_root == "." else os.path.join(rel_root, name)
+            staged[rel] = (st.st_ino, st.st_size, st.st_mtime_ns, linked)
+    return staged
+
+
+def collect_session(slot_dir: str, session_dir: str, staged: dict):
+    """Đồng bộ kết quả từ slot về thư mục session sau khi script chạy xong.
+
+    - File hardlink bị sửa tại chỗ đã có sẵn trong session, bỏ qua.
+    - File mới hoặc được ghi lại (inode khác) được chuyển sang session bằng os.replace.
+    - File đã stage nhưng bị script xóa thì cũng bị xóa khỏi session.
+    - Symlink và file đặc biệt do script tạo ra không được chuyển; đích nằm ngoài
+      session (qua thư mục cha là symlink) bị bỏ qua.
+    """
+    seen = set()
+    for root, dirs, files in os.walk(slot_dir):
+        rel_root = os.path.relpath(root, slot_dir)
+        for name in files:
+            rel = name if rel_root == "." else os.path.join(rel_root, name)
+            src = os.path.join(root, name)
+            st = os.lstat(src)
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            seen.add(rel)
+            before = staged.get(rel)
+            if before and before[0] == st.st_ino:
+                if before[3] or (before[1], before[2]) == (st.st_size, st.st_mtime_ns):
+                    continue
+            dst = os.path.join(session_dir, rel)
+            if not _inside(dst, session_dir):
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.replace(src, dst)
+
+    for rel in staged:
+        if rel not in seen:
+            path = os.path.join(session_dir, rel)
+            if not _inside(path, session_dir):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class PooledContainer:
+    """Một container đã khởi động sẵn cùng thư mục slot được mount vào /app/data."""
+
+    def __init__(self, container, slot_dir: str, reservation=None):
+        self.container = container
+        self.slot_dir = slot_dir
+        # Bộ nhớ giữ trong scheduler khi container còn rảnh; trả lại lúc checkout
+        # (lần chạy đã có slot riêng) hoặc khi scheduler thu hồi để nhường cho lần chạy khác
+        self.reservation = reservation
+        self.created_at = time.monotonic()
+        self.staged = {}
+
+    def attach(self, session_dir: str):
+        """Gắn session vào container khi checkout."""
+        self.staged = stage_session(session_dir, self.slot_dir)
+
+    def collect(self, session_dir: str):
+        """Trả kết quả của lần chạy về thư mục session."""
+        collect_session(self.slot_dir, session_dir, self.staged)
+
+
+class ContainerPool:
+    """Pool container sandbox khởi động sẵn, mỗi container chỉ dùng một lần.
+
+    Thread nền giữ số container rảnh ở mức `target` (từ min_size, tăng dần tới
+    max_size khi checkout bị hụt), đồng thời kiểm tra sức khỏe container rảnh.
+    Mỗi container rảnh (hoặc đang khởi động) giữ `SANDBOX_MEM_LIMIT` trong ngân sách
+    của scheduler: pool chỉ lớn thêm khi còn ngân sách, và bị thu nhỏ khi lần chạy
+    đang chờ cần chỗ.
+    """
+
+    def __init__(self, min_size: int, max_size: int, health_interval: float):
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.health_interval = health_interval
+        self._target = min_size
+        self._idle = deque()
+        self._starting = 0
+        self._hits = 0
+        self._misses = 0
+        self._preempted = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        os.makedirs(POOL_DIR, exist_ok=True)
+        self._thread = threading.Thread(target=self._refill_loop, name="sandbox-pool", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def checkout(self, session_dir: str):
+        """Lấy một container rảnh và gắn session vào. Trả về None nếu pool đang trống."""
+        with self._lock:
+            pooled = self._idle.popleft() if self._idle else None
+            if pooled:
+                self._hits += 1
+            else:
+                self._misses += 1
+                self._target = min(self._target + 1, self.max_size)
+        self._wakeup.set()
+        if pooled:
+            SCHEDULER.release(pooled.reservation)
+            try:
+                pooled.attach(session_dir)
+            except Exception:
+                self._discard(pooled)
+                raise
+        return pooled
+
+    def release(self, pooled: PooledContainer):
+        """Hủy container sau một lần dùng; thread nền sẽ bù container mới."""
+        self._discard(pooled)
+        self._wakeup.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "starting": self._starting,
+                "target": self._target,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "preempted": self._preempted,
+            }
+
+    def _refill_loop(self):
+        while not self._stopped.is_set():
+            self._check_health()
+            while not self._stopped.is_set():
+                with self._lock:
+                    if len(self._idle) + self._starting >= self._target:
+                        break
+                    self._starting += 1
+                # Không gọi scheduler khi đang giữ self._lock (on_preempt chạy dưới lock của scheduler)
+                reservation = SCHEDULER.reserve(None, 0, parse_size(SANDBOX_MEM_LIMIT), self._on_preempt)
+                if reservation is None:
+                    # Hết ngân sách hoặc đang có lần chạy chờ: để dành chỗ cho chúng
+                    with self._lock:
+                        self._starting -= 1
+                    break
+                try:
+                    pooled = self._spawn(reservation)
+                except Exception as e:
+                    print(f"[sandbox-pool] Không thể khởi động container: {e}", file=sys.stderr)
+                    SCHEDULER.release(reservation)
+                    pooled = None
+                with self._lock:
+                    self._starting -= 1
+                    # reservation.released: bị thu hồi trong lúc khởi động
+                    if pooled and not self._stopped.is_set() and not reservation.released:
+                        self._idle.append(pooled)
+                        pooled = None
+                if pooled:
+                    self._discard(pooled)
+                    break
+                if self._stopped.is_set():
+                    break
+            self._wakeup.wait(self.health_interval)
+            self._wakeup.clear()
+
+    def _on_preempt(self, reservation):
+        """Scheduler thu hồi bộ nhớ của một container rảnh: hủy container đó ở thread nền."""
+        with self._lock:
+            pooled = next((p for p in self._idle if p.reservation is reservation), None)
+            if pooled is None:
+                # Đang khởi động (sẽ bị hủy khi xong) hoặc vừa được checkout
+                return
+            self._idle.remove(pooled)
+            self._preempted += 1
+        threading.Thread(target=self._discard, args=(pooled,), name="sandbox-pool-discard", daemon=True).start()
+
+    def _spawn(self, reservation) -> PooledContainer:
+        slot_dir = os.path.join(POOL_DIR, uuid.uuid4().hex[:12])
+        os.makedirs(slot_dir)
+        try:
+            container = start_sandbox_container(slot_dir, labels={POOL_LABEL: "1"})
+        except Exception:
+            shutil.rmtree(slot_dir, ignore_errors=True)
+            raise
+        return PooledContainer(container, slot_dir, reservation)
+
+    def _check_health(self):
+        """Loại container rảnh đã chết và thu nhỏ pool về min_size khi không có tải."""
+        with self._lock:
+            idle = list(self._idle)
+        unhealthy = []
+        for pooled in idle:
+            try:
+                pooled.container.reload()
+                if pooled.container.status != "running":
+                    unhealthy.append(pooled)
+            except Exception:
+                unhealthy.append(pooled)
+
+        surplus = []
+        with self._lock:
+            for pooled in unhealthy:
+                if pooled in self._idle:
+                    self._idle.remove(pooled)
+            if len(self._idle) >= self._target and self._target > self.min_size:
+                self._target -= 1
+                if len(self._idle) > self._target:
+                    surplus.append(self._idle.pop())
+        for pooled in unhealthy + surplus:
+            self._discard(pooled)
+
+    def _discard(self, pooled: PooledContainer):
+        if pooled.reservation is not None:
+            SCHEDULER.release(pooled.reservation)
+        try:
+            pooled.container.remove(force=True)
+        except Exception:
+            pass
+        shutil.rmtree(pooled.slot_dir, ignore_errors=True)
+
+
+CONTAINER_POOL = None
+if SANDBOX_POOL_MIN_SIZE > 0:
+    CONTAINER_POOL = ContainerPool(SANDBOX_POOL_MIN_SIZE, SANDBOX_POOL_MAX_SIZE, SANDBOX_POOL_HEALTH_INTERVAL)
+    CONTAINER_POOL.start()
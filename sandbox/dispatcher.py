@@ -0,0 +1,51 @@
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from .config import SANDBOX_WORKER_THREADS, SANDBOX_ACTION_LIMITS, SANDBOX_DEFAULT_ACTION_LIMIT
+from .scheduler import SCHEDULER, ADMITTED, AdmissionError
+
+# Thread pool dùng chung cho mọi lệnh blocking (Docker, MinIO, HTTP...)
+_EXECUTOR = ThreadPoolExecutor(max_workers=SANDBOX_WORKER_THREADS, thread_name_prefix="sandbox-worker")
+_SEMAPHORES = {}
+
+
+def _semaphore(action: str) -> asyncio.Semaphore:
+    if action not in _SEMAPHORES:
+        limit = SANDBOX_ACTION_LIMITS.get(action, SANDBOX_DEFAULT_ACTION_LIMIT)
+        _SEMAPHORES[action] = asyncio.Semaphore(limit)
+    return _SEMAPHORES[action]
+
+
+async def run_action(action: str, func, *args, admission: tuple = None, **kwargs):
+    """Chạy hàm blocking `func` của một action mà không chặn event loop.
+
+    Mỗi action có giới hạn số lần chạy đồng thời riêng (SANDBOX_ACTION_LIMITS),
+    phần việc blocking được đẩy sang thread pool chung có kích thước cố định.
+
+    Args:
+        admission: (session_id, cpus, memory, priority) của action chạy container: slot của
+            scheduler được chờ ngay trên event loop, thread pool chỉ nhận việc khi đã có slot
+    """
+    async with _semaphore(action):
+        ticket = None
+        if admission:
+            try:
+                ticket = await SCHEDULER.acquire_async(*admission)
+            except AdmissionError as e:
+                return f"Error (Session ID: {admission[0]}): {str(e)}"
+        context = contextvars.copy_context()
+        context.run(ADMITTED.set, ticket)
+        loop = asyncio.get_running_loop()
+        job = loop.run_in_executor(_EXECUTOR, functools.partial(context.run, _run_admitted, ticket, func,
+                                                                *args, **kwargs))
+        # Slot chỉ được trả khi container đã chạy xong: request bị hủy không được hủy job đang giữ slot
+        return await (asyncio.shield(job) if ticket else job)
+
+
+def _run_admitted(ticket, func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if ticket:
+            SCHEDULER.release(ticket)
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from collections import Counter
+from .config import (
+    HOST_WORKSPACE_DIR,
+    DOWNLOAD_CACHE_MAX_BYTES,
+    DOWNLOAD_CACHE_TTL,
+    DOWNLOAD_CACHE_HARDLINK,
+)
+from sandbox_runtime.files import clone_file
+from .storage import file_sha256
+
+CACHE_DIR = os.path.join(HOST_WORKSPACE_DIR, ".cache")
+
+
+class DownloadCache:
+    """Kho file tải về dùng chung giữa các session, định danh theo sha256 nội dung.
+
+    index.json lưu:
+    - urls: {url: {sha256, etag, last_modified, checked}} để revalidate có điều kiện
+    - objects: {sha256: {size, mtime_ns, last_access}} để kiểm tra và xóa theo LRU
+
+    File trong session được tạo bằng reflink tới object (hoặc hardlink nếu bật
+    `hardlink`, không thì copy). Nếu object bị sửa tại chỗ qua một hardlink
+    (mtime/size khác với lúc lưu), object bị loại bỏ. Object đang được clone vào
+    session được ghim (`_pins`) để `_evict` không xóa nó giữa chừng, và bản trong
+    session được kiểm tra lại sha256 (size/mtime có thể bị giả lại bằng os.utime).
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, ttl: float, hardlink: bool = False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hardlink = hardlink
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.tmp_dir = os.path.join(cache_dir, "tmp")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+        self._pins = Counter()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._index = self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def lookup(self, url: str):
+        """Trả về entry của URL nếu object tương ứng còn nguyên vẹn, ngược lại None."""
+        with self._lock:
+            entry = self._index["urls"].get(url)
+            if not entry:
+                return None
+            if not self._object_valid(entry["sha256"]):
+                self._drop_object(entry["sha256"])
+                self._save_index()
+                return None
+            return dict(entry)
+
+    def is_fresh(self, entry: dict) -> bool:
+        """Entry vừa được kiểm tra trong DOWNLOAD_CACHE_TTL giây: dùng luôn, không cần hỏi server."""
+        return self.ttl > 0 and time.time() - entry.get("checked", 0) < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def new_temp_file(self) -> str:
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix=".part")
+        os.close(fd)
+        return tmp_path
+
+    def store(self, url: str, tmp_path: str, sha256: str, response_headers, target_path: str):
+        """Đưa file đã tải xong vào kho, ghi nhớ validator (ETag/Last-Modified) của URL
+        và tạo `target_path` từ object (object được ghim từ lúc lưu tới khi clone xong)."""
+        path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            if self._object_valid(sha256):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+                st = os.stat(path)
+                self._index["objects"][sha256] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            self._index["urls"][url] = {
+                "sha256": sha256,
+                "etag": response_headers.get("ETag"),
+                "last_modified": response_headers.get("Last-Modified"),
+                "checked": time.time(),
+            }
+            self._index["objects"][sha256]["last_access"] = time.time()
+            self._pins[sha256] += 1
+            self._evict()
+            self._save_index()
+        self._clone_pinned(sha256, target_path)
+
+    def revalidated(self, url: str):
+        """Server trả 304: đánh dấu URL vừa được kiểm tra."""
+        with self._lock:
+            entry = self._index["urls"].get(url)
+            if entry:
+                entry["checked"] = time.time()
+                self._save_index()
+
+    def materialize(self, sha256: str, target_path: str) -> bool:
+        """Tạo file trong session từ object trong kho (reflink/hardlink gần như không tốn chi phí).
+
+        Returns:
+            False nếu object không còn trong kho (đã bị evict hoặc bị sửa), khi đó phải tải lại.
+        """
+        with self._lock:
+            if not self._object_valid(sha256):
+                return False
+            self._index["objects"][sha256]["last_access"] = time.time()
+            self._pins[sha256] += 1
+            self._save_index()
+        self._clone_pinned(sha256, target_path)
+        if file_sha256(target_path) != sha256:
+            os.remove(target_path)
+            with self._lock:
+                self._drop_object(sha256)
+                self._save_index()
+            return False
+        return True
+
+    def _clone_pinned(self, sha256: str, target_path: str):
+        try:
+            clone_file(self.object_path(sha256), target_path, self.hardlink)
+        finally:
+            with self._lock:
+                self._pins[sha256] -= 1
+                if not self._pins[sha256]:
+                    del self._pins[sha256]
+
+    def _object_valid(self, sha256: str) -> bool:
+        meta = self._index["objects"].get(sha256)
+        if not meta:
+            return False
+        try:
+            st = os.stat(self.object_path(sha256))
+        except OSError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == (meta["size"], meta["mtime_ns"])
+
+    def _drop_object(self, sha256: str):
+        self._index["objects"].pop(sha256, None)
+        for url in [u for u, e in self._index["urls"].items() if e["sha256"] == sha256]:
+            del self._index["urls"][url]
+        try:
+            os.remove(self.object_path(sha256))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Xóa object ít dùng nhất (trừ object đang ghim) cho tới khi tổng dung lượng không vượt max_bytes."""
+        objects = self._index["objects"]
+        total = sum(meta["size"] for meta in objects.values())
+        for sha256 in sorted(objects, key=lambda h: objects[h].get("last_access", 0)):
+            if total <= self.max_bytes:
+                break
+            if self._pins[sha256]:
+                continue
+            total -= objects[sha256]["size"]
+            self._drop_object(sha256)
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            index.setdefault("urls", {})
+            index.setdefault("objects", {})
+            return index
+        except (OSError, ValueError):
+            return {"urls": {}, "objects": {}}
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+
+DOWNLOAD_CACHE = DownloadCache(CACHE_DIR, DOWNLOAD_CACHE_MAX_BYTES, DOWNLOAD_CACHE_TTL, DOWNLOAD_CACHE_HARDLINK)
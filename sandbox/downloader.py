@@ -1,25 +1,142 @@
 import os
+import time
 import uuid
-import requests
-from .config import HOST_WORKSPACE_DIR
+from concurrent.futures import ThreadPoolExecutor
+from .config import (
+    DOWNLOAD_BATCH_WORKERS,
+    session_path,
+)
+from .storage import register_inputs, file_sha256
+from .download_cache import DOWNLOAD_CACHE
+from .resumable import fetch_to_file, format_size
 
-def download_document(document_url: str, filename: str = "document", session_id: str = None) -> str:
-    """Tải tài liệu từ link."""
+# Thread pool cho action download nhiều file; số kết nối mỗi host do HTTP_SESSION giới hạn
+_BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=DOWNLOAD_BATCH_WORKERS, thread_name_prefix="download")
+
+
+def _fetch(document_url: str, document_path: str) -> int:
+    """Tải thẳng vào session theo stream, không giữ toàn bộ nội dung trong bộ nhớ."""
+    _, size, _ = fetch_to_file(document_url, document_path)
+    return size
+
+
+def _fetch_cached(document_url: str, document_path: str):
+    """Tải qua DOWNLOAD_CACHE: dùng lại object đã có (revalidate bằng ETag/Last-Modified).
+
+    Returns:
+        (số byte, True nếu lấy từ cache)
+    """
+    entry = DOWNLOAD_CACHE.lookup(document_url)
+    if entry and DOWNLOAD_CACHE.is_fresh(entry):
+        if DOWNLOAD_CACHE.materialize(entry["sha256"], document_path):
+            return os.path.getsize(document_path), True
+        entry = None
+
+    tmp_path = DOWNLOAD_CACHE.new_temp_file()
+    try:
+        status, size, headers = fetch_to_file(document_url, tmp_path, DOWNLOAD_CACHE.conditional_headers(entry))
+        if status == 304:
+            if not entry:
+                raise ValueError("Server trả về 304 Not Modified cho request không có điều kiện.")
+            os.remove(tmp_path)
+            DOWNLOAD_CACHE.revalidated(document_url)
+            if DOWNLOAD_CACHE.materialize(entry["sha256"], document_path):
+                return os.path.getsize(document_path), True
+            # Object bị evict ngay sau khi revalidate (URL cũng bị xóa khỏi index): tải lại không điều kiện
+            return _fetch_cached(document_url, document_path)
+
+        sha256 = file_sha256(tmp_path)
+        DOWNLOAD_CACHE.store(document_url, tmp_path, sha256, headers, document_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size, False
+
+
+def _download_to(document_url: str, document_path: str) -> str:
+    """Tải một file vào `document_path`, trả về mô tả ngắn (dung lượng, thời gian, tốc độ)."""
+    start = time.monotonic()
+    if DOWNLOAD_CACHE.enabled:
+        size, cached = _fetch_cached(document_url, document_path)
+    else:
+        size, cached = _fetch(document_url, document_path), False
+    elapsed = max(time.monotonic() - start, 1e-6)
+    source = "lấy từ cache" if cached else f"{format_size(size / elapsed)}/s"
+    return f"{format_size(size)} trong {elapsed:.2f}s, {source}"
+
+
+def _session_dir(session_id: str):
     if not session_id:
         session_id = str(uuid.uuid4())[:8]
-    session_dir = os.path.join(HOST_WORKSPACE_DIR, session_id)
+    session_dir = session_path(session_id)
     os.makedirs(session_dir, exist_ok=True)
+    return session_id, session_dir
+
+
+def download_document(document_url: str, filename: str = "document", session_id: str = None) -> str:
+    """Tải tài liệu từ link."""
+    session_id, session_dir = _session_dir(session_id)
 
     try:
-        response = requests.get(document_url, timeout=30)
-        response.raise_for_status()
-        
-        # Lưu file
-        document_path = os.path.join(session_dir, filename)
-        with open(document_path, "wb") as f:
-            f.write(response.content)
-        
-        return f"Tải thành công! File đã lưu tại '/app/data/{filename}'.\n\nQUAN TRỌNG: Hãy sử dụng session_id='{session_id}' cho các lần gọi tiếp theo."
+        summary = _download_to(document_url, os.path.join(session_dir, filename))
+        register_inputs(session_dir, [filename])
+
+        return (
+            f"Tải thành công! File đã lưu tại '/app/data/{filename}' ({summary})."
+            f"\n\nQUAN TRỌNG: Hãy sử dụng session_id='{session_id}' cho các lần gọi tiếp theo."
+        )
+
+    except Exception as e:
+        return f"Lỗi tải file (Session ID: {session_id}): {str(e)}"
 
+
+def download_documents(documents: list, session_id: str = None) -> str:
+    """Tải nhiều tài liệu cùng lúc vào một session.
+
+    Args:
+        documents: Danh sách {"url": ..., "filename": ...} hoặc URL; filename mặc định là tên file trong URL
+
+    Các file được tải song song; mỗi file thành công hay lỗi độc lập với nhau.
+    """
+    session_id, session_dir = _session_dir(session_id)
+
+    try:
+        items = []
+        for i, doc in enumerate(documents or []):
+            if isinstance(doc, str):
+                doc = {"url": doc}
+            url = doc.get("url") or doc.get("document_url")
+            if not url:
+                raise ValueError(f"documents[{i}] thiếu 'url'.")
+            filename = doc.get("filename") or os.path.basename(url.split("?", 1)[0]) or f"document_{i + 1}"
+            items.append((url, filename))
+        if not items:
+            raise ValueError("'documents' không được rỗng.")
+        filenames = [filename for _, filename in items]
+        duplicates = sorted({f for f in filenames if filenames.count(f) > 1})
+        if duplicates:
+            raise ValueError(f"Trùng tên file: {', '.join(duplicates)}. Hãy đặt 'filename' khác nhau.")
     except Exception as e:
         return f"Lỗi tải file (Session ID: {session_id}): {str(e)}"
+
+    start = time.monotonic()
+    futures = [
+        (filename, _BATCH_EXECUTOR.submit(_download_to, url, os.path.join(session_dir, filename)))
+        for url, filename in items
+    ]
+    lines, done = [], []
+    for filename, future in futures:
+        try:
+            lines.append(f"- '/app/data/{filename}' ({future.result()})")
+            done.append(filename)
+        except Exception as e:
+            lines.append(f"- '{filename}': Lỗi: {str(e)}")
+    if done:
+        register_inputs(session_dir, done)
+    elapsed = time.monotonic() - start
+
+    return (
+        f"Đã tải {len(done)}/{len(items)} file trong {elapsed:.2f}s:\n" + "\n".join(lines) +
+        f"\n\nQUAN TRỌNG: Hãy sử dụng session_id='{session_id}' cho các lần gọi tiếp theo."
+    )
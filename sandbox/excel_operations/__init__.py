@@ -1,10 +1,22 @@
 """Excel operations module for handling various Excel document operations."""
 
+from . import cell, column, custom, filter, row, summary
 from .column import add_column_operation
 from .filter import filter_operation
 from .cell import update_cell_operation
 from .row import add_row_operation, delete_rows_operation
 from .summary import create_summary_operation
+from .custom import custom_code_operation
+
+# Schema của mọi operation Excel, kiểm tra trên host trước khi gửi plan vào sandbox
+SCHEMAS = {
+    **cell.SCHEMA,
+    **column.SCHEMA,
+    **filter.SCHEMA,
+    **row.SCHEMA,
+    **summary.SCHEMA,
+    **custom.SCHEMA,
+}
 
 __all__ = [
     'add_column_operation',
@@ -13,4 +25,6 @@ __all__ = [
     'add_row_operation',
     'delete_rows_operation',
     'create_summary_operation',
+    'custom_code_operation',
+    'SCHEMAS',
 ]
@@ -0,0 +1,24 @@
+SCHEMA = {
+    'custom_code': {
+        'code': {'type': str, 'required': True, 'nonempty': True},
+    },
+}
+
+# Pattern làm mất định dạng khi dùng trong custom_code
+BAD_PATTERNS = {'ExcelWriter': 'LOST FORMAT', 'writer.book': 'CAUSE ERROR', 'to_excel': 'LOST FORMAT'}
+
+
+def custom_code_operation(op: dict) -> dict:
+    """Tạo bước plan chạy code Python tùy ý (có wb, ws, df và các helper định dạng).
+    
+    Args:
+        op: Dictionary chứa 'code'
+    """
+    custom_code = op.get('code') or ''
+    # VALIDATION: Phát hiện pattern nguy hiểm làm mất định dạng
+    warnings = [f"{p}: {m}" for p, m in BAD_PATTERNS.items() if p in custom_code]
+    return {
+        'type': 'custom_code',
+        'code': custom_code,
+        'warnings': warnings,
+    }
@@ -0,0 +1,89 @@
+# Operation chỉ sửa ô của sheet đang edit, không đụng tới df
+WORKSHEET_OPERATIONS = {'update_cell', 'update_cells', 'add_row', 'delete_rows'}
+# Operation chỉ đọc df (snapshot của sheet lúc bắt đầu edit) và ghi ra sheet mới
+FRAME_READ_OPERATIONS = {'filter', 'create_summary'}
+
+
+def _is_barrier(step: dict) -> bool:
+    """True nếu operation sửa ô không được dời qua filter/create_summary.
+
+    filter chép định dạng header/body cho sheet mới từ dòng 1-2 của sheet đang edit,
+    nên operation có thể đụng tới dòng 1-2 phải giữ nguyên thứ tự: update_cell ở dòng
+    1-2, add_row (chèn dòng làm dịch dòng 2, hoặc thêm vào cuối sheet chỉ có header)
+    và delete_rows (không biết trước dòng nào bị xóa).
+    """
+    if step['type'] == 'update_cell':
+        rows = [step.get('row')]
+    elif step['type'] == 'update_cells':
+        rows = [cell.get('row') for cell in step.get('cells') or []]
+    else:
+        return True
+    return any(not isinstance(row, int) or row <= 2 for row in rows)
+
+
+def _reorder(steps: list) -> list:
+    """Dời filter/create_summary ra sau các operation chỉ sửa ô trong cùng một đoạn.
+
+    Hai nhóm này độc lập với nhau (df không đổi khi ô bị sửa, filter chỉ đọc định
+    dạng của dòng 1-2), nên gom các operation sửa ô từ dòng 3 trở đi lại cạnh nhau để
+    gộp được. Các operation khác (add_column sửa df, custom_code, type lạ) và các
+    operation sửa ô có thể đụng dòng 1-2 (xem _is_barrier) là ranh giới, không có gì
+    bị dời qua chúng.
+    """
+    ordered, cells, readers = [], [], []
+    for step in steps:
+        if step['type'] in WORKSHEET_OPERATIONS and not _is_barrier(step):
+            cells.append(step)
+        elif step['type'] in FRAME_READ_OPERATIONS:
+            readers.append(step)
+        else:
+            ordered += cells + readers + [step]
+            cells, readers = [], []
+    return ordered + cells + readers
+
+
+def _fuse(steps: list) -> list:
+    """Gộp các update_cell liền nhau thành một update_cells, các delete_rows liền nhau thành một lần xóa."""
+    fused = []
+    for step in steps:
+        last = fused[-1] if fused else None
+        if step['type'] == 'update_cell':
+            cell = {k: step.get(k) for k in ('row', 'column', 'value')}
+            if last and last['type'] == 'update_cells':
+                last['cells'].append(cell)
+            else:
+                fused.append({'type': 'update_cells', 'cells': [cell]})
+        elif step['type'] == 'delete_rows':
+            # Xóa theo điều kiện A rồi theo B = xóa một lần các dòng khớp A hoặc B
+            condition = {k: step.get(k) for k in ('column', 'value')}
+            if last and last['type'] == 'delete_rows':
+                last['conditions'].append(condition)
+            else:
+                fused.append({'type': 'delete_rows', 'conditions': [condition]})
+        else:
+            fused.append(step)
+    return fused
+
+
+def optimize_plan(steps: list) -> list:
+    """Sắp xếp lại và gộp các bước plan để sheet được duyệt ít lần nhất; kết quả giống chạy tuần tự."""
+    return _fuse(_reorder(steps))
+
+
+def describe_step(step: dict) -> str:
+    """Mô tả ngắn một bước plan (in ra ở đầu kết quả edit)."""
+    op_type = step.get('type')
+    if op_type == 'update_cells':
+        return f"update_cells x{len(step['cells'])}"
+    if op_type == 'delete_rows':
+        conditions = ", ".join(f"{c['column']} = {c['value']!r}" for c in step['conditions'])
+        return f"delete_rows where {conditions}"
+    if op_type == 'filter':
+        return f"filter {step.get('column')} {step.get('operator')} {step.get('value')!r}"
+    if op_type == 'add_column':
+        return f"add_column {step.get('name')} = {step.get('formula')}"
+    if op_type == 'add_row':
+        return f"add_row at {step.get('position') or 'end'}"
+    if op_type == 'create_summary':
+        return f"create_summary -> {step.get('sheet_name')}"
+    return str(op_type)
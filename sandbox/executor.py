@@ -1,72 +1,170 @@
 import os
-import io
+import json
 import uuid
-import tarfile
-from .config import client, MINIO_CLIENT, BUCKET_NAME, HOST_WORKSPACE_DIR
+from .config import (
+    SANDBOX_TIMEOUT,
+    SANDBOX_CPUS,
+    SANDBOX_MEM_LIMIT,
+    parse_size,
+    session_path,
+)
+from .container_pool import CONTAINER_POOL, start_sandbox_container, make_archive
+from .kernel_manager import KERNEL_MANAGER
+from .scheduler import SCHEDULER, PRIORITY_NORMAL
+from .storage import OutputSync, sync_session_outputs
 
-def execute_python_code(code: str, session_id: str = None) -> str:
-    """Thực thi code Python."""
+# Helper cho kernel mode: trong kernel, `kernel_take`/`kernel_put` giữ lại object
+# (wb, doc...) giữa các lần gọi; khi chạy container thường thì không cache gì.
+KERNEL_CACHE_FUNC = '''
+kernel_take = globals().get('kernel_take') or (lambda path: None)
+kernel_put = globals().get('kernel_put') or (lambda path, obj: None)
+'''
+
+# Dòng thống kê thời gian khởi động do zygote in ra cuối log (sandbox_runtime/zygote.py)
+ZYGOTE_MARKER = "[zygote] "
+
+def execute_python_code(code: str, session_id: str = None, priority: int = PRIORITY_NORMAL) -> str:
+    """Thực thi code Python.
+
+    Args:
+        code: Code Python cần chạy
+        session_id: ID của session (tạo mới nếu không có)
+        priority: Độ ưu tiên trong hàng đợi của scheduler (PRIORITY_HIGH cho action chỉ đọc)
+    """
     container = None
+    pooled = None
     if not session_id:
-        session_id = str(uuid.uuid4())[:8]
-    session_dir = os.path.join(HOST_WORKSPACE_DIR, session_id)
+        session_id = new_session_id()
+    session_dir = session_path(session_id)
     os.makedirs(session_dir, exist_ok=True)
 
     try:
-        # Cấu hình Volume: Map thư mục riêng của lần chạy này vào container
-        volume_config = {
-            session_dir: {'bind': '/app/data', 'mode': 'rw'}
-        }
-
-        # Chạy container với Volume được mount
-        container = client.containers.run(
-            "python-sandbox",
-            command="python /app/main.py",
-            detach=True,
-            network_mode="none",
-            mem_limit="4g",
-            volumes=volume_config, # <--- ĐIỂM QUAN TRỌNG NHẤT
-            working_dir="/app/data",
-            tty=True
-        )
-
-        # (Phần nạp code giống như trước)
-        encoded_code = code.encode('utf-8')
-        tar_stream = io.BytesIO()
-        with tarfile.open(fileobj=tar_stream, mode='w') as tar:
-            tar_info = tarfile.TarInfo(name='main.py')
-            tar_info.size = len(encoded_code)
-            tar.addfile(tar_info, io.BytesIO(encoded_code))
-        tar_stream.seek(0)
-        container.put_archive("/app", tar_stream)
-
-        # Chờ kết quả
-        exit_code = container.wait(timeout=300)
-        logs = container.logs().decode("utf-8")
-        
-        # Upload các file sinh ra lên MinIO
-        minio_paths = []
-        for filename in os.listdir(session_dir):
-            file_path = os.path.join(session_dir, filename)
-            if os.path.isfile(file_path) and filename != "document":
-                object_name = f"{session_id}/{filename}"
-                MINIO_CLIENT.fput_object(BUCKET_NAME, object_name, file_path)
-                
-                # Tạo URL tải về (có hiệu lực trong 7 ngày)
-                download_url = MINIO_CLIENT.presigned_get_object(
-                    BUCKET_NAME, 
-                    object_name
-                )
-                minio_paths.append({"filename": filename, "url": download_url})
-
-        return f"[Session ID: {session_id}]\nExit Code: {exit_code['StatusCode']}\nOutput:\n{logs}\n\nDownload Links: {minio_paths}"
+        if KERNEL_MANAGER.is_enabled(session_id):
+            # Kernel mode: chạy trong interpreter sống lâu của session
+            with SCHEDULER.slot(session_id, *run_budget(session_id), priority):
+                status_code, logs = KERNEL_MANAGER.run(session_id, session_dir, code)
+            # Chỉ upload file mới/thay đổi, dùng lại presigned URL còn hạn
+            minio_paths = sync_session_outputs(session_id, session_dir)
+            return _format_result(session_id, status_code, logs, minio_paths)
+
+        # Chỉ chạy khi scheduler còn đủ ngân sách CPU/bộ nhớ cho thêm một container
+        with SCHEDULER.slot(session_id, *run_budget(session_id), priority):
+            # Ưu tiên container khởi động sẵn trong pool, file session được gắn vào slot của nó.
+            # Pool trống thì chạy container mới với thư mục session được mount trực tiếp.
+            if CONTAINER_POOL:
+                pooled = CONTAINER_POOL.checkout(session_dir)
+            if pooled:
+                container = pooled.container
+            else:
+                container = start_sandbox_container(session_dir)
+
+            # Nạp code vào container, ENTRYPOINT sẽ chạy ngay khi thấy /app/main.py
+            container.put_archive("/app", make_archive('main.py', code))
+
+            # Chờ kết quả
+            exit_code = None
+            try:
+                exit_code = container.wait(timeout=SANDBOX_TIMEOUT)
+            finally:
+                if pooled:
+                    # Kể cả khi timeout/lỗi: dừng script rồi mới thu kết quả về session;
+                    # slot bị xóa cùng container khi release nên không lọt sang lần chạy sau
+                    if exit_code is None:
+                        try:
+                            container.kill()
+                        except Exception:
+                            pass
+                    pooled.collect(session_dir)
+
+        # Upload file mới/thay đổi lên MinIO song song với việc lấy log
+        with OutputSync(session_id, session_dir) as sync:
+            logs = container.logs().decode("utf-8")
+
+        return _format_result(session_id, exit_code['StatusCode'], logs, sync.links)
 
     except Exception as e:
         return f"Error (Session ID: {session_id}): {str(e)}"
     
     finally:
-        if container:
+        if pooled:
+            CONTAINER_POOL.release(pooled)
+        elif container:
             try:
                 container.remove(force=True)
             except:
                 pass
+
+
+def new_session_id() -> str:
+    return str(uuid.uuid4())[:8]
+
+
+def run_budget(session_id: str):
+    """(cpus, memory) mà một lần chạy của session phải xin scheduler.
+
+    Kernel đã giữ bộ nhớ của nó suốt vòng đời (xem KernelManager), nên lần chạy
+    trong kernel chỉ xin CPU.
+    """
+    if KERNEL_MANAGER.is_enabled(session_id):
+        return SANDBOX_CPUS, 0
+    return SANDBOX_CPUS, parse_size(SANDBOX_MEM_LIMIT)
+
+
+def admission(session_id: str, priority: int = PRIORITY_NORMAL) -> tuple:
+    """Tham số `admission` của run_action cho action chạy code của session trong container."""
+    return (session_id, *run_budget(session_id), priority)
+
+
+def enable_kernel(session_id: str = None) -> str:
+    """Bật kernel mode cho session, trả về session_id đang dùng."""
+    if not session_id:
+        session_id = new_session_id()
+    KERNEL_MANAGER.enable(session_id)
+    return session_id
+
+
+def reset_kernel(session_id: str) -> str:
+    """Xóa trạng thái kernel của session (globals, module, workbook đã load)."""
+    if not session_id or not KERNEL_MANAGER.reset(session_id):
+        return f"Session '{session_id}' is not running in kernel mode."
+    return f"[Session ID: {session_id}]\nKernel has been reset. The next call starts a fresh interpreter."
+
+
+def sandbox_status() -> str:
+    """Trạng thái scheduler (độ dài hàng đợi, thời gian chờ), warm pool và kernel."""
+    status = {
+        "scheduler": SCHEDULER.stats(),
+        "pool": CONTAINER_POOL.stats() if CONTAINER_POOL else None,
+        "kernels": KERNEL_MANAGER.stats(),
+    }
+    return json.dumps(status, indent=2)
+
+
+def _format_result(session_id: str, status_code: int, logs: str, minio_paths: list) -> str:
+    """Tạo nội dung phản hồi từ exit code, log và link tải các file output."""
+    logs, timing = _split_zygote_timing(logs)
+    return f"[Session ID: {session_id}]\nExit Code: {status_code}{timing}\nOutput:\n{logs}\n\nDownload Links: {minio_paths}"
+
+
+def _split_zygote_timing(logs: str):
+    """Tách dòng thống kê của zygote khỏi output của script.
+
+    Returns:
+        (logs, timing) với timing là dòng mô tả thời gian import thư viện (cold,
+        trả trước khi container còn nằm trong pool) và thời gian warm start,
+        hoặc chuỗi rỗng nếu không có.
+    """
+    lines = logs.splitlines(keepends=True)
+    for i in range(len(lines) - 1, -1, -1):
+        if lines[i].startswith(ZYGOTE_MARKER):
+            try:
+                stats = json.loads(lines[i][len(ZYGOTE_MARKER):])
+            except ValueError:
+                break
+            del lines[i]
+            timing = (
+                f"\nStartup: library preload {stats['preload_s']}s, "
+                f"warm start {stats['warm_start_ms']}ms, run {stats['run_s']}s"
+            )
+            return "".join(lines), timing
+    return logs, ""
@@ -0,0 +1,129 @@
+import io
+import os
+import sys
+import json
+import queue
+import select
+import subprocess
+from .config import (
+    SANDBOX_FAST_READ,
+    SANDBOX_FAST_READ_WORKERS,
+    SANDBOX_FAST_READ_MEM_LIMIT,
+    SANDBOX_FAST_READ_TIMEOUT,
+    session_path,
+)
+from .storage import sync_session_outputs
+from .executor import _format_result
+
+# Thư mục gốc của repo, để worker import được sandbox_runtime
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _ReaderWorker:
+    """Một process `python -m sandbox_runtime.reader serve` (tự giới hạn RLIMIT_AS)."""
+
+    def __init__(self, mem_limit: int):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [_ROOT_DIR, env.get("PYTHONPATH")]))
+        env["READER_MEM_LIMIT"] = str(mem_limit)
+        # Một thread BLAS là đủ cho preview, và tránh vượt RLIMIT_AS vì stack của thread
+        env.setdefault("OPENBLAS_NUM_THREADS", "1")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "sandbox_runtime.reader", "serve"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=_ROOT_DIR,
+            env=env,
+        )
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def request(self, payload: dict, timeout: float) -> dict:
+        self.process.stdin.write((json.dumps(payload) + "\n").encode("utf-8"))
+        self.process.stdin.flush()
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            raise TimeoutError(f"Reading the file took longer than {timeout:g}s.")
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("Reader worker stopped unexpectedly (probably out of memory).")
+        return json.loads(line)
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except Exception:
+            pass
+
+
+class ReaderPool:
+    """Pool worker đọc file Office trên host, tối đa `size` lần đọc đồng thời.
+
+    Worker chết, quá thời gian hoặc lỗi giao tiếp thì bị hủy và thay bằng worker mới.
+    """
+
+    def __init__(self, size: int, mem_limit: int, timeout: float, prestart: bool = True):
+        self.mem_limit = mem_limit
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        for _ in range(size):
+            # Khởi động sẵn để import pandas/openpyxl/docx xong trước request đầu tiên
+            self._idle.put(_ReaderWorker(mem_limit) if prestart else None)
+
+    def run(self, action: str, data_dir: str, **kwargs):
+        """Returns: (exit_code, output)"""
+        worker = self._idle.get()
+        try:
+            if worker is None or not worker.alive():
+                worker = _ReaderWorker(self.mem_limit)
+            result = worker.request({"action": action, "data_dir": data_dir, "kwargs": kwargs}, self.timeout)
+            return result["exit_code"], result["output"]
+        except BaseException:
+            if worker:
+                worker.kill()
+            worker = None
+            raise
+        finally:
+            self._idle.put(worker)
+
+
+READER_POOL = ReaderPool(
+    SANDBOX_FAST_READ_WORKERS,
+    SANDBOX_FAST_READ_MEM_LIMIT,
+    SANDBOX_FAST_READ_TIMEOUT,
+    prestart=SANDBOX_FAST_READ == "worker"
+)
+
+
+def fast_read(session_id: str, action: str, **kwargs):
+    """Chạy action chỉ đọc ngay trên host thay vì trong container.
+
+    SANDBOX_FAST_READ = "worker" (pool process có giới hạn bộ nhớ, mặc định),
+    "inline" (chạy trong thread hiện tại, không giới hạn) hoặc "off".
+
+    Returns:
+        Kết quả đã định dạng như execute_python_code, hoặc None để người gọi
+        chạy bằng container như cũ (tắt fast path, session chưa tồn tại, lỗi worker).
+    """
+    if SANDBOX_FAST_READ not in ("worker", "inline") or not session_id:
+        return None
+    session_dir = session_path(session_id)
+    if not os.path.isdir(session_dir):
+        return None
+
+    try:
+        if SANDBOX_FAST_READ == "inline":
+            from sandbox_runtime.reader import run
+            out = io.StringIO()
+            exit_code = run(action, session_dir, out=out, **kwargs)
+            output = out.getvalue()
+        else:
+            exit_code, output = READER_POOL.run(action, session_dir, **kwargs)
+        minio_paths = sync_session_outputs(session_id, session_dir)
+    except Exception as e:
+        print(f"[fast_read] {action} falls back to container: {e}", file=sys.stderr)
+        return None
+    return _format_result(session_id, exit_code, output, minio_paths)
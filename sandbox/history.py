@@ -0,0 +1,42 @@
+import os
+from sandbox_runtime import versions
+from .config import session_path
+from .storage import sync_session_outputs
+from .executor import _format_result
+
+
+def _session_dir(session_id: str):
+    if not session_id:
+        raise ValueError("Cần 'session_id' của session có lịch sử version.")
+    session_dir = session_path(session_id)
+    if not os.path.isdir(session_dir):
+        raise ValueError(f"Session '{session_id}' không tồn tại.")
+    return session_dir
+
+
+def list_versions(session_id: str) -> str:
+    """Liệt kê lịch sử version của các file đã edit trong session (chỉ đọc index, không chạy container)."""
+    try:
+        session_dir = _session_dir(session_id)
+        output = versions.format_history(session_dir)
+        return _format_result(session_id, 0, output, sync_session_outputs(session_id, session_dir))
+    except Exception as e:
+        return f"Lỗi (Session ID: {session_id}): {str(e)}"
+
+
+def checkout_version(session_id: str, version: int) -> str:
+    """Khôi phục một version về file làm việc (quay lại / rẽ nhánh) ngay trên host.
+
+    Snapshot được reflink hoặc copy về tên file của version; lần edit tiếp theo
+    (không truyền filename) sửa tiếp từ đó và ghi version mới có parent là version này.
+    """
+    try:
+        session_dir = _session_dir(session_id)
+        if version is None:
+            raise ValueError("Cần 'version' để checkout.")
+        filename = versions.checkout(version, session_dir)
+        minio_paths = sync_session_outputs(session_id, session_dir)
+        output = f"Đã khôi phục v{version} vào file: {filename}"
+        return _format_result(session_id, 0, output, minio_paths)
+    except Exception as e:
+        return f"Lỗi (Session ID: {session_id}): {str(e)}"
@@ -0,0 +1,175 @@
+import sys
+import time
+import uuid
+import atexit
+import threading
+from .config import (
+    parse_size,
+    SANDBOX_TIMEOUT,
+    SANDBOX_KERNEL_MEM_LIMIT,
+    SANDBOX_KERNEL_IDLE_TIMEOUT,
+)
+from .container_pool import start_sandbox_container, make_archive
+from .scheduler import SCHEDULER
+
+KERNEL_LABEL = "mcp-sandbox.kernel"
+# Exit code của client kernel (xem sandbox_runtime/kernel.py)
+EXIT_TIMEOUT = 124
+EXIT_UNAVAILABLE = 125
+
+
+class KernelSession:
+    """Container kernel của một session cùng trạng thái sử dụng."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.container = None
+        # Bộ nhớ giữ trong scheduler từ lúc kernel khởi động tới khi bị dừng
+        self.reservation = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.runs = 0
+
+
+class KernelManager:
+    """Quản lý các kernel sống lâu theo session (kernel mode).
+
+    Mỗi session bật kernel mode được gắn với một container chạy
+    `sandbox_runtime.kernel serve`, mount trực tiếp thư mục session. Kernel bị
+    dừng khi idle quá `idle_timeout`, khi vượt giới hạn bộ nhớ hoặc khi reset.
+    Giới hạn bộ nhớ của kernel được giữ trong scheduler suốt thời gian nó sống,
+    kể cả lúc idle, và chỉ được trả khi kernel dừng.
+    """
+
+    def __init__(self, mem_limit: str, idle_timeout: float):
+        self.mem_limit = mem_limit
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def enable(self, session_id: str):
+        """Bật kernel mode cho session; kernel được khởi động ở lần chạy đầu tiên."""
+        with self._lock:
+            if session_id not in self._sessions:
+                self._sessions[session_id] = KernelSession(session_id)
+            if not self._reaper:
+                self._reaper = threading.Thread(target=self._reap_loop, name="sandbox-kernel-reaper", daemon=True)
+                self._reaper.start()
+                atexit.register(self.shutdown)
+
+    def is_enabled(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def run(self, session_id: str, session_dir: str, code: str):
+        """Chạy code trong kernel của session.
+
+        Returns:
+            (exit_code, output)
+        """
+        with self._lock:
+            kernel = self._sessions.setdefault(session_id, KernelSession(session_id))
+        with kernel.lock:
+            kernel.last_used = time.monotonic()
+            if not self._is_alive(kernel):
+                self._start(kernel, session_dir)
+
+            job_name = f"kernel-job-{uuid.uuid4().hex[:12]}.py"
+            kernel.container.put_archive("/tmp", make_archive(job_name, code))
+            result = kernel.container.exec_run(
+                ["python", "-m", "sandbox_runtime.kernel", "run", f"/tmp/{job_name}", str(SANDBOX_TIMEOUT)],
+                workdir="/app/data"
+            )
+            kernel.runs += 1
+            kernel.last_used = time.monotonic()
+            if result.exit_code in (EXIT_TIMEOUT, EXIT_UNAVAILABLE):
+                self._stop(kernel)
+            return result.exit_code, result.output.decode("utf-8", "replace")
+
+    def reset(self, session_id: str) -> bool:
+        """Dừng kernel hiện tại của session; lần chạy sau sẽ bắt đầu với interpreter mới."""
+        with self._lock:
+            kernel = self._sessions.get(session_id)
+        if not kernel:
+            return False
+        with kernel.lock:
+            self._stop(kernel)
+        return True
+
+    def shutdown(self):
+        with self._lock:
+            kernels = list(self._sessions.values())
+            self._sessions.clear()
+        for kernel in kernels:
+            self._stop(kernel)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                session_id: {
+                    "running": kernel.container is not None,
+                    "runs": kernel.runs,
+                    "idle_seconds": round(now - kernel.last_used, 1),
+                }
+                for session_id, kernel in self._sessions.items()
+            }
+
+    def _start(self, kernel: KernelSession, session_dir: str):
+        self._stop(kernel)
+        # Ngưỡng mềm 90% giới hạn container: kernel tự xóa cache/khởi động lại trước khi bị OOM-kill
+        soft_limit = int(parse_size(self.mem_limit) * 0.9)
+        kernel.reservation = SCHEDULER.acquire(kernel.session_id, 0, parse_size(self.mem_limit), hold=True)
+        try:
+            kernel.container = start_sandbox_container(
+                session_dir,
+                labels={KERNEL_LABEL: kernel.session_id},
+                entrypoint=["python", "-m", "sandbox_runtime.kernel"],
+                command=["serve"],
+                mem_limit=self.mem_limit,
+                environment={"KERNEL_MEM_SOFT_LIMIT": str(soft_limit)},
+            )
+        except Exception:
+            self._stop(kernel)
+            raise
+
+    def _is_alive(self, kernel: KernelSession) -> bool:
+        if kernel.container is None:
+            return False
+        try:
+            kernel.container.reload()
+            return kernel.container.status == "running"
+        except Exception:
+            return False
+
+    def _stop(self, kernel: KernelSession):
+        if kernel.container is not None:
+            try:
+                kernel.container.remove(force=True)
+            except Exception:
+                pass
+            kernel.container = None
+        if kernel.reservation is not None:
+            SCHEDULER.release(kernel.reservation)
+            kernel.reservation = None
+
+    def _reap_loop(self):
+        interval = max(1.0, min(60.0, self.idle_timeout / 2))
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            with self._lock:
+                expired = [
+                    kernel for kernel in self._sessions.values()
+                    if now - kernel.last_used > self.idle_timeout and not kernel.lock.locked()
+                ]
+                for kernel in expired:
+                    del self._sessions[kernel.session_id]
+            for kernel in expired:
+                with kernel.lock:
+                    self._stop(kernel)
+                print(f"[sandbox-kernel] Stopped idle kernel for session {kernel.session_id}", file=sys.stderr)
+
+
+KERNEL_MANAGER = KernelManager(SANDBOX_KERNEL_MEM_LIMIT, SANDBOX_KERNEL_IDLE_TIMEOUT)
@@ -1,67 +1,73 @@
-from .executor import execute_python_code
+from .executor import execute_python_code, KERNEL_CACHE_FUNC
+from .config import SANDBOX_SAVE_COMPRESSLEVEL, SANDBOX_SAVE_FAST_COMPRESSLEVEL
+from .scheduler import PRIORITY_HIGH
+from .fast_read import fast_read
 from .word_operations import (
     replace_text_operation,
     replace_paragraph_operation,
     insert_text_operation,
     insert_heading_operation,
     delete_paragraph_operation,
+    batch_replace_operations,
+    SCHEMAS,
 )
+from .validation import validate_operations, format_errors
 
 
 # Common helper function code to be injected
 FIND_WORD_FILE_FUNC = '''
-def find_word_file(target_name=None):
-    files = os.listdir('/app/data')
-    if target_name:
-        if target_name in files: return target_name
-        if not target_name.endswith('.docx'):
-            if f"{target_name}.docx" in files: return f"{target_name}.docx"
-    
-    docx_files = [f for f in files if f.endswith('.docx')]
-    # Ưu tiên file đã sửa trước đó
-    edited_files = [f for f in docx_files if f.endswith('_edited.docx')]
-    if edited_files: return edited_files[0]
-    if docx_files: return docx_files[0]
-    return None
+from sandbox_runtime.files import find_word_file
 '''
 
 
-def read_word_content(session_id: str, filename: str = None) -> str:
+def read_word_content(session_id: str, filename: str = None, version: int = None) -> str:
     """Read Word content.
     
     Args:
         session_id: ID of the session to execute code
         filename: Specific filename to read (optional)
+        version: Read this version from the session history (optional)
         
     Returns:
         Result of reading Word content
     """
+    result = fast_read(session_id, "read_word", filename=filename, version=version)
+    if result is not None:
+        return result
+
     code = f'''
-from docx import Document
-import os
+from sandbox_runtime.reader import run
+exit(run("read_word", filename={repr(filename)}, version={repr(version)}))
+'''
+    return execute_python_code(code, session_id, priority=PRIORITY_HIGH)
 
-{FIND_WORD_FILE_FUNC}
-filename = find_word_file({repr(filename)})
-if not filename:
-    print("Không tìm thấy file Word!")
-    exit(1)
 
-doc = Document(f'/app/data/{{filename}}')
-print(f"Nội dung file: {{filename}}\\n")
-for i, p in enumerate(doc.paragraphs):
-    if p.text.strip(): 
-        print(f"[{{i}}] {{p.text}}")
-'''
-    return execute_python_code(code, session_id)
+def _describe_operation(op: dict) -> str:
+    """Mô tả ngắn một operation Word (ghi vào lịch sử version)."""
+    fields = [f"{key}={str(value)[:40]!r}" for key, value in op.items() if key not in ('type', 'code')]
+    return " ".join([op['type']] + fields)
+
 
+def check_word_operations(operations) -> str:
+    """Lỗi schema của `operations` (đã format), None nếu hợp lệ.
 
-def edit_word_document(session_id: str, operations: list, filename: str = None) -> str:
+    python_sandbox gọi trước khi xin slot của scheduler, để request sai trả lỗi ngay
+    thay vì chờ trong hàng đợi.
+    """
+    errors = validate_operations(operations, SCHEMAS)
+    return format_errors(errors) if errors else None
+
+
+def edit_word_document(session_id: str, operations: list, filename: str = None, fast_save: bool = False,
+                       version: int = None) -> str:
     """Edit Word document with structured operations.
     
     Args:
         session_id: ID of the session to execute code
         operations: List of operations to perform
         filename: Name of the file to edit (optional)
+        fast_save: Save with low compression (faster, larger file); for intermediate edits in a chain
+        version: Edit this version from the session history instead of the latest file (branch/rollback)
         
     Returns:
         Result of executing operations
@@ -75,9 +81,14 @@ def edit_word_document(session_id: str, operations: list, filename: str = None)
         'delete_paragraph': delete_paragraph_operation,
     }
     
-    # Build the operation code
+    # Kiểm tra schema trên host: request sai không tốn container hay lần load document nào
+    errors = check_word_operations(operations)
+    if errors:
+        return errors
+
+    # Build the operation code; các replace liền nhau được thay chung một lần duyệt
     operations_code = []
-    for op in operations:
+    for op in batch_replace_operations(operations):
         op_type = op.get('type')
         
         if op_type == 'custom_code':
@@ -100,28 +111,60 @@ except Exception as e:
 print(f"- Cảnh báo: Operation type '{{op_type}}' không được hỗ trợ")
 ''')
     
+    compresslevel = SANDBOX_SAVE_FAST_COMPRESSLEVEL if fast_save else SANDBOX_SAVE_COMPRESSLEVEL
+    history = [_describe_operation(op) for op in operations]
+
     # Combine all operations into final code
     code = f'''
 import json
 from docx import Document
 import os
+from sandbox_runtime.saving import save_atomic, format_save_stats
+from sandbox_runtime import versions
+from sandbox_runtime.word_ops import replace_all
 
 {FIND_WORD_FILE_FUNC}
+{KERNEL_CACHE_FUNC}
 
-filename = find_word_file({repr(filename)})
+_version = {repr(version)}
+if _version is not None:
+    # Rẽ nhánh / quay lại: khôi phục snapshot của version rồi sửa tiếp từ đó
+    try:
+        filename = versions.checkout(_version)
+    except ValueError as e:
+        print(f"Lỗi: {{e}}")
+        exit(1)
+else:
+    filename = find_word_file({repr(filename)})
 if not filename:
     print("Lỗi: Không tìm thấy file Word nào để chỉnh sửa!")
     exit(1)
 
 base_name = filename.replace('_edited.docx', '').replace('.docx', '')
-doc = Document(f'/app/data/{{filename}}')
+# Kernel mode: dùng lại document còn trong bộ nhớ từ lần sửa trước
+doc = kernel_take(f'/app/data/{{filename}}')
+if doc is None:
+    doc = Document(f'/app/data/{{filename}}')
 print(f"Đang xử lý file: {{filename}}")
+try:
+    _parent = versions.track(filename)
+except Exception as e:
+    _parent = None
+    print(f"- Cảnh báo: Không ghi được lịch sử version: {{e}}")
 
 {chr(10).join(operations_code)}
 
 # Lưu file kết quả
 output_filename = f"{{base_name}}_edited.docx"
-doc.save(f'/app/data/{{output_filename}}')
+# Ghi ra file tạm rồi đổi tên: lỗi/timeout giữa chừng không làm hỏng file đích
+elapsed, size = save_atomic(doc, f'/app/data/{{output_filename}}', {compresslevel})
+kernel_put(f'/app/data/{{output_filename}}', doc)
 print(f"\\nĐã lưu file chỉnh sửa: {{output_filename}}")
+print(format_save_stats(elapsed, size, {compresslevel}))
+try:
+    _entry = versions.record(output_filename, _parent, {history!r})
+    print(f"Version: v{{_entry['version']}}" + (f" (parent v{{_parent}})" if _parent else ""))
+except Exception as e:
+    print(f"- Cảnh báo: Không ghi được lịch sử version: {{e}}")
 '''
     return execute_python_code(code, session_id)
\ No newline at end of file
@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import weakref
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from .config import (
+    HTTP_SESSION,
+    HOST_WORKSPACE_DIR,
+    DOWNLOAD_MAX_BYTES,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_CONNECT_TIMEOUT,
+    DOWNLOAD_READ_TIMEOUT,
+    DOWNLOAD_BATCH_WORKERS,
+    DOWNLOAD_RETRIES,
+    DOWNLOAD_RETRY_BACKOFF,
+    DOWNLOAD_RANGE_PARTS,
+    DOWNLOAD_RANGE_MIN_SIZE,
+    DOWNLOAD_PARTIAL_MAX_AGE,
+    DOWNLOAD_PARTIAL_SAVE_BYTES,
+    DOWNLOAD_PARTIAL_SAVE_INTERVAL,
+)
+
+# File tải dở (theo URL) nằm ở đây để lần thử sau tải tiếp bằng Range
+PARTIAL_DIR = os.path.join(HOST_WORKSPACE_DIR, ".partial")
+os.makedirs(PARTIAL_DIR, exist_ok=True)
+
+_TIMEOUT = (DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT)
+
+# Lỗi mạng giữa chừng: giữ phần đã tải và thử lại từ vị trí đang dở
+_RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+# Thread pool cho các đoạn byte tải song song của file lớn
+_RANGE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=max(1, DOWNLOAD_RANGE_PARTS) * DOWNLOAD_BATCH_WORKERS,
+    thread_name_prefix="download-range"
+)
+
+# Lock theo URL chỉ sống khi còn thread đang giữ/chờ nó, dict không phình theo số URL đã tải
+_url_locks = weakref.WeakValueDictionary()
+_url_locks_guard = threading.Lock()
+
+
+def _url_lock(url: str) -> threading.Lock:
+    with _url_locks_guard:
+        lock = _url_locks.get(url)
+        if lock is None:
+            lock = _url_locks[url] = threading.Lock()
+        return lock
+
+
+def format_size(num_bytes: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GB"
+
+
+def _check_size(size: int):
+    if size is not None and size > DOWNLOAD_MAX_BYTES:
+        raise ValueError(f"File quá lớn ({format_size(size)}), giới hạn là {format_size(DOWNLOAD_MAX_BYTES)}.")
+
+
+def _validator(response):
+    """ETag mạnh (hoặc Last-Modified) dùng cho If-Range; None nếu server không cung cấp."""
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def _content_length(response):
+    value = response.headers.get("Content-Length")
+    return int(value) if value and value.isdigit() else None
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return isinstance(error, _RETRYABLE_ERRORS)
+
+
+class _ContentChanged(Exception):
+    """Server trả 200 thay vì 206 cho If-Range: file trên server đã đổi, phải tải lại từ đầu."""
+
+
+class _Partial:
+    """File tải dở của một URL, kèm metadata (validator, tổng dung lượng, các đoạn byte).
+
+    Tải tuần tự: vị trí tải tiếp chính là kích thước file. Tải song song: mỗi đoạn
+    [start, end, pos] lưu vị trí đã ghi tới trong metadata.
+    """
+
+    def __init__(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        self.url = url
+        self.path = os.path.join(PARTIAL_DIR, f"{key}.part")
+        self.meta_path = f"{self.path}.json"
+        self.lock = threading.Lock()
+        self.meta = self._load()
+
+    @property
+    def validator(self):
+        return self.meta.get("validator")
+
+    @property
+    def headers(self) -> dict:
+        return self.meta.get("headers") or {}
+
+    @property
+    def total(self):
+        return self.meta.get("total")
+
+    @property
+    def parts(self):
+        return self.meta.get("parts")
+
+    def offset(self) -> int:
+        """Vị trí tải tiếp khi tải tuần tự (0 nếu không thể resume an toàn)."""
+        if not self.validator or self.parts or not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path)
+
+    def reset(self, response=None, total: int = None, parts: list = None):
+        """Bắt đầu lại từ đầu với validator/header của `response` (nếu có)."""
+        headers = {}
+        if response is not None:
+            headers = {k: response.headers[k] for k in ("ETag", "Last-Modified") if k in response.headers}
+        self.meta = {
+            "url": self.url,
+            "validator": _validator(response) if response is not None else None,
+            "headers": headers,
+            "total": total,
+            "parts": parts,
+        }
+        with open(self.path, "wb") as f:
+            if parts:
+                f.truncate(total)
+        self.save()
+
+    def save(self):
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def finish(self, target_path: str) -> int:
+        size = os.path.getsize(self.path)
+        if self.total is not None and size != self.total:
+            raise requests.ConnectionError(
+                f"Tải thiếu dữ liệu ({format_size(size)}/{format_size(self.total)})."
+            )
+        os.replace(self.path, target_path)
+        self.discard()
+        return size
+
+    def discard(self):
+        for path in (self.path, self.meta_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load(self) -> dict:
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("url") == self.url and os.path.exists(self.path):
+                return meta
+        except (OSError, ValueError):
+            pass
+        return {}
+
+
+def _purge_stale_partials():
+    """Xóa file tải dở không được đụng tới quá DOWNLOAD_PARTIAL_MAX_AGE giây."""
+    cutoff = time.time() - DOWNLOAD_PARTIAL_MAX_AGE
+    for name in os.listdir(PARTIAL_DIR):
+        path = os.path.join(PARTIAL_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def _save_progress(partial: _Partial, part: list, f, pos: int):
+    """Flush dữ liệu đã ghi rồi mới lưu `pos` vào metadata, để metadata không vượt quá dữ liệu thật."""
+    if pos == part[2]:
+        return
+    f.flush()
+    with partial.lock:
+        part[2] = pos
+        partial.save()
+
+
+def _fetch_part(partial: _Partial, part: list):
+    """Tải đoạn byte [pos, end] của `part` vào đúng vị trí trong file tải dở.
+
+    Metadata chỉ được lưu sau mỗi DOWNLOAD_PARTIAL_SAVE_BYTES byte hoặc
+    DOWNLOAD_PARTIAL_SAVE_INTERVAL giây, và khi đoạn dừng (xong hoặc lỗi).
+    """
+    _, end, pos = part
+    headers = {"Range": f"bytes={pos}-{end}", "If-Range": partial.validator}
+    with HTTP_SESSION.get(partial.url, headers=headers, stream=True, timeout=_TIMEOUT) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise _ContentChanged()
+        with open(partial.path, "r+b") as f:
+            f.seek(pos)
+            last_save = time.monotonic()
+            try:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    chunk = chunk[:end + 1 - pos]
+                    f.write(chunk)
+                    pos += len(chunk)
+                    if pos > end:
+                        break
+                    if (
+                        pos - part[2] >= DOWNLOAD_PARTIAL_SAVE_BYTES
+                        or time.monotonic() - last_save >= DOWNLOAD_PARTIAL_SAVE_INTERVAL
+                    ):
+                        _save_progress(partial, part, f, pos)
+                        last_save = time.monotonic()
+            finally:
+                _save_progress(partial, part, f, pos)
+    if part[2] <= end:
+        raise requests.ConnectionError("Kết nối bị đóng trước khi tải xong đoạn dữ liệu.")
+
+
+def _fetch_parts(partial: _Partial):
+    """Tải song song các đoạn còn thiếu; chờ mọi đoạn dừng hẳn rồi mới báo lỗi đầu tiên."""
+    pending = [part for part in partial.parts if part[2] <= part[1]]
+    futures = [_RANGE_EXECUTOR.submit(_fetch_part, partial, part) for part in pending]
+    wait(futures)
+    for future in futures:
+        future.result()
+
+
+def _fetch_sequential(partial: _Partial, headers: dict):
+    """Một lần tải tuần tự, tiếp từ cuối file tải dở nếu có. Trả về response (đã đóng)."""
+    offset = partial.offset()
+    request_headers = dict(headers or {})
+    if offset:
+        request_headers.update({"Range": f"bytes={offset}-", "If-Range": partial.validator})
+
+    with HTTP_SESSION.get(partial.url, headers=request_headers, stream=True, timeout=_TIMEOUT) as response:
+        if response.status_code == 304:
+            return response
+        if offset and response.status_code == 416 and offset == partial.total:
+            return response
+        response.raise_for_status()
+
+        resumed = response.status_code == 206 and response.headers.get("Content-Range", "").startswith(
+            f"bytes {offset}-"
+        )
+        if offset and resumed:
+            _check_size(partial.total)
+        else:
+            offset = 0
+            total = _content_length(response)
+            _check_size(total)
+            if (
+                DOWNLOAD_RANGE_PARTS > 1 and _validator(response) and total and total >= DOWNLOAD_RANGE_MIN_SIZE
+                and response.headers.get("Accept-Ranges", "").lower() == "bytes"
+            ):
+                step = -(-total // DOWNLOAD_RANGE_PARTS)
+                parts = [[start, min(start + step, total) - 1, start] for start in range(0, total, step)]
+                partial.reset(response, total, parts)
+                response.close()
+                _fetch_parts(partial)
+                return response
+            partial.reset(response, total)
+
+        written = offset
+        with open(partial.path, "ab") as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > DOWNLOAD_MAX_BYTES:
+                    raise ValueError(f"File vượt quá giới hạn {format_size(DOWNLOAD_MAX_BYTES)}, đã dừng tải.")
+                f.write(chunk)
+    return response
+
+
+def fetch_to_file(url: str, target_path: str, headers: dict = None):
+    """Tải `url` vào `target_path` (atomic), tải tiếp phần còn thiếu khi mất kết nối.
+
+    Phần đã tải được giữ trong PARTIAL_DIR; lần thử sau (kể cả ở lần gọi sau) gửi
+    `Range` kèm `If-Range` để chỉ tải phần còn lại, và tải lại từ đầu nếu file trên
+    server đã đổi. File lớn hơn DOWNLOAD_RANGE_MIN_SIZE trên server hỗ trợ
+    `Accept-Ranges` được chia thành DOWNLOAD_RANGE_PARTS đoạn tải song song.
+
+    Args:
+        headers: Header thêm vào request đầu tiên (ví dụ If-None-Match của cache)
+
+    Returns:
+        (status_code, số byte, response headers); status_code 304 thì không ghi file.
+    """
+    with _url_lock(url):
+        _purge_stale_partials()
+        partial = _Partial(url)
+        delay = DOWNLOAD_RETRY_BACKOFF
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            try:
+                if partial.parts:
+                    _fetch_parts(partial)
+                    response_headers = partial.headers
+                    return 200, partial.finish(target_path), response_headers
+                response = _fetch_sequential(partial, headers)
+                if response.status_code == 304:
+                    return 304, 0, response.headers
+                response_headers = partial.headers
+                return response.status_code, partial.finish(target_path), response_headers
+            except _ContentChanged:
+                partial.reset()
+                if attempt == DOWNLOAD_RETRIES:
+                    raise requests.ConnectionError("File trên server thay đổi liên tục trong lúc tải.")
+            except Exception as e:
+                if not _retryable(e) or attempt == DOWNLOAD_RETRIES:
+                    if not _retryable(e):
+                        partial.discard()
+                    raise
+                time.sleep(delay)
+                delay *= 2
@@ -0,0 +1,310 @@
+import time
+import asyncio
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from .config import (
+    client,
+    parse_size,
+    SANDBOX_SCHEDULER_CPUS,
+    SANDBOX_SCHEDULER_MEMORY,
+    SANDBOX_SCHEDULER_MAX_QUEUE,
+    SANDBOX_SCHEDULER_QUEUE_TIMEOUT,
+)
+
+# Action chỉ đọc (list_sheets, read_excel, read_word) được ưu tiên hơn execute/edit
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+# Bộ nhớ giữ suốt vòng đời kernel: đi trước mọi lần chạy, vì lần chạy của kernel
+# đó đang giữ slot CPU và chỉ chờ phần bộ nhớ này
+_PRIORITY_HOLD = -1
+
+# Slot mà dispatcher đã chờ (bất đồng bộ) trước khi đẩy action sang thread pool;
+# `SlotScheduler.slot` dùng luôn slot này thay vì chờ lại trong thread
+ADMITTED = ContextVar("sandbox_admitted", default=None)
+
+
+class AdmissionError(RuntimeError):
+    """Không cấp được slot: hàng đợi đầy hoặc chờ quá thời gian cho phép."""
+
+
+class _Ticket:
+    def __init__(self, seq: int, session_id: str, cpus: float, memory: int, priority: int,
+                 hold: bool = False, future=None):
+        self.seq = seq
+        self.session_id = session_id
+        self.cpus = cpus
+        self.memory = memory
+        self.priority = priority
+        # hold: giữ ngân sách cho container sống lâu (kernel, container rảnh của pool),
+        # không tính là một lần chạy của session
+        self.hold = hold
+        self.on_preempt = None
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.wait = 0.0
+        self.granted = False
+        self.released = False
+
+
+class SlotScheduler:
+    """Kiểm soát số container sandbox chạy đồng thời theo ngân sách CPU và bộ nhớ.
+
+    Ticket đang chờ được xếp theo (priority, số lần chạy đang giữ của session,
+    thứ tự vào hàng), nên action chỉ đọc đi trước và một session gửi dồn dập
+    không chiếm hết slot của các session khác. Chỉ ticket đứng đầu mới được cấp
+    slot để ticket lớn không bị bỏ đói.
+
+    Ngoài các lần chạy, ngân sách còn bị giữ bởi container sống lâu: kernel giữ bộ
+    nhớ từ lúc khởi động tới khi bị dừng, container rảnh của pool giữ bộ nhớ nhưng
+    nhường lại (bị hủy qua `on_preempt`) khi ticket đứng đầu không còn chỗ. Slot
+    được cấp ngay khi ngân sách được trả, nên có thể chờ trong thread (`acquire`)
+    hoặc trên event loop (`acquire_async`) mà không chiếm thread nào.
+    """
+
+    def __init__(self, total_cpus: float, total_memory: int, max_queue: int, queue_timeout: float):
+        self.total_cpus = total_cpus
+        self.total_memory = total_memory
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._running = {}
+        self._held = []
+        self._used_cpus = 0.0
+        self._used_memory = 0
+        self._waits = deque(maxlen=1000)
+        self._max_wait = 0.0
+        self._granted = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._preempted = 0
+
+    @contextmanager
+    def slot(self, session_id: str, cpus: float, memory: int, priority: int = PRIORITY_NORMAL):
+        admitted = ADMITTED.get()
+        if admitted and self._covers(admitted, session_id, cpus, memory):
+            # Dispatcher đã giữ slot cho action này và sẽ tự trả; mỗi slot chỉ dùng cho một lần chạy
+            ADMITTED.set(None)
+            yield admitted
+            return
+        ticket = self.acquire(session_id, cpus, memory, priority)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def acquire(self, session_id: str, cpus: float, memory: int, priority: int = PRIORITY_NORMAL,
+                hold: bool = False) -> _Ticket:
+        """Chờ (chặn thread hiện tại) tới khi được cấp slot.
+
+        Args:
+            hold: Giữ ngân sách cho container sống lâu (kernel) thay vì một lần chạy;
+                được cấp trước các lần chạy đang chờ và phải `release` khi container dừng
+
+        Raises:
+            AdmissionError: hàng đợi đầy hoặc chờ quá queue_timeout
+        """
+        with self._cond:
+            ticket = self._enqueue(session_id, cpus, memory, _PRIORITY_HOLD if hold else priority, hold)
+            deadline = ticket.enqueued + self.queue_timeout
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._abandon(ticket, timed_out=True)
+                    raise self._timeout_error()
+                self._cond.wait(remaining)
+            return ticket
+
+    async def acquire_async(self, session_id: str, cpus: float, memory: int,
+                            priority: int = PRIORITY_NORMAL) -> _Ticket:
+        """Như `acquire` nhưng chờ trên event loop, không giữ thread nào trong lúc chờ."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            ticket = self._enqueue(session_id, cpus, memory, priority, future=(loop, future))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._cond:
+                if not ticket.granted:
+                    self._abandon(ticket, timed_out=isinstance(e, asyncio.TimeoutError))
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise self._timeout_error() from None
+                    raise
+            # Được cấp đúng lúc hết giờ / bị hủy
+            if isinstance(e, asyncio.CancelledError):
+                self.release(ticket)
+                raise
+        return ticket
+
+    def reserve(self, session_id: str, cpus: float, memory: int, on_preempt) -> _Ticket:
+        """Giữ ngân sách cho container rảnh của pool mà không chờ.
+
+        Chỉ cấp khi không có ticket nào đang chờ và còn đủ ngân sách. Khi ticket đứng
+        đầu hàng đợi thiếu chỗ, phần giữ mới nhất bị thu hồi trước và `on_preempt(ticket)`
+        được gọi (đang giữ lock của scheduler: phải nhanh và không gọi lại scheduler).
+
+        Returns:
+            Ticket, hoặc None nếu không còn chỗ
+        """
+        with self._cond:
+            if self._waiting or not self._fits(cpus, memory):
+                return None
+            ticket = _Ticket(next(self._seq), session_id, cpus, memory, _PRIORITY_HOLD, hold=True)
+            ticket.on_preempt = on_preempt
+            ticket.granted = True
+            self._take(ticket)
+            return ticket
+
+    def release(self, ticket: _Ticket):
+        """Trả ngân sách của ticket; gọi nhiều lần (hoặc sau khi bị thu hồi) cũng không sao."""
+        with self._cond:
+            if self._release_locked(ticket):
+                self._dispatch()
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "queue_depth": len(self._waiting),
+                "queued_high_priority": sum(1 for t in self._waiting if t.priority == PRIORITY_HIGH),
+                "running": sum(self._running.values()),
+                "running_sessions": len(self._running),
+                "kernels_held": sum(1 for t in self._held if not t.on_preempt),
+                "pool_held": sum(1 for t in self._held if t.on_preempt),
+                "memory_held": sum(t.memory for t in self._held),
+                "cpus_used": round(self._used_cpus, 2),
+                "cpus_total": self.total_cpus,
+                "memory_used": self._used_memory,
+                "memory_total": self.total_memory,
+                "granted": self._granted,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "preempted": self._preempted,
+                "wait_avg_s": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "wait_p95_s": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+                "wait_max_s": round(self._max_wait, 3),
+            }
+
+    def _covers(self, ticket: _Ticket, session_id: str, cpus: float, memory: int) -> bool:
+        return (not ticket.released and ticket.session_id == session_id
+                and ticket.cpus >= min(cpus, self.total_cpus) and ticket.memory >= min(memory, self.total_memory))
+
+    def _timeout_error(self):
+        return AdmissionError(
+            f"Sandbox is busy: no slot became free within {self.queue_timeout:g}s. Please retry later."
+        )
+
+    def _enqueue(self, session_id, cpus, memory, priority, hold=False, future=None) -> _Ticket:
+        if len(self._waiting) >= self.max_queue:
+            self._rejected += 1
+            raise AdmissionError(
+                f"Sandbox is busy: {len(self._waiting)} runs are already queued. Please retry later."
+            )
+        # Yêu cầu lớn hơn cả ngân sách vẫn được chạy, nhưng chỉ khi host rảnh hoàn toàn
+        ticket = _Ticket(next(self._seq), session_id, min(cpus, self.total_cpus),
+                         min(memory, self.total_memory), priority, hold, future)
+        self._waiting.append(ticket)
+        self._dispatch()
+        return ticket
+
+    def _abandon(self, ticket: _Ticket, timed_out: bool):
+        self._waiting.remove(ticket)
+        if timed_out:
+            self._timed_out += 1
+        # Ticket đứng đầu vừa rời hàng: ticket sau nó có thể đã vừa ngân sách
+        self._dispatch()
+
+    def _rank(self, ticket: _Ticket):
+        return (ticket.priority, self._running.get(ticket.session_id, 0), ticket.seq)
+
+    def _fits(self, cpus: float, memory: int) -> bool:
+        return (self._used_cpus + cpus <= self.total_cpus + 1e-9
+                and self._used_memory + memory <= self.total_memory)
+
+    def _dispatch(self):
+        """Cấp slot cho các ticket đứng đầu hàng chừng nào còn vừa ngân sách."""
+        while self._waiting:
+            ticket = min(self._waiting, key=self._rank)
+            if not self._make_room(ticket):
+                break
+            self._waiting.remove(ticket)
+            self._take(ticket)
+            ticket.granted = True
+            ticket.wait = time.monotonic() - ticket.enqueued
+            self._waits.append(ticket.wait)
+            self._max_wait = max(self._max_wait, ticket.wait)
+            self._granted += 1
+            if ticket.future:
+                loop, future = ticket.future
+                loop.call_soon_threadsafe(_resolve, future)
+            self._cond.notify_all()
+
+    def _make_room(self, ticket: _Ticket) -> bool:
+        """True nếu ticket vừa ngân sách, thu hồi phần giữ của container rảnh trong pool nếu cần."""
+        if self._fits(ticket.cpus, ticket.memory):
+            return True
+        victims, cpus, memory = [], ticket.cpus, ticket.memory
+        for held in reversed(self._held):
+            if held.on_preempt:
+                victims.append(held)
+                cpus -= held.cpus
+                memory -= held.memory
+                if self._fits(cpus, memory):
+                    break
+        if not self._fits(cpus, memory):
+            return False
+        for held in victims:
+            self._release_locked(held)
+            self._preempted += 1
+            held.on_preempt(held)
+        return True
+
+    def _take(self, ticket: _Ticket):
+        self._used_cpus += ticket.cpus
+        self._used_memory += ticket.memory
+        if ticket.hold:
+            self._held.append(ticket)
+        else:
+            self._running[ticket.session_id] = self._running.get(ticket.session_id, 0) + 1
+
+    def _release_locked(self, ticket: _Ticket) -> bool:
+        if ticket.released or not ticket.granted:
+            return False
+        ticket.released = True
+        self._used_cpus -= ticket.cpus
+        self._used_memory -= ticket.memory
+        if ticket.hold:
+            self._held.remove(ticket)
+        else:
+            self._running[ticket.session_id] -= 1
+            if not self._running[ticket.session_id]:
+                del self._running[ticket.session_id]
+        return True
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+def _default_budget():
+    """Ngân sách mặc định lấy theo Docker daemon (đúng cả với Docker Desktop/VM)."""
+    try:
+        info = client.info()
+        return float(info.get("NCPU") or 1), int(int(info.get("MemTotal") or 0) * 0.9)
+    except Exception:
+        return 1.0, 0
+
+
+_cpus, _memory = _default_budget()
+SCHEDULER = SlotScheduler(
+    float(SANDBOX_SCHEDULER_CPUS) if SANDBOX_SCHEDULER_CPUS else _cpus,
+    parse_size(SANDBOX_SCHEDULER_MEMORY) if SANDBOX_SCHEDULER_MEMORY else (_memory or parse_size("8g")),
+    SANDBOX_SCHEDULER_MAX_QUEUE,
+    SANDBOX_SCHEDULER_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from minio.error import S3Error
+from .config import (
+    MINIO_CLIENT,
+    BUCKET_NAME,
+    MINIO_URL_EXPIRY_DAYS,
+    MINIO_URL_REFRESH_MARGIN,
+    MINIO_UPLOAD_WORKERS,
+    MINIO_PART_SIZE,
+    MINIO_PART_PARALLELISM,
+    MINIO_UPLOAD_RETRIES,
+    MINIO_RETRY_BACKOFF,
+)
+
+# Manifest của mỗi session: {filename: {size, mtime_ns, sha256, input, object, url, url_expires}}
+MANIFEST_NAME = ".sync_manifest.json"
+
+# Lỗi phía MinIO có thể tự hết khi thử lại
+_TRANSIENT_S3_ERRORS = {"InternalError", "SlowDown", "ServiceUnavailable", "RequestTimeout"}
+
+# Thread pool dùng chung cho mọi lượt upload của mọi session
+_UPLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=MINIO_UPLOAD_WORKERS, thread_name_prefix="minio-upload")
+
+_session_locks = {}
+_session_locks_guard = threading.Lock()
+
+
+def _session_lock(session_dir: str) -> threading.Lock:
+    with _session_locks_guard:
+        return _session_locks.setdefault(session_dir, threading.Lock())
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(session_dir: str) -> dict:
+    try:
+        with open(os.path.join(session_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(session_dir: str, manifest: dict):
+    path = os.path.join(session_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _refresh_entry(entry: dict, file_path: str) -> bool:
+    """Cập nhật size/mtime/hash của entry, trả về True nếu nội dung file đã thay đổi."""
+    st = os.stat(file_path)
+    if entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+        return False
+    sha256 = file_sha256(file_path)
+    changed = entry.get("sha256") != sha256
+    entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns, sha256=sha256)
+    return changed
+
+
+def register_inputs(session_dir: str, filenames: list):
+    """Đánh dấu file tải vào session là input: không upload lại trừ khi script sửa nó."""
+    with _session_lock(session_dir):
+        manifest = load_manifest(session_dir)
+        for filename in filenames:
+            entry = {"input": True}
+            _refresh_entry(entry, os.path.join(session_dir, filename))
+            manifest[filename] = entry
+        save_manifest(session_dir, manifest)
+
+
+def upload_file(object_name: str, file_path: str):
+    """Upload một file lên MinIO (multipart, các part chạy song song), thử lại với backoff.
+
+    Từng request/part đã được urllib3 retry (xem MINIO_CLIENT trong config); ở
+    đây thử lại cả file khi lỗi xảy ra giữa chừng mà request không tự retry được.
+    """
+    delay = MINIO_RETRY_BACKOFF
+    for attempt in range(MINIO_UPLOAD_RETRIES + 1):
+        try:
+            return MINIO_CLIENT.fput_object(
+                BUCKET_NAME,
+                object_name,
+                file_path,
+                part_size=MINIO_PART_SIZE,
+                num_parallel_uploads=MINIO_PART_PARALLELISM
+            )
+        except S3Error as e:
+            if e.code not in _TRANSIENT_S3_ERRORS or attempt == MINIO_UPLOAD_RETRIES:
+                raise
+        except Exception:
+            if attempt == MINIO_UPLOAD_RETRIES:
+                raise
+        time.sleep(delay)
+        delay *= 2
+
+
+class OutputSync:
+    """Một lượt đồng bộ output của session lên MinIO.
+
+    Khi vào `with`, các file mới/thay đổi được đưa vào thread pool upload ngay,
+    nên có thể làm việc khác (ví dụ lấy log container) trong lúc upload chạy.
+    Khi ra khỏi `with`, chờ upload xong, tạo presigned URL và lưu manifest;
+    kết quả nằm trong `links`.
+    """
+
+    def __init__(self, session_id: str, session_dir: str):
+        self.session_id = session_id
+        self.session_dir = session_dir
+        self.links = []
+        self._lock = _session_lock(session_dir)
+        self._manifest = {}
+        self._outputs = []
+        self._uploads = {}
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._plan()
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._finish()
+        finally:
+            self._lock.release()
+        return False
+
+    def _plan(self):
+        self._manifest = load_manifest(self.session_dir)
+        present = set()
+        for filename in sorted(os.listdir(self.session_dir)):
+            file_path = os.path.join(self.session_dir, filename)
+            if filename.startswith(".") or filename == "document" or not os.path.isfile(file_path):
+                continue
+            present.add(filename)
+            entry = self._manifest.setdefault(filename, {})
+            changed = _refresh_entry(entry, file_path)
+            if entry.get("input") and not changed:
+                continue
+
+            object_name = f"{self.session_id}/{filename}"
+            self._outputs.append(filename)
+            if changed or entry.get("object") != object_name:
+                self._uploads[filename] = _UPLOAD_EXECUTOR.submit(upload_file, object_name, file_path)
+
+        for filename in list(self._manifest):
+            if filename not in present and not os.path.isfile(os.path.join(self.session_dir, filename)):
+                del self._manifest[filename]
+
+    def _finish(self):
+        now = time.time()
+        expires = timedelta(days=MINIO_URL_EXPIRY_DAYS)
+        for filename in self._outputs:
+            entry = self._manifest[filename]
+            object_name = f"{self.session_id}/{filename}"
+            if filename in self._uploads:
+                try:
+                    self._uploads[filename].result()
+                except Exception as e:
+                    # Xóa hash để lần đồng bộ sau upload lại file này
+                    entry.update(sha256=None, size=None, url=None)
+                    self.links.append({"filename": filename, "error": f"Upload failed: {e}"})
+                    continue
+                entry.update(input=False, object=object_name, url=None)
+
+            # Tạo URL tải về mới khi chưa có hoặc sắp hết hạn
+            if not entry.get("url") or entry.get("url_expires", 0) - now < MINIO_URL_REFRESH_MARGIN:
+                entry["url"] = MINIO_CLIENT.presigned_get_object(BUCKET_NAME, object_name, expires=expires)
+                entry["url_expires"] = now + expires.total_seconds()
+            self.links.append({"filename": filename, "url": entry["url"]})
+        save_manifest(self.session_dir, self._manifest)
+
+
+def sync_session_outputs(session_id: str, session_dir: str) -> list:
+    """Upload lên MinIO các file được tạo mới hoặc thay đổi kể từ lần đồng bộ trước.
+
+    File không đổi (so size/mtime, rồi tới hash nội dung) không bị upload lại và
+    dùng lại presigned URL cũ cho tới khi URL gần hết hạn.
+
+    Returns:
+        Danh sách {"filename", "url"} của mọi file output trong session.
+    """
+    with OutputSync(session_id, session_dir) as sync:
+        pass
+    return sync.links
@@ -0,0 +1,91 @@
+import json
+
+# Kiểu giá trị ô/scalar chấp nhận trong operation (những gì JSON gửi lên được)
+SCALAR = (str, int, float, bool, type(None))
+
+_TYPE_NAMES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    dict: "object",
+    list: "array",
+    type(None): "null",
+}
+
+
+def _type_name(types) -> str:
+    types = types if isinstance(types, tuple) else (types,)
+    return " | ".join(_TYPE_NAMES.get(t, t.__name__) for t in types)
+
+
+def _check_type(value, types) -> bool:
+    types = types if isinstance(types, tuple) else (types,)
+    # bool là subclass của int nhưng không được dùng thay cho số
+    if isinstance(value, bool) and bool not in types:
+        return False
+    return isinstance(value, types)
+
+
+def _field_error(value, spec: dict):
+    """Thông báo lỗi của một trường theo spec, hoặc None nếu hợp lệ."""
+    if not _check_type(value, spec['type']):
+        return f"must be {_type_name(spec['type'])}, got {_type_name(type(value))}"
+    if 'choices' in spec and value not in spec['choices']:
+        return f"must be one of {', '.join(repr(c) for c in spec['choices'])}"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if 'min' in spec and value < spec['min']:
+            return f"must be >= {spec['min']}"
+        if 'max' in spec and value > spec['max']:
+            return f"must be <= {spec['max']}"
+    if spec.get('nonempty') and isinstance(value, (str, dict, list)) and not value:
+        return "must not be empty"
+    return None
+
+
+def validate_operations(operations, schemas: dict) -> list:
+    """Kiểm tra danh sách operation theo schema, trước khi sinh code hay chạy sandbox.
+
+    Args:
+        operations: Danh sách operation từ request
+        schemas: {type: {tên trường: spec}}; spec gồm 'type' và tùy chọn 'required',
+            'choices', 'min', 'max', 'nonempty'. Trường không có trong schema là lỗi.
+
+    Returns:
+        Danh sách lỗi [{index, type, field, error}] (rỗng nếu hợp lệ); index bắt đầu từ 0
+    """
+    if not isinstance(operations, list):
+        return [{"index": None, "type": None, "field": "operations", "error": "must be an array"}]
+
+    errors = []
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict):
+            errors.append({"index": index, "type": None, "field": None,
+                           "error": f"operation must be an object, got {_type_name(type(op))}"})
+            continue
+        op_type = op.get('type')
+        schema = schemas.get(op_type) if isinstance(op_type, str) else None
+        if schema is None:
+            errors.append({"index": index, "type": op_type, "field": "type",
+                           "error": f"unknown operation type, expected one of {', '.join(sorted(schemas))}"})
+            continue
+        for field, spec in schema.items():
+            if field not in op:
+                if spec.get('required'):
+                    errors.append({"index": index, "type": op_type, "field": field, "error": "is required"})
+                continue
+            message = _field_error(op[field], spec)
+            if message:
+                errors.append({"index": index, "type": op_type, "field": field, "error": message})
+        for field in op:
+            if field != 'type' and field not in schema:
+                errors.append({"index": index, "type": op_type, "field": field,
+                               "error": f"unknown field, expected {', '.join(schema) or 'no fields'}"})
+    return errors
+
+
+def format_errors(errors: list) -> str:
+    """Kết quả trả về khi operations không hợp lệ: một dòng mô tả và mỗi lỗi một dòng JSON."""
+    lines = [f"Lỗi: {len(errors)} lỗi trong operations, chưa chạy operation nào:"]
+    lines += [json.dumps(error, ensure_ascii=False, default=str) for error in errors]
+    return "\n".join(lines)
@@ -1,14 +1,27 @@
 """Word operations module for handling various Word document operations."""
 
-from .replace import replace_text_operation, replace_paragraph_operation
+from . import delete, insert, replace
+from .replace import replace_text_operation, replace_paragraph_operation, batch_replace_operations
 from .insert import insert_text_operation, insert_heading_operation
 from .delete import delete_paragraph_operation
 
+# Schema của mọi operation Word (custom_code được xử lý trực tiếp trong office_word.py)
+SCHEMAS = {
+    **replace.SCHEMA,
+    **insert.SCHEMA,
+    **delete.SCHEMA,
+    'custom_code': {
+        'code': {'type': str, 'required': True, 'nonempty': True},
+    },
+}
+
 __all__ = [
     'read_word_content',
     'replace_text_operation',
     'replace_paragraph_operation',
+    'batch_replace_operations',
     'insert_text_operation',
     'insert_heading_operation',
     'delete_paragraph_operation',
+    'SCHEMAS',
 ]
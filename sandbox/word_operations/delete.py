@@ -1,3 +1,10 @@
+SCHEMA = {
+    'delete_paragraph': {
+        'keyword': {'type': str, 'required': True, 'nonempty': True},
+    },
+}
+
+
 def delete_paragraph_operation(op: dict) -> str:
     """Tạo code để xóa paragraph trong Word document.
     
@@ -1,3 +1,14 @@
+SCHEMA = {
+    'insert_text': {
+        'text': {'type': str, 'required': True},
+    },
+    'insert_heading': {
+        'text': {'type': str, 'required': True},
+        'level': {'type': int, 'min': 0, 'max': 9},
+    },
+}
+
+
 def insert_text_operation(op: dict) -> str:
     """Tạo code để thêm text vào Word document.
     
@@ -1,30 +1,45 @@
+SCHEMA = {
+    'replace': {
+        'old': {'type': str, 'required': True, 'nonempty': True},
+        'new': {'type': str, 'required': True},
+    },
+    'replace_paragraph': {
+        'index': {'type': int, 'required': True, 'min': 0},
+        'new_text': {'type': str, 'required': True},
+    },
+}
+
+
+def batch_replace_operations(operations: list) -> list:
+    """Gộp các operation replace liền nhau thành một, để cả nhóm được thay trong một lần duyệt document."""
+    batched = []
+    for op in operations:
+        if op.get('type') != 'replace':
+            batched.append(op)
+            continue
+        pair = [op.get('old'), op.get('new')]
+        last = batched[-1] if batched else None
+        if last and last.get('type') == 'replace' and 'pairs' in last:
+            last['pairs'].append(pair)
+        else:
+            batched.append({'type': 'replace', 'pairs': [pair]})
+    return batched
+
+
 def replace_text_operation(op: dict) -> str:
     """Tạo code để thay thế text trong Word document.
     
     Args:
-        op: Dictionary chứa 'old' và 'new' text
+        op: Dictionary chứa 'old' và 'new' text, hoặc 'pairs' (danh sách [old, new])
+            sau khi được gộp bởi batch_replace_operations
     """
-    old_text = op.get('old')
-    new_text = op.get('new')
+    pairs = op.get('pairs') or [[op.get('old'), op.get('new')]]
     
+    # Engine nằm trong image (sandbox_runtime.word_ops): một regex cho mọi cặp,
+    # một lần duyệt body/bảng lồng nhau/header/footer, chỉ sửa các run có chỗ khớp
     code = f'''
 # Replace text operation
-old_text = {repr(old_text)}
-new_text = {repr(new_text)}
-count = 0
-for paragraph in doc.paragraphs:
-    if old_text in paragraph.text:
-        paragraph.text = paragraph.text.replace(old_text, new_text)
-        count += 1
-for table in doc.tables:
-    for row in table.rows:
-        for cell in row.cells:
-            if old_text in cell.text:
-                cell.text = cell.text.replace(old_text, new_text)
-                count += 1
-print(f"- Replaced '{{old_text}}' -> '{{new_text}}' (Found: {{count}})")
-if count == 0:
-    print(f"- Warning: '{{old_text}}' not found to replace!")
+replace_all(doc, {repr(pairs)})
 '''
     return code
 
@@ -0,0 +1,5 @@
+"""Code chạy bên trong image python-sandbox.
+
+Package này được COPY vào image (xem Dockerfile) và chỉ phụ thuộc vào thư viện
+chuẩn cùng các thư viện đã cài trong image, không import gì từ package `sandbox`.
+"""
@@ -0,0 +1,453 @@
+"""Các operation của edit_excel_document, chạy bên trong sandbox.
+
+Host chỉ gửi một plan JSON ({"filename", "sheet_name", "operations", "explain"}),
+đã được tối ưu (xem sandbox/excel_operations/plan.py); code của
+các operation nằm sẵn trong image (đã compile bytecode) thay vì được ghép thành
+script mới cho mỗi lần edit.
+
+Mỗi operation nhận `ns` (namespace của script: wb, ws, df, file_path...) và dict
+của operation. `custom_code` chạy trong chính namespace đó nên dùng được các biến
+và helper như trước (copy_cell_formatting, apply_smart_format, write_frame...).
+"""
+import os
+import re
+import json
+import traceback
+import pandas as pd
+import openpyxl
+from openpyxl.styles import Font
+from openpyxl.utils import column_index_from_string, get_column_letter
+from sandbox_runtime import sheet_cache, versions
+from sandbox_runtime.files import DATA_DIR, find_excel_file
+from sandbox_runtime.saving import save_atomic, format_save_stats
+from sandbox_runtime.styles import copy_cell_formatting, apply_smart_format, StyleCache
+from sandbox_runtime.worksheet import header_index, worksheet_to_frame, delete_rows, write_frame, write_frame_file
+
+# Các operation cần DataFrame của sheet; những operation khác chỉ làm việc với ws
+DATAFRAME_OPERATIONS = {'add_column', 'filter', 'create_summary'}
+
+# Các operation có thể đổi dòng tiêu đề (hoặc ws): tra cứu cột phải làm lại sau chúng
+HEADER_OPERATIONS = {'add_column', 'add_row', 'custom_code'}
+
+_RATIO_KEYWORDS = ['margin', 'ratio', 'rate', '%']
+
+
+def _headers(ns):
+    """{tiêu đề dòng 1 (đã strip): index cột} của ws, tạo một lần và dùng lại giữa các operation."""
+    ws = ns['ws']
+    cached = ns.get('_headers')
+    if cached is None or cached[0] is not ws:
+        headers = {}
+        for cell in next(ws.iter_rows(min_row=1, max_row=1), ()):
+            if cell.value is not None:
+                headers.setdefault(str(cell.value).strip(), cell.column)
+        cached = ns['_headers'] = (ws, headers)
+    return cached[1]
+
+
+def _column_index(ns, col_name):
+    if isinstance(col_name, int) and not isinstance(col_name, bool):
+        # Số thứ tự cột, bắt đầu từ 1 (1 = A); get_column_letter báo lỗi nếu ngoài khoảng hợp lệ
+        try:
+            get_column_letter(col_name)
+        except ValueError:
+            return None
+        return col_name
+    # Tìm index cột theo tiêu đề ở dòng 1 (không cần DataFrame)
+    col_idx = _headers(ns).get(col_name.strip()) if isinstance(col_name, str) else None
+    if col_idx is None:
+        # Thử parse chữ cái cột (A, B, C...)
+        try:
+            col_idx = column_index_from_string(str(col_name))
+        except ValueError:
+            col_idx = None
+    return col_idx
+
+
+def update_cells(ns, op):
+    """Ghi nhiều ô một lượt: tiêu đề cột và số dòng cuối của sheet chỉ tính một lần."""
+    ws = ns['ws']
+    max_row = ws.max_row
+    for item in op.get('cells') or [op]:
+        row = item.get('row')
+        col_name = item.get('column')
+        value = item.get('value')
+
+        col_idx = _column_index(ns, col_name)
+        if not col_idx:
+            print(f"- Column '{col_name}' not found to update")
+            continue
+
+        target_cell = ws.cell(row=row, column=col_idx)
+
+        # Tìm cell mẫu cùng cột (thường là dòng tiêu đề hoặc dòng dữ liệu khác) để lấy định dạng
+        source_row = 2 if row != 2 else (3 if max_row >= 3 else 1)
+        source_cell = ws.cell(row=source_row, column=col_idx) if source_row <= max_row else None
+
+        # Nếu cell chưa có style, thử sao chép định dạng đầy đủ (font, border, fill...)
+        if not target_cell.has_style and source_cell:
+            copy_cell_formatting(source_cell, target_cell)
+
+        # Cập nhật giá trị
+        target_cell.value = value
+        max_row = max(max_row, row)
+        if row == 1:
+            ns['_headers'] = None
+
+        # Tinh chỉnh định dạng số (Ưu tiên copy đơn vị từ source_cell)
+        apply_smart_format(target_cell, value, col_name, source_cell)
+
+        print(f"- Updated cell at row {row}, column {col_name} to '{value}' with unit preserved")
+
+
+def add_column(ns, op):
+    ws, df = ns['ws'], ns['df']
+    col_name = op.get('name')
+    formula = op.get('formula')
+    try:
+        df[col_name] = df.eval(formula)
+        new_col_idx = ws.max_column + 1
+
+        # Tìm cột mẫu để sao chép định dạng (lấy cột cuối cùng trước cột mới)
+        source_col_idx = ws.max_column
+
+        # Thêm header
+        new_header = ws.cell(row=1, column=new_col_idx, value=col_name)
+        if source_col_idx > 0:
+            source_header = ws.cell(row=1, column=source_col_idx)
+            copy_cell_formatting(source_header, new_header)
+
+        # Thêm dữ liệu và sao chép định dạng (mỗi style nguồn chỉ resolve một lần)
+        styles = StyleCache()
+        # Nếu cột gốc là tiền tệ/số và chúng ta đang tính tỉ lệ (margin/ratio)
+        is_ratio = any(keyword in col_name.lower() for keyword in _RATIO_KEYWORDS)
+        for i, val in enumerate(df[col_name], start=2):
+            new_cell = ws.cell(row=i, column=new_col_idx, value=val)
+
+            if source_col_idx > 0:
+                source_cell = ws.cell(row=i, column=source_col_idx)
+                number_format = None
+                # Tinh chỉnh định dạng số nếu cần; định dạng đặc biệt của cột nguồn được giữ nguyên
+                if isinstance(val, (int, float)) and (not source_cell.number_format or source_cell.number_format == 'General'):
+                    # Áp dụng định dạng số mặc định đẹp hơn
+                    number_format = '0.00%' if is_ratio else '#,##0.00'
+                styles.copy(source_cell, new_cell, number_format)
+
+        # Cập nhật AutoFilter để bao phủ cả cột mới
+        ws.auto_filter.ref = f"A1:{get_column_letter(new_col_idx)}{ws.max_row}"
+
+        print(f"- Added column '{col_name}' with formula '{formula}' with professional formatting and updated filter")
+    except Exception as e:
+        print(f"- Error adding column '{col_name}': {e}")
+        traceback.print_exc()
+
+
+def _unique_sheet_name(wb, base_name):
+    new_sheet_name = base_name
+    counter = 1
+    while new_sheet_name in wb.sheetnames:
+        new_sheet_name = f"{base_name} ({counter})"
+        counter += 1
+    return new_sheet_name
+
+
+def filter_rows(ns, op):
+    wb, ws, df = ns['wb'], ns['ws'], ns['df']
+    col = op.get('column')
+    op_sign = op.get('operator')
+    val = op.get('value')
+
+    if op_sign == ">":
+        df_filtered = df[df[col] > val]
+    elif op_sign == "<":
+        df_filtered = df[df[col] < val]
+    elif op_sign in ("==", "="):
+        df_filtered = df[df[col] == val]
+    else:
+        print(f"- Operator '{op_sign}' is not supported for filter")
+        return
+
+    new_sheet_name = _unique_sheet_name(wb, f"Filtered_{col}")
+    ws_new = wb.create_sheet(new_sheet_name)
+
+    # Ghi header và data theo từng dòng, giữ định dạng tiêu đề/cột của sheet gốc
+    header_cells = [ws.cell(row=1, column=j) for j in range(1, len(df_filtered.columns) + 1)]
+    body_cells = [ws.cell(row=2, column=j) for j in range(1, len(df_filtered.columns) + 1)] if ws.max_row >= 2 else None
+    write_frame(ws_new, df_filtered, header_cells=header_cells, body_cells=body_cells)
+    print(f"- Đã lọc dữ liệu {col} {op_sign} {val} vào sheet '{new_sheet_name}'")
+
+
+def add_row(ns, op):
+    ws = ns['ws']
+    data = op.get('data') or {}
+    position = op.get('position')  # None = thêm vào cuối
+    try:
+        # Tìm index cột theo tiêu đề ở dòng 1 trước khi chèn dòng
+        headers = _headers(ns)
+        col_indexes = {col_name: headers.get(str(col_name).strip()) for col_name in data}
+
+        # Xác định vị trí row mới và row mẫu để sao chép định dạng
+        if position is not None and position <= ws.max_row:
+            # Chèn vào giữa, cần dịch chuyển các row xuống
+            ws.insert_rows(position)
+            new_row_idx = position
+            # Lấy row ngay trước hoặc sau vị trí chèn làm mẫu
+            source_row_idx = position - 1 if position > 1 else position + 1
+        else:
+            # Thêm vào cuối
+            new_row_idx = ws.max_row + 1
+            # Lấy row cuối cùng hiện có làm mẫu
+            source_row_idx = ws.max_row
+
+        # Thêm dữ liệu vào row mới
+        for col_name, value in data.items():
+            col_idx = col_indexes[col_name]
+            if col_idx is None:
+                print(f"- Cảnh báo: Không tìm thấy cột '{col_name}', bỏ qua")
+                continue
+
+            new_cell = ws.cell(row=new_row_idx, column=col_idx, value=value)
+
+            # Sao chép định dạng
+            source_cell = ws.cell(row=source_row_idx if source_row_idx > 0 else 1, column=col_idx)
+            copy_cell_formatting(source_cell, new_cell)
+
+            # Tinh chỉnh định dạng số nếu cần
+            if isinstance(value, (int, float)):
+                if new_cell.number_format == 'General' or not new_cell.number_format:
+                    is_ratio = any(keyword in str(col_name).lower() for keyword in _RATIO_KEYWORDS)
+                    if is_ratio:
+                        new_cell.number_format = '0.00%'
+                    elif isinstance(value, float):
+                        new_cell.number_format = '#,##0.00' if abs(value) >= 1 else '0.00'
+                    else:
+                        new_cell.number_format = '#,##0'
+
+        print(f"- Đã thêm dòng mới tại vị trí {new_row_idx} với định dạng chuyên nghiệp")
+    except Exception as e:
+        print(f"- Lỗi thêm dòng: {e}")
+        traceback.print_exc()
+
+
+def delete_matching_rows(ns, op):
+    """Xóa các dòng khớp một trong các điều kiện {column, value}, duyệt sheet và dời ô một lần."""
+    ws = ns['ws']
+    conditions = op.get('conditions') or [{'column': op.get('column'), 'value': op.get('value')}]
+    try:
+        # Các cột cần so khớp, theo tiêu đề ở dòng 1
+        targets = {}
+        for condition in conditions:
+            col_idx = _headers(ns).get(str(condition['column']).strip())
+            if col_idx:
+                targets.setdefault(col_idx, set()).add(str(condition['value']))
+            else:
+                print(f"- Không tìm thấy cột '{condition['column']}' để xóa dòng")
+        if not targets:
+            return
+
+        first_col, last_col = min(targets), max(targets)
+        checks = [(col_idx - first_col, values) for col_idx, values in targets.items()]
+        rows_to_delete = [
+            r for r, values in enumerate(
+                ws.iter_rows(min_row=2, min_col=first_col, max_col=last_col, values_only=True), start=2
+            )
+            if any(values[i] is not None and str(values[i]) in wanted for i, wanted in checks)
+        ]
+        # Xóa mọi dòng khớp trong một lần dời ô (không gọi ws.delete_rows từng dòng)
+        delete_rows(ws, rows_to_delete)
+        described = " hoặc ".join(f"{c['column']} = '{c['value']}'" for c in conditions)
+        print(f"- Đã xóa {len(rows_to_delete)} dòng có {described}")
+    except Exception as e:
+        print(f"- Lỗi xóa dòng: {e}")
+
+
+def create_summary(ns, op):
+    wb, df = ns['wb'], ns['df']
+    summary = df.describe()
+    new_sheet_name = _unique_sheet_name(wb, op.get('sheet_name') or 'Summary')
+    ws_sum = wb.create_sheet(new_sheet_name)
+
+    summary.index.name = "Statistic"
+    write_frame(ws_sum, summary, index=True)
+    print(f"- Created summary sheet '{new_sheet_name}'")
+
+
+def custom_code(ns, op):
+    warnings = op.get('warnings')
+    if warnings:
+        print("⚠️ WARNING: " + ", ".join(warnings) + "\n💡 Use ws.cell() and wb.save() to keep format.")
+    try:
+        exec(op.get('code') or '', ns)
+        print("- Done custom code.")
+    except Exception as e:
+        print(f"- Error: {e}")
+        traceback.print_exc()
+
+
+OPERATIONS = {
+    'update_cell': update_cells,
+    'update_cells': update_cells,
+    'add_column': add_column,
+    'filter': filter_rows,
+    'add_row': add_row,
+    'delete_rows': delete_matching_rows,
+    'create_summary': create_summary,
+    'custom_code': custom_code,
+}
+
+
+def _uses_dataframe(op):
+    if op.get('type') == 'custom_code':
+        return bool(re.search(r'\bdf\b', op.get('code') or ''))
+    return op.get('type') in DATAFRAME_OPERATIONS
+
+
+def load_frame(ns):
+    """DataFrame của sheet: cache Arrow nếu có, không thì lấy từ ws đã load.
+    Chỉ parse lại file bằng pandas khi sheet có công thức (ws không có giá trị đã tính)."""
+    file_path, target_sheet = ns['file_path'], ns['target_sheet']
+    frame = sheet_cache.load_frame(file_path, target_sheet)
+    if frame is None:
+        frame = worksheet_to_frame(ns['ws'])
+        if frame is None:
+            frame = pd.read_excel(file_path, sheet_name=target_sheet)
+        try:
+            sheet_cache.store_frame(file_path, target_sheet, frame)
+        except Exception as e:
+            print(f"Warning: cannot cache sheet: {e}")
+    frame.columns = [c.strip() if isinstance(c, str) else c for c in frame.columns]
+    return frame
+
+
+def _open_workbook(ns, filename):
+    file_path = os.path.join(DATA_DIR, filename)
+    # Kernel mode: dùng lại workbook mà lần edit trước giữ trong bộ nhớ
+    kernel_take = ns.get('kernel_take') or (lambda path: None)
+    wb = kernel_take(file_path)
+    if wb is not None:
+        return wb
+    try:
+        # data_only=False: giữ công thức thay vì giá trị; keep_vba=True: giữ VBA macro nếu có
+        return openpyxl.load_workbook(file_path, data_only=False, keep_vba=True)
+    except Exception as e:
+        # If can't open using openpyxl (maybe .xls or corrupted)
+        if "not a zip file" in str(e).lower() or "BadZipFile" in str(type(e)):
+            print(f"Error: The file '{filename}' is corrupted or not a valid Excel (.xlsx) file.")
+            print("This often happens if a previous operation timed out while saving.")
+            print("Tip: You can try downloading the original file again to start fresh.")
+        else:
+            print(f"Error: Can't open file using openpyxl engine. {e}")
+        return None
+
+
+def _output_filename(filename):
+    base, ext = os.path.splitext(filename)
+    # Ensure ext is always .xlsx if file origin doesn't have ext or is .xls (convert to .xlsx)
+    if not ext or ext.lower() == '.xls':
+        ext = '.xlsx'
+    if base.endswith('_edited'):
+        return f"{base}{ext}"
+    return f"{base}_edited{ext}"
+
+
+def _track_version(filename):
+    try:
+        return versions.track(filename, DATA_DIR)
+    except Exception as e:
+        print(f"- Warning: Can't record version history: {e}")
+        return None
+
+
+def _record_version(filename, parent, history):
+    try:
+        entry = versions.record(filename, parent, history, DATA_DIR)
+    except Exception as e:
+        print(f"- Warning: Can't record version history: {e}")
+        return
+    print(f"Version: v{entry['version']} (parent v{parent})" if parent else f"Version: v{entry['version']}")
+
+
+def edit_workbook(plan, ns=None):
+    """Chạy plan edit Excel, lưu ra file `_edited`. Trả về exit code.
+
+    Args:
+        plan: dict hoặc chuỗi JSON {"filename", "sheet_name", "operations": [...], "explain": [...],
+            "compresslevel", "version", "history"}; compresslevel là mức nén khi lưu (bỏ trống =
+            mặc định), version là version cần sửa tiếp (bỏ trống = file theo find_excel_file),
+            history là mô tả các bước ghi vào lịch sử version
+        ns: Namespace của script gọi (globals()); custom_code chạy trong đó và
+            kernel_take/kernel_put của kernel mode được lấy từ đó
+    """
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    ns = ns if ns is not None else {}
+    operations = plan.get('operations') or []
+
+    if plan.get('version') is not None:
+        # Rẽ nhánh / quay lại: khôi phục snapshot của version rồi sửa tiếp từ đó
+        try:
+            filename = versions.checkout(plan['version'], DATA_DIR)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+    else:
+        filename = find_excel_file(plan.get('filename'))
+    if not filename:
+        print("Error: File Excel not found!")
+        return 1
+    file_path = os.path.join(DATA_DIR, filename)
+    print(f"Processing file: {filename}")
+    parent = _track_version(filename)
+
+    wb = _open_workbook(ns, filename)
+    if wb is None:
+        return 1
+
+    target_sheet = plan.get('sheet_name')
+    if not (target_sheet and target_sheet in wb.sheetnames):
+        target_sheet = wb.sheetnames[0]
+    ws = wb[target_sheet]
+    print(f"Processing sheet: {target_sheet}")
+
+    ns.update(
+        pd=pd, openpyxl=openpyxl, Font=Font, os=os, json=json,
+        copy_cell_formatting=copy_cell_formatting, apply_smart_format=apply_smart_format,
+        StyleCache=StyleCache, header_index=header_index, delete_rows=delete_rows,
+        write_frame=write_frame, write_frame_file=write_frame_file,
+        filename=filename, file_path=file_path, wb=wb, ws=ws, target_sheet=target_sheet, df=None,
+        _headers=None,
+    )
+    # Chỉ tạo DataFrame khi có operation cần tới, trước khi ws bị sửa
+    if any(_uses_dataframe(op) for op in operations):
+        ns['df'] = load_frame(ns)
+
+    if plan.get('explain'):
+        print("Plan:\n" + "\n".join(f"  {line}" for line in plan['explain']))
+
+    for op in operations:
+        handler = OPERATIONS.get(op.get('type'))
+        if handler is None:
+            print(f"- Warning: Operation type '{op.get('type')}' is not supported")
+            continue
+        handler(ns, op)
+        if op.get('type') in HEADER_OPERATIONS:
+            ns['_headers'] = None
+
+    # Save edited file with all formats
+    wb = ns['wb']
+    output_filename = _output_filename(filename)
+    save_path = os.path.join(DATA_DIR, output_filename)
+    compresslevel = plan.get('compresslevel')
+    try:
+        # Ghi ra file tạm rồi đổi tên: lỗi/timeout giữa chừng không làm hỏng file đích
+        elapsed, size = save_atomic(wb, save_path, compresslevel)
+    except Exception as e:
+        print(f"Can't save file: {e}")
+        return 1
+    kernel_put = ns.get('kernel_put') or (lambda path, obj: None)
+    kernel_put(save_path, wb)
+    print(f"\nDone saving edited file: {output_filename}")
+    print(format_save_stats(elapsed, size, compresslevel))
+    _record_version(output_filename, parent, plan.get('history'))
+    print("All original formats have been kept.")
+    return 0
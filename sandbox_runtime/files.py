@@ -0,0 +1,139 @@
+"""Chọn file Excel/Word trong thư mục session và clone file (dùng chung cho container và host).
+
+Thư mục session do script trong sandbox ghi được, còn một số người đọc chạy trên host
+(fast path, checkout version): `open_regular` / `write_atomic` không bao giờ đi theo
+symlink mà script có thể đặt vào session.
+"""
+import os
+import stat
+import shutil
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl FICLONE của Linux (reflink trên btrfs/xfs...)
+FICLONE = 0x40049409
+
+DATA_DIR = "/app/data"
+
+
+def find_excel_file(target_name=None, data_dir=DATA_DIR):
+    files = os.listdir(data_dir)
+    if target_name:
+        if target_name in files: return target_name
+        for ext in ['.xlsx', '.xls']:
+            if f"{target_name}{ext}" in files: return f"{target_name}{ext}"
+
+    excel_files = [f for f in files if f.endswith(('.xlsx', '.xls'))]
+    # Khi EDIT, ưu tiên file đã edit trước đó để có thể sửa tiếp (chaining)
+    # Nhưng nếu edit lần đầu thì lấy file gốc
+    edited_files = [f for f in excel_files if f.endswith('_edited.xlsx')]
+    if edited_files: return edited_files[0]
+    if excel_files: return excel_files[0]
+    return None
+
+
+def find_word_file(target_name=None, data_dir=DATA_DIR):
+    files = os.listdir(data_dir)
+    if target_name:
+        if target_name in files: return target_name
+        if not target_name.endswith('.docx'):
+            if f"{target_name}.docx" in files: return f"{target_name}.docx"
+
+    docx_files = [f for f in files if f.endswith('.docx')]
+    # Ưu tiên file đã sửa trước đó
+    edited_files = [f for f in docx_files if f.endswith('_edited.docx')]
+    if edited_files: return edited_files[0]
+    if docx_files: return docx_files[0]
+    return None
+
+
+def inside(path, root):
+    """True nếu `path` (sau khi giải symlink) là `root` hoặc nằm trong `root`."""
+    path, root = os.path.realpath(path), os.path.realpath(root)
+    return path == root or path.startswith(root + os.sep)
+
+
+def is_real_dir(path):
+    """True nếu `path` là thư mục thật (không phải symlink tới thư mục)."""
+    try:
+        return stat.S_ISDIR(os.lstat(path).st_mode)
+    except OSError:
+        return False
+
+
+def open_regular(path, root):
+    """Mở `path` để đọc (binary): chỉ file thường nằm trong `root`, không đi theo symlink.
+
+    Raises:
+        ValueError: `path` là symlink, thư mục, FIFO... hoặc nằm ngoài `root`
+        OSError: như open() (file không tồn tại...)
+    """
+    name = os.path.basename(path)
+    if not stat.S_ISREG(os.lstat(path).st_mode) or not inside(os.path.dirname(path), root):
+        raise ValueError(f"'{name}' is not a regular file in the session")
+    # O_NOFOLLOW: tên bị đổi thành symlink ngay sau lstat thì open báo lỗi (ELOOP)
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        os.close(fd)
+        raise ValueError(f"'{name}' is not a regular file in the session")
+    return os.fdopen(fd, "rb")
+
+
+def write_atomic(path, data):
+    """Ghi ra `path` qua file tạm mới tạo (O_EXCL, không đi theo symlink) + os.replace.
+
+    `data` là bytes, hoặc hàm nhận file object (binary) và tự ghi vào đó.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if callable(data):
+                data(f)
+            else:
+                f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def clone_file(src: str, dst: str, hardlink: bool = False):
+    """Tạo `dst` có nội dung giống `src` với chi phí thấp nhất: reflink, (hardlink) rồi mới copy.
+
+    `dst` được tạo qua file tạm cùng thư mục rồi os.replace nên luôn atomic.
+    """
+    target_dir = os.path.dirname(dst)
+    fd, tmp_path = tempfile.mkstemp(dir=target_dir, prefix=f".{os.path.basename(dst)}.", suffix=".link")
+    os.close(fd)
+    try:
+        cloned = False
+        if fcntl:
+            try:
+                with open(src, "rb") as s, open(tmp_path, "wb") as d:
+                    fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+                cloned = True
+            except OSError:
+                pass
+        if not cloned:
+            os.remove(tmp_path)
+            try:
+                if not hardlink:
+                    raise OSError("hardlink disabled")
+                os.link(src, tmp_path)
+            except OSError:
+                shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
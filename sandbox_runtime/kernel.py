@@ -0,0 +1,196 @@
+"""Kernel Python sống lâu cho một session (kernel mode).
+
+Server (`python -m sandbox_runtime.kernel serve`) giữ nguyên globals, module đã
+import và các object đã load (wb/doc...) giữa các lần gọi. Mỗi job được gửi
+bằng client (`python -m sandbox_runtime.kernel run <file.py>`) qua unix socket;
+client in output của job và thoát với exit code của job.
+"""
+import gc
+import io
+import os
+import sys
+import json
+import time
+import socket
+from sandbox_runtime.runner import preload, exec_script
+
+SOCKET_PATH = "/tmp/sandbox-kernel.sock"
+DATA_DIR = "/app/data"
+
+# Exit code đặc biệt của client để host biết cần khởi động lại kernel
+EXIT_TIMEOUT = 124
+EXIT_UNAVAILABLE = 125
+
+_END = b"\0"
+
+
+class ObjectCache:
+    """Cache object theo đường dẫn file, chỉ hợp lệ khi file chưa bị thay đổi."""
+
+    def __init__(self):
+        self._items = {}
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def take(self, path):
+        """Lấy object ra khỏi cache (người gọi sẽ sửa object nên không giữ lại)."""
+        path = os.path.abspath(path)
+        item = self._items.pop(path, None)
+        if item and item[0] == self._stamp(path):
+            return item[1]
+        return None
+
+    def put(self, path, obj):
+        """Ghi nhớ object tương ứng với nội dung hiện tại của file `path`."""
+        path = os.path.abspath(path)
+        stamp = self._stamp(path)
+        if stamp:
+            self._items[path] = (stamp, obj)
+
+    def clear(self):
+        self._items.clear()
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class _SocketWriter(io.TextIOBase):
+    def __init__(self, conn):
+        self._conn = conn
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        data = s.replace("\0", "").encode("utf-8", "replace")
+        if data:
+            self._conn.sendall(data)
+        return len(s)
+
+
+def _run_job(namespace, path, writer):
+    """Chạy file `path` trong namespace của kernel, trả về exit code."""
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = writer
+    try:
+        exit_code = exec_script(path, namespace)
+    finally:
+        sys.stdout, sys.stderr = old_stdout, old_stderr
+        try:
+            os.chdir(DATA_DIR)
+        except OSError:
+            pass
+    return exit_code
+
+
+def serve():
+    soft_limit = int(os.getenv("KERNEL_MEM_SOFT_LIMIT", "0"))
+    preload()
+    cache = ObjectCache()
+    namespace = {
+        "__name__": "__main__",
+        "__builtins__": __builtins__,
+        "kernel_take": cache.take,
+        "kernel_put": cache.put,
+    }
+    os.chdir(DATA_DIR)
+
+    if os.path.exists(SOCKET_PATH):
+        os.remove(SOCKET_PATH)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(SOCKET_PATH)
+    server.listen(1)
+
+    while True:
+        conn, _ = server.accept()
+        with conn:
+            try:
+                request = json.loads(conn.makefile("rb").readline())
+            except ValueError:
+                continue
+            start = time.perf_counter()
+            exit_code = _run_job(namespace, request["path"], _SocketWriter(conn))
+            restart = False
+            if soft_limit and _rss_bytes() > soft_limit:
+                # Vượt ngưỡng bộ nhớ: bỏ cache trước, nếu vẫn vượt thì dừng kernel
+                cache.clear()
+                gc.collect()
+                restart = _rss_bytes() > soft_limit
+            trailer = {
+                "exit_code": exit_code,
+                "elapsed": round(time.perf_counter() - start, 3),
+                "rss": _rss_bytes(),
+                "restart": restart,
+            }
+            conn.sendall(_END + json.dumps(trailer).encode("utf-8"))
+        try:
+            os.remove(request["path"])
+        except OSError:
+            pass
+        if restart:
+            sys.exit(0)
+
+
+def run(path, timeout):
+    """Gửi job tới kernel server, in output và trả về exit code của job."""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            conn.connect(SOCKET_PATH)
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                print("Kernel is not available.")
+                return EXIT_UNAVAILABLE
+            time.sleep(0.05)
+
+    conn.settimeout(timeout)
+    conn.sendall(json.dumps({"path": path}).encode("utf-8") + b"\n")
+    chunks = []
+    try:
+        while True:
+            data = conn.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+    except socket.timeout:
+        sys.stdout.write(b"".join(chunks).decode("utf-8", "replace"))
+        print(f"\nKernel job timed out after {timeout}s, kernel will be restarted.")
+        return EXIT_TIMEOUT
+    finally:
+        conn.close()
+
+    output, sep, trailer = b"".join(chunks).rpartition(_END)
+    if not sep:
+        output, trailer = trailer, b""
+    sys.stdout.write(output.decode("utf-8", "replace"))
+    try:
+        info = json.loads(trailer)
+    except ValueError:
+        print("\nKernel stopped unexpectedly.")
+        return EXIT_UNAVAILABLE
+    if info.get("restart"):
+        print("\nKernel exceeded its memory limit and was restarted; session state was cleared.")
+    return info["exit_code"]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "serve":
+        serve()
+    elif len(sys.argv) >= 3 and sys.argv[1] == "run":
+        sys.exit(run(sys.argv[2], float(sys.argv[3]) if len(sys.argv) > 3 else 300))
+    else:
+        print("Usage: python -m sandbox_runtime.kernel serve | run <file.py> [timeout]")
+        sys.exit(2)
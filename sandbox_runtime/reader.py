@@ -0,0 +1,521 @@
+"""Các action chỉ đọc (list_sheets, read_excel, read_word).
+
+Cùng một code chạy ở hai nơi:
+- trong container: script do host sinh ra gọi `run(...)` với `/app/data`
+- trên host (fast path): worker `python -m sandbox_runtime.reader serve` đọc
+  request JSON từ stdin, chạy `run(...)` với thư mục session và trả về
+  `{"exit_code", "output"}` trên một dòng stdout. Worker tự giới hạn bộ nhớ
+  bằng RLIMIT_AS (`READER_MEM_LIMIT`).
+
+Thư mục session do script trong sandbox ghi được, nên file luôn được mở bằng
+`open_regular` (chỉ file thường trong session, O_NOFOLLOW) và mọi thư viện chỉ
+đọc qua file object đó, không mở lại theo tên.
+"""
+import io
+import os
+import re
+import sys
+import json
+import itertools
+from collections import OrderedDict
+from sandbox_runtime import sheet_cache, versions
+from sandbox_runtime.files import DATA_DIR, find_excel_file, find_word_file, open_regular
+from sandbox_runtime.worksheet import column_names
+
+
+def _print_invalid_excel(e, filename, out):
+    if "not a zip file" in str(e).lower() or "BadZipFile" in str(type(e)):
+        print(f"Error: The file '{filename}' is corrupted or not a valid Excel (.xlsx) file.", file=out)
+        print("This often happens if a previous operation timed out while saving.", file=out)
+    else:
+        print(f"Error: {e}", file=out)
+
+
+def _local(tag):
+    return tag.rpartition("}")[2]
+
+
+def _column_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - 64
+    return index
+
+
+def _dimension_extent(ref):
+    """`A1:F100` -> (100 dòng, 6 cột); None nếu không đọc được."""
+    match = re.fullmatch(r"\$?([A-Z]+)\$?(\d+)(?::\$?([A-Z]+)\$?(\d+))?", ref or "")
+    if not match:
+        return None
+    c1, r1, c2, r2 = match.groups()
+    c2, r2 = c2 or c1, r2 or r1
+    return int(r2) - int(r1) + 1, _column_index(c2) - _column_index(c1) + 1
+
+
+def _format_bytes(num_bytes):
+    for unit in ("B", "KB", "MB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GB"
+
+
+def sheet_info(path):
+    """Đọc danh sách sheet chỉ từ metadata trong file zip (không parse dữ liệu ô).
+
+    `path` là đường dẫn hoặc file object (binary) đã mở.
+
+    Returns:
+        List {"name", "state", "kind", "ref", "rows", "columns", "xml_size", "compressed_size"};
+        rows/columns lấy từ thẻ <dimension> (None nếu file không ghi).
+    """
+    import zipfile
+    import posixpath
+    import xml.etree.ElementTree as ET
+
+    with zipfile.ZipFile(path) as zf:
+        names = set(zf.namelist())
+        workbook_part = "xl/workbook.xml"
+        if "_rels/.rels" in names:
+            for rel in ET.fromstring(zf.read("_rels/.rels")):
+                if rel.get("Type", "").endswith("/officeDocument"):
+                    workbook_part = rel.get("Target", workbook_part).lstrip("/")
+        base_dir = posixpath.dirname(workbook_part)
+        rels_part = posixpath.join(base_dir, "_rels", posixpath.basename(workbook_part) + ".rels")
+
+        targets = {}
+        if rels_part in names:
+            for rel in ET.fromstring(zf.read(rels_part)):
+                target = rel.get("Target", "")
+                if target.startswith("/"):
+                    target = target.lstrip("/")
+                else:
+                    target = posixpath.normpath(posixpath.join(base_dir, target))
+                targets[rel.get("Id")] = target
+
+        workbook = ET.fromstring(zf.read(workbook_part))
+        if _local(workbook.tag) != "workbook":
+            raise ValueError("File does not contain an Excel workbook.")
+        sheets = []
+        for el in workbook.iter():
+            if _local(el.tag) != "sheet":
+                continue
+            rel_id = next((v for k, v in el.attrib.items() if _local(k) == "id"), None)
+            part = targets.get(rel_id)
+            info = {
+                "name": el.get("name"),
+                "state": el.get("state", "visible"),
+                "kind": "chartsheet" if part and "chartsheets/" in part else "worksheet",
+                "ref": None,
+                "rows": None,
+                "columns": None,
+                "xml_size": None,
+                "compressed_size": None,
+            }
+            if part in names:
+                zinfo = zf.getinfo(part)
+                info["xml_size"] = zinfo.file_size
+                info["compressed_size"] = zinfo.compress_size
+                if info["kind"] == "worksheet":
+                    # <dimension> nằm trước <sheetData>, chỉ cần đọc phần đầu file XML
+                    with zf.open(part) as f:
+                        head = f.read(64 * 1024).decode("utf-8", "ignore")
+                    match = re.search(r"<(?:\w+:)?dimension\s+ref=\"([^\"]+)\"", head)
+                    if re.search(r"<(?:\w+:)?sheetData\s*(?:/>|>\s*</(?:\w+:)?sheetData>)", head):
+                        info["rows"], info["columns"] = 0, 0
+                    elif match:
+                        info["ref"] = match.group(1)
+                        extent = _dimension_extent(info["ref"])
+                        if extent:
+                            info["rows"], info["columns"] = extent
+            sheets.append(info)
+        return sheets
+
+
+def list_sheets(data_dir=DATA_DIR, filename=None, out=None):
+    out = out or sys.stdout
+
+    filename = find_excel_file(filename, data_dir)
+    if not filename:
+        print("Can't find Excel file!", file=out)
+        return 1
+
+    path = os.path.join(data_dir, filename)
+    try:
+        with open_regular(path, data_dir) as source:
+            if filename.lower().endswith(".xls"):
+                # File .xls (BIFF) không phải zip, phải mở bằng pandas
+                import pandas as pd
+                print(f"Sheets in file '{filename}':", file=out)
+                for sheet in pd.ExcelFile(source).sheet_names:
+                    print(f"- {sheet}", file=out)
+                return 0
+
+            sheets = sheet_info(source)
+        print(f"Sheets in file '{filename}':", file=out)
+        for info in sheets:
+            details = []
+            if info["state"] != "visible":
+                details.append(info["state"])
+            if info["kind"] != "worksheet":
+                details.append(info["kind"])
+            elif info["rows"] is not None:
+                details.append(f"{info['rows']} rows x {info['columns']} columns" + (
+                    f" ({info['ref']})" if info["rows"] else ""
+                ))
+            else:
+                details.append("size unknown")
+            if info["xml_size"] is not None:
+                details.append(f"~{_format_bytes(info['xml_size'])} XML")
+            print(f"- {info['name']} [{', '.join(details)}]", file=out)
+        print("\nRow counts include the header row and come from the sheet's <dimension> record.", file=out)
+    except Exception as e:
+        _print_invalid_excel(e, filename, out)
+        return 1
+    return 0
+
+
+# Giới hạn một trang read_excel để phản hồi không quá lớn
+MAX_PAGE_ROWS = 500
+MAX_CELL_WIDTH = 80
+# Số vị trí đọc dở được giữ lại (chỉ có tác dụng trong process sống lâu: worker host, kernel)
+_CURSOR_LIMIT = 4
+_cursors = OrderedDict()
+# Sheet bị đọc ở offset > 0 mà không có cursor từ lần thứ _CACHE_AFTER_READS trở đi
+# (nhảy trang lung tung) thì mới parse hết một lần và lưu cache Arrow
+_CACHE_AFTER_READS = 2
+_offset_reads = OrderedDict()
+_OFFSET_READS_LIMIT = 64
+
+
+class _Cursor:
+    """Sheet đang đọc dở ở chế độ read-only: trang kế tiếp đọc tiếp từ đây thay vì parse lại từ đầu."""
+
+    def __init__(self, wb, source, title, rows, names, header, columns, next_row, last_row, multi_sheet):
+        self.wb = wb
+        self.source = source
+        self.title = title
+        self.rows = rows
+        self.names = names
+        self.header = header
+        self.columns = columns
+        self.next_row = next_row
+        self.last_row = last_row
+        self.multi_sheet = multi_sheet
+
+    def close(self):
+        self.wb.close()
+        self.source.close()
+
+
+def _put_cursor(key, cursor):
+    _cursors[key] = cursor
+    while len(_cursors) > _CURSOR_LIMIT:
+        _, old = _cursors.popitem(last=False)
+        old.close()
+
+
+def _select_columns(header, first_col, usecols):
+    """Vị trí (trong header) của các cột cần lấy.
+
+    `usecols` là chuỗi "A:C,F", "Name,Age" hoặc list tên/chữ cột; tên cột trong
+    header được ưu tiên hơn chữ cột.
+    """
+    from openpyxl.utils import column_index_from_string
+
+    if not usecols:
+        return list(range(len(header)))
+    tokens = usecols if isinstance(usecols, (list, tuple)) else str(usecols).split(",")
+    names = [str(h).strip() if h is not None else None for h in header]
+    selected = []
+    for token in (str(t).strip() for t in tokens):
+        if not token:
+            continue
+        if token in names:
+            selected.append(names.index(token))
+            continue
+        match = re.fullmatch(r"([A-Za-z]{1,3})(?::([A-Za-z]{1,3}))?", token)
+        if not match:
+            raise ValueError(f"Unknown column '{token}' in usecols.")
+        lo = column_index_from_string(match.group(1).upper())
+        hi = column_index_from_string((match.group(2) or match.group(1)).upper())
+        for col in range(min(lo, hi), max(lo, hi) + 1):
+            if 0 <= col - first_col < len(header):
+                selected.append(col - first_col)
+    if not selected:
+        raise ValueError(f"None of the columns in usecols={usecols!r} exist in the sheet.")
+    return list(dict.fromkeys(selected))
+
+
+def _count_offset_read(key):
+    """Đếm số lần đọc nhảy vào giữa sheet `key` (không có cursor); trả về số lần, kể cả lần này."""
+    count = _offset_reads.pop(key, 0) + 1
+    _offset_reads[key] = count
+    while len(_offset_reads) > _OFFSET_READS_LIMIT:
+        _offset_reads.popitem(last=False)
+    return count
+
+
+def _build_sheet_cache(path, sheet):
+    """Parse toàn bộ sheet một lần và lưu vào cache Arrow; trả về Table (None nếu không lưu được)."""
+    import pandas as pd
+
+    cursor = _open_page(open_regular(path, os.path.dirname(path)), sheet, None, None)
+    try:
+        width = len(cursor.names)
+        data = [list(values[:width]) + [None] * (width - len(values)) for values in cursor.rows]
+    finally:
+        cursor.close()
+    # Giống worksheet_to_frame / pd.read_excel: bỏ các dòng trống ở cuối sheet
+    while data and all(v is None for v in data[-1]):
+        data.pop()
+    return sheet_cache.store_frame(path, sheet, pd.DataFrame(data, columns=cursor.names))
+
+
+def _print_cached_page(table, offset, limit, usecols, out):
+    """In một trang từ cache Arrow: chỉ các dòng/cột cần thiết được chuyển sang pandas."""
+    from openpyxl.utils import get_column_letter
+
+    names = table.column_names
+    columns = _select_columns(names, 1, usecols)
+    page = table.slice(offset, limit).select(columns).to_pandas()
+    page.columns = [f"{get_column_letter(i + 1)}:{names[i]}" for i in columns]
+    page.index = range(offset + 2, offset + 2 + len(page))
+    page.index.name = "row"
+    print(page.to_string(max_colwidth=MAX_CELL_WIDTH), file=out)
+
+    remaining = max(table.num_rows - offset - len(page), 0)
+    if len(page):
+        summary = f"\nRows {page.index[0]}-{page.index[-1]} (offset={offset}, {len(page)} rows)"
+    else:
+        summary = f"\nNo rows at offset={offset}"
+    print(f"{summary}, {remaining} more rows below (columnar cache).", file=out)
+    if remaining:
+        print(f"Next page: offset={offset + len(page)}", file=out)
+
+
+def _open_page(source, sheet_name, usecols, cell_range, offset=0):
+    """Mở sheet ở chế độ read-only, đọc dòng header và trả về _Cursor đứng ở dòng dữ liệu thứ `offset`.
+
+    `source` là file object (từ open_regular), thuộc về cursor từ đây: đóng cùng cursor.
+    Các dòng trước `offset` được iter_rows bỏ qua (chỉ quét XML, không tạo cell/tuple).
+    """
+    import openpyxl
+    from openpyxl.utils import range_boundaries, get_column_letter
+
+    try:
+        wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    except BaseException:
+        source.close()
+        raise
+    try:
+        if sheet_name and sheet_name not in wb.sheetnames:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        ws = wb[sheet_name or wb.sheetnames[0]]
+
+        first_col, first_row, last_col, last_row = 1, 1, None, None
+        if cell_range:
+            first_col, first_row, last_col, last_row = range_boundaries(cell_range.replace("$", "").upper())
+            first_col, first_row = first_col or 1, first_row or 1
+        if last_row is None:
+            last_row = ws.max_row
+
+        header_rows = ws.iter_rows(min_row=first_row, max_row=first_row, min_col=first_col, max_col=last_col,
+                                   values_only=True)
+        header = list(next(header_rows, ()))
+        header_rows.close()
+        names = column_names(header)
+        columns = _select_columns(header, first_col, usecols)
+        labels = [f"{get_column_letter(first_col + i)}:{names[i]}" for i in columns]
+        next_row = first_row + 1 + offset
+        rows = ws.iter_rows(min_row=next_row, max_row=last_row, min_col=first_col, max_col=last_col, values_only=True)
+        return _Cursor(wb, source, ws.title, rows, names, labels, columns, next_row, last_row,
+                       len(wb.sheetnames) > 1)
+    except BaseException:
+        wb.close()
+        source.close()
+        raise
+
+
+def _read_xls_page(source, sheet_name, limit, offset, usecols, out):
+    import pandas as pd
+
+    df = pd.read_excel(
+        source,
+        sheet_name=sheet_name or 0,
+        skiprows=range(1, offset + 1),
+        nrows=limit,
+        usecols=usecols or None,
+    )
+    df.index = range(offset + 2, offset + 2 + len(df))
+    df.index.name = "row"
+    print(df.to_string(max_colwidth=MAX_CELL_WIDTH), file=out)
+    if len(df) == limit:
+        print(f"\nNext page: offset={offset + limit}", file=out)
+    return 0
+
+
+def read_excel(data_dir=DATA_DIR, filename=None, sheet_name=None, max_rows=10, offset=0,
+               usecols=None, cell_range=None, out=None):
+    """In một trang dữ liệu của sheet: `max_rows` dòng bắt đầu từ dòng dữ liệu thứ `offset`.
+
+    Dòng đầu tiên của sheet (hoặc của `cell_range`, ví dụ "B10:F200") là header.
+    Sheet đã có cache Arrow thì đọc thẳng từ cache; nếu không, sheet được đọc tuần
+    tự ở chế độ read-only (bỏ qua `offset` dòng đầu) và dừng ngay khi đủ trang.
+    Trang kế tiếp đọc tiếp từ cursor; cache chỉ được dựng khi cùng sheet bị đọc nhảy
+    vào giữa nhiều lần mà không có cursor.
+    """
+    import pandas as pd
+    out = out or sys.stdout
+
+    filename = find_excel_file(filename, data_dir)
+    if not filename:
+        print("Can't find Excel file!", file=out)
+        return 1
+
+    path = os.path.join(data_dir, filename)
+    limit = max(1, min(int(max_rows or 10), MAX_PAGE_ROWS))
+    offset = max(0, int(offset or 0))
+    cursor = source = None
+    try:
+        source = open_regular(path, data_dir)
+        if filename.lower().endswith(".xls"):
+            return _read_xls_page(source, sheet_name, limit, offset, usecols, out)
+
+        st = os.fstat(source.fileno())
+        base_key = (path, st.st_size, st.st_mtime_ns, sheet_name, repr(usecols), cell_range)
+        cursor = _cursors.pop(base_key + (offset,), None)
+
+        if cursor is None and not cell_range and sheet_cache.available():
+            sheets = [info["name"] for info in sheet_info(source)]
+            if sheet_name and sheet_name not in sheets:
+                raise ValueError(f"Worksheet named '{sheet_name}' not found")
+            sheet = sheet_name or sheets[0]
+            table = sheet_cache.load_table(path, sheet)
+            if table is None and offset and _count_offset_read(base_key[:3] + (sheet,)) >= _CACHE_AFTER_READS:
+                # Đọc nhảy lặp lại: parse hết một lần và lưu cache cho các lần đọc sau
+                table = _build_sheet_cache(path, sheet)
+            if table is not None:
+                if not sheet_name and len(sheets) > 1:
+                    print(f"Report: File has multiple sheets. Displaying first sheet '{sheet}'", file=out)
+                _print_cached_page(table, offset, limit, usecols, out)
+                return 0
+
+        if cursor is None:
+            cursor = _open_page(source, sheet_name, usecols, cell_range, offset)
+            source = None
+
+        index, data = [], []
+        for values in itertools.islice(cursor.rows, limit):
+            data.append([values[i] if i < len(values) else None for i in cursor.columns])
+            index.append(cursor.next_row)
+            cursor.next_row += 1
+
+        if not sheet_name and cursor.multi_sheet:
+            print(f"Report: File has multiple sheets. Displaying first sheet '{cursor.title}'", file=out)
+        df = pd.DataFrame(data, index=pd.Index(index, name="row"), columns=cursor.header)
+        print(df.to_string(max_colwidth=MAX_CELL_WIDTH), file=out)
+
+        remaining = cursor.last_row - cursor.next_row + 1 if cursor.last_row else None
+        if data:
+            summary = f"\nRows {index[0]}-{index[-1]} (offset={offset}, {len(data)} rows)"
+        else:
+            summary = f"\nNo rows at offset={offset}"
+        if remaining is not None:
+            summary += f", about {max(remaining, 0)} more rows below"
+        print(summary + ".", file=out)
+
+        if len(data) == limit and (remaining is None or remaining > 0):
+            print(f"Next page: offset={offset + len(data)}", file=out)
+            _put_cursor(base_key + (offset + len(data),), cursor)
+        else:
+            cursor.close()
+    except Exception as e:
+        if cursor is not None:
+            cursor.close()
+        _print_invalid_excel(e, filename, out)
+        return 1
+    finally:
+        if source is not None:
+            source.close()
+    return 0
+
+
+def read_word(data_dir=DATA_DIR, filename=None, out=None):
+    from docx import Document
+    out = out or sys.stdout
+
+    filename = find_word_file(filename, data_dir)
+    if not filename:
+        print("Không tìm thấy file Word!", file=out)
+        return 1
+
+    with open_regular(os.path.join(data_dir, filename), data_dir) as source:
+        doc = Document(source)
+    print(f"Nội dung file: {filename}\n", file=out)
+    for i, p in enumerate(doc.paragraphs):
+        if p.text.strip():
+            print(f"[{i}] {p.text}", file=out)
+    return 0
+
+
+ACTIONS = {
+    "list_sheets": list_sheets,
+    "read_excel": read_excel,
+    "read_word": read_word,
+}
+
+
+def run(action, data_dir=DATA_DIR, out=None, version=None, **kwargs):
+    """Chạy action chỉ đọc, in kết quả ra `out` (mặc định stdout) và trả về exit code.
+
+    version: đọc snapshot của version này trong lịch sử thay vì file hiện tại.
+    """
+    if version is not None:
+        entry = versions.get_version(version, data_dir)
+        if entry is None:
+            print(f"Error: version {version} does not exist", file=out or sys.stdout)
+            return 1
+        try:
+            versions.entry_paths(entry, data_dir)
+        except ValueError as e:
+            print(f"Error: {e}", file=out or sys.stdout)
+            return 1
+        data_dir, kwargs["filename"] = versions.versions_dir(data_dir), entry["snapshot"]
+    return ACTIONS[action](data_dir, out=out, **kwargs)
+
+
+def serve():
+    """Vòng lặp của worker fast path trên host: mỗi dòng stdin là một request."""
+    mem_limit = int(os.getenv("READER_MEM_LIMIT", "0"))
+    if mem_limit:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (mem_limit, mem_limit))
+    from sandbox_runtime.runner import preload
+    preload(os.getenv("READER_PRELOAD", "pandas,openpyxl,docx"))
+
+    channel = sys.stdout
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+        out = io.StringIO()
+        try:
+            exit_code = run(request["action"], request["data_dir"], out=out, **request.get("kwargs", {}))
+        except MemoryError:
+            out.write("Error: Not enough memory to read this file.\n")
+            exit_code = 1
+        except Exception as e:
+            out.write(f"Error: {e}\n")
+            exit_code = 1
+        channel.write(json.dumps({"exit_code": exit_code, "output": out.getvalue()}) + "\n")
+        channel.flush()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "serve":
+        serve()
+    else:
+        print("Usage: python -m sandbox_runtime.reader serve")
+        sys.exit(2)
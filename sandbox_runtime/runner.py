@@ -0,0 +1,42 @@
+"""Tiện ích chạy script dùng chung cho zygote và kernel."""
+import os
+import sys
+import time
+import importlib
+import traceback
+
+# Các thư viện nặng mà script sinh ra từ office_excel.py / office_word.py luôn import,
+# kèm thư viện operation của edit_excel (process con fork ra dùng lại ngay)
+DEFAULT_PRELOAD = "pandas,numpy,openpyxl,docx,sandbox_runtime.excel_ops,sandbox_runtime.word_ops"
+
+
+def preload(modules: str = None) -> float:
+    """Import trước các thư viện nặng, trả về thời gian import (giây)."""
+    modules = modules if modules is not None else os.getenv("SANDBOX_PRELOAD", DEFAULT_PRELOAD)
+    start = time.perf_counter()
+    for name in filter(None, (m.strip() for m in modules.split(","))):
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"[sandbox] Cannot preload '{name}': {e}", file=sys.stderr)
+    return time.perf_counter() - start
+
+
+def exec_script(path: str, namespace: dict) -> int:
+    """Chạy file Python `path` trong `namespace`, trả về exit code như khi chạy `python path`."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        exec(compile(source, path, "exec"), namespace)
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        # Bỏ frame của runner, chỉ hiển thị traceback của script
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1
+    return 0
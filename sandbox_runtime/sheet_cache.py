@@ -0,0 +1,173 @@
+"""Cache dạng cột (Arrow IPC) cho sheet đã parse, nằm cạnh workbook trong session.
+
+`<data_dir>/.sheetcache/<sha256 nội dung workbook>/<sheet>.arrow` được đọc bằng
+memory map (zero-copy), nên đọc lại, lọc hay tổng hợp một sheet lớn không phải
+parse lại XML. Vì khóa là hash nội dung, file `_edited` mới tự có cache mới; cache
+của nội dung không còn file nào dùng sẽ bị xóa khi lưu cache tiếp theo.
+
+pyarrow là tùy chọn: không có thì mọi hàm trả về None và người gọi parse như cũ.
+
+Cache cũng được đọc/ghi trên host (fast path), nên thư mục cache phải là thư mục thật,
+file chỉ được mở qua open_regular/write_atomic và digest trong index phải là sha256 hex;
+không thỏa thì coi như chưa có cache.
+"""
+import os
+import re
+import json
+import mmap
+import shutil
+import hashlib
+from sandbox_runtime.files import open_regular, write_atomic, is_real_dir
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+CACHE_DIRNAME = ".sheetcache"
+INDEX_NAME = "index.json"
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+def available():
+    return pa is not None
+
+
+def _cache_root(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRNAME)
+
+
+def _load_index(root):
+    try:
+        with open_regular(os.path.join(root, INDEX_NAME), root) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(index, dict):
+        return {}
+    return {
+        name: entry for name, entry in index.items()
+        if isinstance(entry, dict) and _DIGEST.fullmatch(str(entry.get("sha256")))
+    }
+
+
+def _save_index(root, index):
+    write_atomic(os.path.join(root, INDEX_NAME), json.dumps(index).encode("utf-8"))
+
+
+def _ensure_dir(path):
+    """Tạo thư mục cache nếu chưa có; False nếu tên đó đã là symlink/file."""
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        pass
+    return is_real_dir(path)
+
+
+def workbook_digest(path):
+    """sha256 nội dung workbook; chỉ hash lại khi size/mtime của file thay đổi."""
+    root = _cache_root(path)
+    name = os.path.basename(path)
+    st = os.lstat(path)
+    index = _load_index(root)
+    entry = index.get(name)
+    if entry and (entry["size"], entry["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+        return entry["sha256"]
+
+    h = hashlib.sha256()
+    with open_regular(path, os.path.dirname(root)) as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    index[name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": h.hexdigest()}
+    if _ensure_dir(root):
+        _save_index(root, index)
+    return index[name]["sha256"]
+
+
+def _sheet_file(root, digest, sheet):
+    key = hashlib.sha1(sheet.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(root, digest, f"{key}.arrow")
+
+
+def load_table(path, sheet):
+    """Table Arrow (memory-mapped) của sheet, hoặc None nếu chưa có cache."""
+    if pa is None:
+        return None
+    root = _cache_root(path)
+    cache_file = _sheet_file(root, workbook_digest(path), sheet)
+    if not (is_real_dir(root) and is_real_dir(os.path.dirname(cache_file))):
+        return None
+    try:
+        with open_regular(cache_file, root) as f:
+            # Map qua file descriptor đã kiểm tra, không mở lại theo tên; các cột của Table
+            # trỏ thẳng vào vùng map này (zero-copy) và giữ nó sống
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return pa.ipc.open_file(pa.py_buffer(mapped)).read_all()
+    except (OSError, ValueError, pa.ArrowException):
+        return None
+
+
+def is_lossless(table):
+    """False nếu có cột nhiều kiểu dữ liệu (số lẫn chữ...) đã bị đổi sang chuỗi khi lưu cache."""
+    return (table.schema.metadata or {}).get(b"lossless") == b"1"
+
+
+def load_frame(path, sheet):
+    """DataFrame của sheet từ cache, chỉ khi cache giữ nguyên kiểu dữ liệu; ngược lại None."""
+    table = load_table(path, sheet)
+    if table is None or not is_lossless(table):
+        return None
+    return table.to_pandas()
+
+
+def store_frame(path, sheet, df):
+    """Lưu DataFrame của sheet (header = dòng đầu của sheet) vào cache. Trả về Table hoặc None."""
+    if pa is None:
+        return None
+    arrays, lossless = [], True
+    for i in range(df.shape[1]):
+        column = df.iloc[:, i]
+        try:
+            arrays.append(pa.Array.from_pandas(column))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # Cột lẫn nhiều kiểu: lưu dạng chuỗi, chỉ dùng để hiển thị
+            values = [None if v is None or (isinstance(v, float) and v != v) else str(v) for v in column]
+            arrays.append(pa.array(values, pa.string()))
+            lossless = False
+    metadata = {"sheet": sheet, "lossless": "1" if lossless else "0"}
+    table = pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns], metadata=metadata)
+
+    root = _cache_root(path)
+    digest = workbook_digest(path)
+    cache_file = _sheet_file(root, digest, sheet)
+    if not (_ensure_dir(root) and _ensure_dir(os.path.dirname(cache_file))):
+        return table
+
+    def write(f):
+        with pa.ipc.new_file(pa.PythonFile(f, mode="w"), table.schema) as writer:
+            writer.write_table(table)
+
+    write_atomic(cache_file, write)
+    prune(root)
+    return table
+
+
+def prune(root):
+    """Xóa cache của các nội dung không còn file nào trong session dùng tới."""
+    data_dir = os.path.dirname(root)
+    index = _load_index(root)
+    live = {}
+    for name, entry in index.items():
+        try:
+            st = os.stat(os.path.join(data_dir, name))
+        except OSError:
+            continue
+        if (entry["size"], entry["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            live[name] = entry
+    if live != index:
+        _save_index(root, live)
+    digests = {entry["sha256"] for entry in live.values()}
+    for name in os.listdir(root):
+        if name != INDEX_NAME and not name.endswith(".tmp") and name not in digests:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
@@ -0,0 +1,129 @@
+"""Sao chép định dạng ô bằng style ID dùng chung của workbook thay vì copy từng object.
+
+Trong openpyxl mỗi ô chỉ giữ một StyleArray (các chỉ số font/border/fill/numFmt...
+trỏ vào danh sách style chung của workbook). Copy StyleArray của ô nguồn sang ô đích
+cho kết quả giống hệt `target.font = copy(source.font)`... nhưng không tạo object
+Font/Border/Fill mới và không phải tra lại các danh sách style cho mỗi ô. Chỉ số trong
+StyleArray chỉ có nghĩa trong workbook của nó, nên hai ô khác workbook vẫn copy từng object.
+"""
+from copy import copy
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE, BUILTIN_FORMATS_REVERSE
+from openpyxl.utils import get_column_letter
+
+
+def _copy_dimensions(source_cell, target_cell):
+    source_ws, target_ws = source_cell.parent, target_cell.parent
+    # Sao chép độ rộng cột nếu là cell ở dòng tiêu đề
+    if source_cell.row == 1 and hasattr(source_ws, "column_dimensions"):
+        source_letter = get_column_letter(source_cell.column)
+        if source_letter in source_ws.column_dimensions:
+            source_dim = source_ws.column_dimensions[source_letter]
+            target_dim = target_ws.column_dimensions[get_column_letter(target_cell.column)]
+            if (target_dim.width, target_dim.hidden) != (source_dim.width, source_dim.hidden):
+                target_dim.width = source_dim.width
+                target_dim.hidden = source_dim.hidden
+
+    # Sao chép độ cao dòng nếu là cell ở cột đầu tiên
+    if source_cell.column == 1 and hasattr(source_ws, "row_dimensions"):
+        if source_cell.row in source_ws.row_dimensions:
+            source_dim = source_ws.row_dimensions[source_cell.row]
+            target_dim = target_ws.row_dimensions[target_cell.row]
+            if (target_dim.height, target_dim.hidden) != (source_dim.height, source_dim.hidden):
+                target_dim.height = source_dim.height
+                target_dim.hidden = source_dim.hidden
+
+
+def _same_workbook(source_cell, target_cell) -> bool:
+    return source_cell.parent.parent is target_cell.parent.parent
+
+
+def _copy_style_objects(source_cell, target_cell):
+    target_cell.font = copy(source_cell.font)
+    target_cell.border = copy(source_cell.border)
+    target_cell.fill = copy(source_cell.fill)
+    target_cell.number_format = source_cell.number_format
+    target_cell.protection = copy(source_cell.protection)
+    target_cell.alignment = copy(source_cell.alignment)
+
+
+def copy_cell_formatting(source_cell, target_cell):
+    """Sao chép định dạng từ source_cell sang target_cell một cách triệt để."""
+    if source_cell.has_style:
+        if _same_workbook(source_cell, target_cell):
+            target_cell._style = copy(source_cell._style)
+        else:
+            _copy_style_objects(source_cell, target_cell)
+    _copy_dimensions(source_cell, target_cell)
+
+
+class StyleCache:
+    """Định dạng hàng loạt: mỗi tổ hợp (style nguồn, number format) chỉ được resolve một lần.
+
+    Dùng khi ghi cả cột/vùng ô: các ô có cùng style nguồn dùng chung một bộ style ID,
+    nên thêm một cột đã định dạng vào sheet vài trăm nghìn dòng không phải tạo
+    hàng triệu object style.
+    """
+
+    def __init__(self):
+        self._templates = {}
+
+    def _number_format_id(self, wb, number_format):
+        if number_format in BUILTIN_FORMATS_REVERSE:
+            return BUILTIN_FORMATS_REVERSE[number_format]
+        return wb._number_formats.add(number_format) + BUILTIN_FORMATS_MAX_SIZE
+
+    def copy(self, source_cell, target_cell, number_format=None):
+        """Như copy_cell_formatting, kèm đổi number format (nếu có) trên style đã copy."""
+        if number_format is None:
+            copy_cell_formatting(source_cell, target_cell)
+            return
+        if source_cell.has_style and not _same_workbook(source_cell, target_cell):
+            copy_cell_formatting(source_cell, target_cell)
+            target_cell.number_format = number_format
+            return
+        wb = target_cell.parent.parent
+        base = source_cell._style if source_cell.has_style else (target_cell._style or StyleArray())
+        key = (wb, tuple(base), number_format)
+        template = self._templates.get(key)
+        if template is None:
+            template = copy(base)
+            template.numFmtId = self._number_format_id(wb, number_format)
+            self._templates[key] = template
+        target_cell._style = copy(template)
+        _copy_dimensions(source_cell, target_cell)
+
+
+def apply_smart_format(target_cell, value, col_name="", source_cell=None):
+    """Áp dụng định dạng số cho cell.
+    Ưu tiên sao chép từ source_cell. Nếu không có, tự động nhận diện dựa trên giá trị và tên cột.
+    """
+    if not isinstance(value, (int, float)):
+        return
+
+    # 1. Ưu tiên cao nhất: Sao chép định dạng từ cell mẫu (source_cell)
+    if source_cell and source_cell.number_format and source_cell.number_format != 'General':
+        target_cell.number_format = source_cell.number_format
+        return
+
+    # 2. Nếu cell đích đã có định dạng sẵn (không phải General), giữ nguyên
+    if target_cell.number_format and target_cell.number_format != 'General':
+        return
+
+    # 3. Fallback: Tự động nhận diện (nếu không có mẫu để copy)
+    col_name_lower = str(col_name).lower()
+    is_percentage = any(kw in col_name_lower for kw in ['%', 'ratio', 'rate', 'margin', 'tỉ lệ', 'phần trăm'])
+
+    if is_percentage:
+        target_cell.number_format = '0.00%'
+    elif isinstance(value, float):
+        is_currency = any(kw in col_name_lower for kw in ['price', 'cost', 'amount', 'revenue', 'giá', 'tiền', 'lương', 'vốn'])
+        if is_currency or abs(value) >= 100:
+            target_cell.number_format = '#,##0.00'
+        else:
+            target_cell.number_format = '0.00'
+    else:
+        if abs(value) >= 1000:
+            target_cell.number_format = '#,##0'
+        else:
+            target_cell.number_format = '0'
@@ -0,0 +1,191 @@
+"""Lịch sử phiên bản copy-on-write của file trong session (dùng chung cho container và host).
+
+Mỗi lần edit lưu xong, file kết quả được snapshot vào `<data_dir>/.versions/<version><ext>`
+bằng reflink (gần như không tốn chi phí trên btrfs/xfs...), không được thì copy. Snapshot
+không bao giờ dùng chung inode với file làm việc, nên script lưu đè tại chỗ (`wb.save()`)
+không làm hỏng version nào. File gốc được snapshot làm version gốc ở lần edit đầu tiên.
+`.versions/index.json` lưu:
+- versions: [{version, parent, file, snapshot, ops, sha256, size, created}]
+- heads: {file: {version, size, mtime_ns}} - version hiện đang nằm ở tên file làm việc
+
+Quay lại hay rẽ nhánh từ một version chỉ là khôi phục snapshot về tên file làm việc
+(cũng bằng reflink hoặc copy) và ghi lại head. sha256 được kiểm tra khi khôi phục.
+"""
+import os
+import json
+import time
+import hashlib
+from sandbox_runtime.files import DATA_DIR, clone_file, open_regular, write_atomic
+
+VERSIONS_DIRNAME = ".versions"
+INDEX_NAME = "index.json"
+
+
+def versions_dir(data_dir=DATA_DIR):
+    return os.path.join(data_dir, VERSIONS_DIRNAME)
+
+
+def load_index(data_dir=DATA_DIR):
+    root = versions_dir(data_dir)
+    try:
+        # Đọc cả trên host (fast path, checkout): không đi theo symlink do script đặt vào
+        with open_regular(os.path.join(root, INDEX_NAME), root) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    if not isinstance(index, dict):
+        index = {}
+    index.setdefault("versions", [])
+    index.setdefault("heads", {})
+    return index
+
+
+def _save_index(data_dir, index):
+    path = os.path.join(versions_dir(data_dir), INDEX_NAME)
+    write_atomic(path, json.dumps(index, ensure_ascii=False).encode("utf-8"))
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open_regular(path, os.path.dirname(path)) as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _set_head(index, filename, version, path):
+    st = os.stat(path)
+    index["heads"][filename] = {"version": version, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _snapshot(data_dir, index, filename, parent, ops):
+    path = os.path.join(data_dir, filename)
+    version = max((entry["version"] for entry in index["versions"]), default=0) + 1
+    snapshot = f"{version}{os.path.splitext(filename)[1]}"
+    if os.path.islink(path) or os.path.islink(versions_dir(data_dir)):
+        raise ValueError(f"'{filename}' is a symlink, not a file of the session")
+    os.makedirs(versions_dir(data_dir), exist_ok=True)
+    clone_file(path, os.path.join(versions_dir(data_dir), snapshot))
+    entry = {
+        "version": version,
+        "parent": parent,
+        "file": filename,
+        "snapshot": snapshot,
+        "ops": ops,
+        "sha256": _sha256(path),
+        "size": os.path.getsize(path),
+        "created": time.time(),
+    }
+    index["versions"].append(entry)
+    _set_head(index, filename, version, path)
+    return entry
+
+
+def get_version(version, data_dir=DATA_DIR, index=None):
+    index = index or load_index(data_dir)
+    for entry in index["versions"]:
+        if entry["version"] == version:
+            return entry
+    return None
+
+
+def track(filename, data_dir=DATA_DIR):
+    """Version của file làm việc `filename`, gọi trước khi sửa để biết parent của lần edit.
+
+    File chưa có trong lịch sử (file gốc) hoặc đã bị sửa ngoài edit (execute, custom
+    code lưu tại chỗ...) được snapshot thành một version mới trước khi bị ghi đè.
+    """
+    path = os.path.join(data_dir, filename)
+    index = load_index(data_dir)
+    head = index["heads"].get(filename)
+    st = os.stat(path)
+    if head and (head["size"], head["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+        return head["version"]
+    ops = ["changed outside edit"] if head else []
+    entry = _snapshot(data_dir, index, filename, head["version"] if head else None, ops)
+    _save_index(data_dir, index)
+    return entry["version"]
+
+
+def record(filename, parent, ops, data_dir=DATA_DIR):
+    """Snapshot file vừa lưu thành version mới (con của `parent`). Returns: entry của version."""
+    index = load_index(data_dir)
+    entry = _snapshot(data_dir, index, filename, parent, list(ops or []))
+    _save_index(data_dir, index)
+    return entry
+
+
+def _plain_name(name):
+    return isinstance(name, str) and bool(name) and os.path.basename(name) == name and not name.startswith(".")
+
+
+def entry_paths(entry, data_dir=DATA_DIR):
+    """(file làm việc, snapshot) của một version, đã kiểm tra nằm trong session.
+
+    index.json nằm trong thư mục session nên script trong sandbox sửa được; checkout
+    chạy trên host, vì vậy `file`/`snapshot` phải là tên file thường (không có thư mục,
+    không bắt đầu bằng dấu chấm) và đường dẫn thật phải nằm trong data_dir / .versions.
+
+    Raises:
+        ValueError: entry trỏ ra ngoài session
+    """
+    version = entry.get("version")
+    if not (_plain_name(entry.get("file")) and _plain_name(entry.get("snapshot"))):
+        raise ValueError(f"version {version} has an invalid file name in the index")
+    root = os.path.realpath(data_dir)
+    snapshots = os.path.realpath(versions_dir(data_dir))
+    path = os.path.realpath(os.path.join(root, entry["file"]))
+    source = os.path.realpath(os.path.join(snapshots, entry["snapshot"]))
+    if os.path.dirname(snapshots) != root or os.path.dirname(path) != root or os.path.dirname(source) != snapshots:
+        raise ValueError(f"version {version} points outside the session")
+    return path, source
+
+
+def checkout(version, data_dir=DATA_DIR):
+    """Khôi phục version về tên file làm việc của nó (quay lại / rẽ nhánh). Returns: tên file.
+
+    Raises:
+        ValueError: version không tồn tại hoặc snapshot đã bị sửa
+    """
+    index = load_index(data_dir)
+    entry = get_version(version, data_dir, index)
+    if entry is None:
+        raise ValueError(f"version {version} does not exist")
+    path, source = entry_paths(entry, data_dir)
+    filename = entry["file"]
+    head = index["heads"].get(filename)
+    if head and head["version"] == version and os.path.exists(path):
+        st = os.stat(path)
+        if (head["size"], head["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            return filename
+
+    if not os.path.isfile(source) or os.path.islink(source) or _sha256(source) != entry["sha256"]:
+        raise ValueError(f"snapshot of version {version} is missing or was modified in place")
+    if head and os.path.exists(path):
+        st = os.stat(path)
+        if (head["size"], head["mtime_ns"]) != (st.st_size, st.st_mtime_ns):
+            # Nội dung hiện tại chưa có trong lịch sử: giữ lại trước khi bị thay
+            _snapshot(data_dir, index, filename, head["version"], ["changed outside edit"])
+    # Ghi vào tên file trong session (không theo symlink nếu tên đó là symlink)
+    target = os.path.join(data_dir, filename)
+    clone_file(source, target)
+    _set_head(index, filename, version, target)
+    _save_index(data_dir, index)
+    return filename
+
+
+def format_history(data_dir=DATA_DIR):
+    """Bảng lịch sử version của session, đánh dấu version đang nằm ở file làm việc."""
+    index = load_index(data_dir)
+    if not index["versions"]:
+        return "No versions yet. A version is recorded each time edit_excel or edit_word saves a file."
+    heads = {head["version"]: name for name, head in index["heads"].items()}
+    lines = []
+    for entry in index["versions"]:
+        parent = "-" if entry["parent"] is None else entry["parent"]
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["created"]))
+        ops = "; ".join(entry["ops"]) if entry["ops"] else "original"
+        mark = f" <- {heads[entry['version']]}" if entry["version"] in heads else ""
+        lines.append(f"v{entry['version']} (parent {parent}) {entry['file']} "
+                     f"sha256:{entry['sha256'][:12]} {created}: {ops}{mark}")
+    return "\n".join(lines)
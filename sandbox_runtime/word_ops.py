@@ -0,0 +1,147 @@
+"""Các operation của edit_word_document chạy bên trong sandbox: thay text hàng loạt.
+
+Mọi cặp (old, new) được gộp thành một regex duy nhất và cả document chỉ được duyệt
+một lần: paragraph của body, bảng (kể cả bảng lồng nhau), header và footer. Chỉ các
+`w:t` chứa chỗ khớp bị sửa; text thay thế mang định dạng của run nơi chỗ khớp bắt đầu,
+các run khác giữ nguyên (không gán `paragraph.text` nên không mất định dạng).
+"""
+import re
+from bisect import bisect_right
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+
+_T = qn('w:t')
+# Các phần tử trong run ngắt dòng text: không cho chỗ khớp vượt qua chúng
+_BREAKS = {qn('w:tab'), qn('w:br'), qn('w:cr'), qn('w:noBreakHyphen'), qn('w:softHyphen')}
+_XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+# Nội dung trực tiếp của paragraph: run, run trong hyperlink/ins/smartTag/fldSimple..., run trong sdt
+_RUN_CHILDREN = './w:r/* | ./*/w:r/* | ./w:sdt/w:sdtContent/w:r/*'
+
+
+def _overlaps(a, b):
+    """True nếu một chuỗi chứa chuỗi kia hoặc cuối chuỗi này trùng đầu chuỗi kia."""
+    if not a or not b:
+        return False
+    if a in b or b in a:
+        return True
+    for k in range(1, min(len(a), len(b))):
+        if a.endswith(b[:k]) or b.endswith(a[:k]):
+            return True
+    return False
+
+
+def _passes(pairs):
+    """Chia các cặp thành ít lần duyệt nhất mà kết quả vẫn giống thay lần lượt từng cặp.
+
+    Một cặp được gộp vào lần duyệt hiện tại khi `old` của nó không chồng lấn với
+    `old` hay `new` của cặp nào trước nó trong lần duyệt đó (nếu chồng lấn, thay tuần
+    tự có thể khớp vào text vừa được thay, hoặc chọn chỗ khớp khác). Các cặp độc lập
+    nhau, trường hợp thường gặp, luôn nằm chung một lần duyệt.
+    """
+    def conflicts(old, prev_old, prev_new):
+        # Xóa text (new rỗng) làm hai phía chỗ khớp liền nhau: old dài hơn 1 ký tự có thể khớp qua đó
+        return _overlaps(old, prev_old) or _overlaps(old, prev_new) or (not prev_new and len(old) > 1)
+
+    passes, current = [], []
+    for index, (old, new) in enumerate(pairs):
+        if any(conflicts(old, prev_old, prev_new) for _, prev_old, prev_new in current):
+            passes.append(current)
+            current = []
+        current.append((index, old, new))
+    if current:
+        passes.append(current)
+    return passes
+
+
+def iter_paragraphs(doc):
+    """Mọi `w:p` của body (kể cả trong bảng lồng nhau), header và footer, mỗi paragraph một lần."""
+    yield from doc.element.body.iter(qn('w:p'))
+    parts = set()
+    for rel in doc.part.rels.values():
+        if rel.is_external or rel.reltype not in (RT.HEADER, RT.FOOTER):
+            continue
+        part = rel.target_part
+        if part in parts:
+            continue
+        parts.add(part)
+        yield from part.element.iter(qn('w:p'))
+
+
+def _segments(paragraph):
+    """Các dãy `w:t` liền nhau của paragraph, tách tại tab/ngắt dòng."""
+    segment = []
+    for child in paragraph.xpath(_RUN_CHILDREN):
+        if child.tag == _T:
+            segment.append(child)
+        elif child.tag in _BREAKS and segment:
+            yield segment
+            segment = []
+    if segment:
+        yield segment
+
+
+def _replace_segment(nodes, pattern, mapping, counts):
+    texts = [node.text or "" for node in nodes]
+    full = "".join(texts)
+    matches = list(pattern.finditer(full))
+    if not matches:
+        return False
+    starts, offset = [], 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text)
+
+    # Duyệt ngược để vị trí của các chỗ khớp phía trước không bị dịch
+    for match in reversed(matches):
+        index, new = mapping[match.group(0)]
+        counts[index] += 1
+        # Node chứa ký tự đầu/cuối của chỗ khớp (node rỗng có cùng start với node sau nó)
+        first = bisect_right(starts, match.start()) - 1
+        last = bisect_right(starts, match.end() - 1) - 1
+        head = texts[first][:match.start() - starts[first]]
+        tail = texts[last][match.end() - starts[last]:]
+        if first == last:
+            texts[first] = head + new + tail
+        else:
+            texts[first] = head + new
+            for i in range(first + 1, last):
+                texts[i] = ""
+            texts[last] = tail
+
+    for node, text in zip(nodes, texts):
+        if node.text != text:
+            node.text = text
+            if text != text.strip():
+                node.set(_XML_SPACE, 'preserve')
+    return True
+
+
+def replace_text(doc, pairs):
+    """Thay mọi cặp (old, new) trong document, giữ định dạng run.
+
+    Returns:
+        (số chỗ đã thay của từng cặp theo thứ tự, số lần duyệt document, số paragraph bị sửa)
+    """
+    pairs = [(old, new) for old, new in pairs]
+    counts = [0] * len(pairs)
+    passes = _passes(pairs)
+    paragraphs = set()
+    for group in passes:
+        mapping = {old: (index, new) for index, old, new in group}
+        pattern = re.compile("|".join(re.escape(old) for _, old, _ in group))
+        for paragraph in iter_paragraphs(doc):
+            for nodes in _segments(paragraph):
+                if _replace_segment(nodes, pattern, mapping, counts):
+                    paragraphs.add(paragraph)
+    return counts, len(passes), len(paragraphs)
+
+
+def replace_all(doc, pairs):
+    """Chạy operation `replace` (đã gộp) và in kết quả, mỗi cặp một dòng."""
+    counts, passes, paragraphs = replace_text(doc, pairs)
+    for (old, new), count in zip(pairs, counts):
+        print(f"- Replaced '{old}' -> '{new}' (Found: {count})")
+        if count == 0:
+            print(f"- Warning: '{old}' not found to replace!")
+    if len(pairs) > 1:
+        print(f"- {len(pairs)} replacements in {passes} pass(es), {paragraphs} paragraph(s) changed")
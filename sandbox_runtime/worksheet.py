@@ -0,0 +1,367 @@
+"""Thao tác trên worksheet openpyxl đã load: đọc/ghi DataFrame, xóa dòng hàng loạt."""
+import gc
+import re
+import bisect
+from copy import copy
+from openpyxl.cell.cell import Cell, MergedCell, ILLEGAL_CHARACTERS_RE
+from openpyxl.formula.tokenizer import Tokenizer, Token
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.worksheet.formula import ArrayFormula
+from sandbox_runtime.saving import save_atomic
+from sandbox_runtime.styles import copy_cell_formatting
+
+
+def column_names(header):
+    """Tên cột giống pandas: ô trống thành "Unnamed: i", tên trùng thành "a.1", "a.2"..."""
+    names, seen = [], {}
+    for i, value in enumerate(header):
+        name = str(value) if value is not None else f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def header_index(ws, name):
+    """Số thứ tự cột (1-based) có tiêu đề dòng 1 bằng `name` (bỏ khoảng trắng hai đầu), hoặc None."""
+    target = str(name).strip()
+    for cell in next(ws.iter_rows(min_row=1, max_row=1), ()):
+        if cell.value is not None and str(cell.value).strip() == target:
+            return cell.column
+    return None
+
+
+def _is_formula(value):
+    return (isinstance(value, str) and value.startswith("=")) or isinstance(value, ArrayFormula)
+
+
+def worksheet_to_frame(ws):
+    """DataFrame của sheet (dòng 1 là header) lấy từ `ws` đã load, giống pd.read_excel.
+
+    Workbook load với data_only=False chỉ giữ công thức chứ không có giá trị đã tính,
+    nên sheet có công thức thì trả về None để người gọi đọc giá trị từ file.
+    """
+    import pandas as pd
+
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    data = []
+    for values in rows:
+        if any(_is_formula(v) for v in values):
+            return None
+        data.append(values)
+    # pandas bỏ các dòng trống ở cuối sheet
+    while data and all(v is None for v in data[-1]):
+        data.pop()
+    if any(_is_formula(v) for v in header):
+        return None
+    return pd.DataFrame(data, columns=column_names(header))
+
+
+_SHEET_REF = re.compile(r"^(?:(?P<sheet>'(?:[^']|'')+'|[^'!]+)!)?(?P<ref>[^!]+)$")
+_CELL_REF = re.compile(r"^(\$?[A-Za-z]{1,3})(\$?)(\d+)$")
+_ROW_REF = re.compile(r"^(\$?)(\d+)$")
+
+
+class _RowMap:
+    """Vị trí mới của các dòng sau khi xóa `deleted` (danh sách số dòng đã sắp xếp)."""
+
+    def __init__(self, deleted):
+        self.deleted = deleted
+        self._set = set(deleted)
+
+    def row(self, r):
+        """Số dòng mới, hoặc None nếu dòng bị xóa."""
+        if r in self._set:
+            return None
+        return r - bisect.bisect_left(self.deleted, r)
+
+    def span(self, first, last):
+        """(first, last) mới của khoảng dòng, hoặc None nếu mọi dòng trong khoảng đều bị xóa."""
+        new_first = first - bisect.bisect_left(self.deleted, first)
+        new_last = last - bisect.bisect_right(self.deleted, last)
+        return (new_first, new_last) if new_first <= new_last else None
+
+    def cell_range(self, coord):
+        """Địa chỉ vùng "A1:C10" sau khi xóa dòng, hoặc None nếu cả vùng bị xóa."""
+        cr = CellRange(coord)
+        span = self.span(cr.min_row, cr.max_row)
+        if span is None:
+            return None
+        cr.min_row, cr.max_row = span
+        return cr.coord
+
+
+def _shift_ref(ref, rows):
+    """Sửa một tham chiếu (A1, $A$1:B5, 3:7...) theo dòng đã xóa; "#REF!" nếu nó bị xóa hết."""
+    parts = ref.split(":")
+    if len(parts) > 2:
+        return ref
+    cells = [_CELL_REF.match(p) for p in parts]
+    if all(cells):
+        if len(cells) == 1:
+            r = rows.row(int(cells[0].group(3)))
+            return "#REF!" if r is None else f"{cells[0].group(1)}{cells[0].group(2)}{r}"
+        span = rows.span(int(cells[0].group(3)), int(cells[1].group(3)))
+        if span is None:
+            return "#REF!"
+        return ":".join(f"{m.group(1)}{m.group(2)}{r}" for m, r in zip(cells, span))
+    whole_rows = [_ROW_REF.match(p) for p in parts]
+    if len(parts) == 2 and all(whole_rows):
+        span = rows.span(int(whole_rows[0].group(2)), int(whole_rows[1].group(2)))
+        if span is None:
+            return "#REF!"
+        return ":".join(f"{m.group(1)}{r}" for m, r in zip(whole_rows, span))
+    # Cột (A:C), tên vùng, tham chiếu bảng...: không phụ thuộc số dòng
+    return ref
+
+
+def _shift_formula(formula, title, same_sheet, rows):
+    """Công thức sau khi xóa dòng của sheet `title`; `same_sheet` = công thức nằm trên sheet đó."""
+    tokenizer = Tokenizer(formula)
+    changed = False
+    for token in tokenizer.items:
+        if token.type != Token.OPERAND or token.subtype != Token.RANGE:
+            continue
+        m = _SHEET_REF.match(token.value)
+        if not m:
+            continue
+        sheet = m.group("sheet")
+        if sheet is not None:
+            sheet = sheet[1:-1].replace("''", "'") if sheet.startswith("'") else sheet
+            if sheet != title:
+                continue
+        elif not same_sheet:
+            continue
+        new_ref = _shift_ref(m.group("ref"), rows)
+        if new_ref != m.group("ref"):
+            prefix = token.value[:m.start("ref")]
+            token.value = new_ref if new_ref == "#REF!" else prefix + new_ref
+            changed = True
+    return tokenizer.render() if changed else formula
+
+
+def _shift_formulas(ws, rows):
+    for sheet in ws.parent.worksheets:
+        same_sheet = sheet is ws
+        for cell in sheet._cells.values():
+            value = cell.value
+            if isinstance(value, ArrayFormula):
+                if same_sheet or ws.title in value.text:
+                    value.text = _shift_formula(value.text, ws.title, same_sheet, rows)
+                if same_sheet:
+                    value.ref = rows.cell_range(value.ref) or value.ref
+            elif cell.data_type == "f" and isinstance(value, str) and (same_sheet or ws.title in value):
+                cell.value = _shift_formula(value, ws.title, same_sheet, rows)
+
+
+def delete_rows(ws, rows):
+    """Xóa nhiều dòng (số dòng 1-based, không cần liên tục) trong một lần duyệt sheet.
+
+    `ws.delete_rows` của openpyxl dịch mọi ô phía dưới mỗi lần gọi nên xóa từng
+    dòng là O(số dòng xóa x số ô); ở đây mỗi ô chỉ được dời một lần. Khác với
+    openpyxl, merged cells, auto filter, vùng của bảng, hyperlink và công thức
+    (trên mọi sheet trỏ tới sheet này) cũng được cập nhật theo vị trí mới.
+
+    Returns:
+        Số dòng đã xóa.
+    """
+    deleted = sorted({r for r in rows if r >= 1})
+    if not deleted:
+        return 0
+    row_map = _RowMap(deleted)
+
+    # Merged cells: tách ra trước, gộp lại theo vị trí mới sau khi dời ô
+    merged = list(ws.merged_cells.ranges)
+    ws.merged_cells.ranges = set()
+
+    cells = {}
+    for (r, c), cell in ws._cells.items():
+        new_row = row_map.row(r)
+        if new_row is None:
+            continue
+        if new_row != r:
+            cell.row = new_row
+            if cell.hyperlink is not None:
+                cell.hyperlink.ref = cell.coordinate
+        cells[new_row, c] = cell
+    ws._cells = cells
+
+    dimensions = list(ws.row_dimensions.items())
+    ws.row_dimensions.clear()
+    for r, dim in dimensions:
+        new_row = row_map.row(r)
+        if new_row is not None:
+            dim.index = new_row
+            ws.row_dimensions[new_row] = dim
+
+    for mcr in merged:
+        span = row_map.span(mcr.min_row, mcr.max_row)
+        if span is None:
+            continue
+        first, last = span
+        if last - first == mcr.max_row - mcr.min_row and row_map.row(mcr.min_row) == first:
+            # Chỉ bị dời lên, không mất dòng nào
+            mcr.shift(row_shift=first - mcr.min_row)
+            ws.merged_cells.add(mcr)
+            continue
+        top_left = ws._cells.get((first, mcr.min_col))
+        if isinstance(top_left, MergedCell):
+            ws._cells[first, mcr.min_col] = Cell(ws, row=first, column=mcr.min_col)
+        if (first, mcr.min_col) == (last, mcr.max_col):
+            continue
+        ws.merge_cells(start_row=first, start_column=mcr.min_col, end_row=last, end_column=mcr.max_col)
+
+    if ws.auto_filter.ref:
+        ws.auto_filter.ref = row_map.cell_range(ws.auto_filter.ref)
+    for table in ws.tables.values():
+        table.ref = row_map.cell_range(table.ref) or table.ref
+        if table.autoFilter is not None and table.autoFilter.ref:
+            table.autoFilter.ref = table.ref
+
+    _shift_formulas(ws, row_map)
+    ws._current_row = ws.max_row if ws._cells else 0
+    return len(deleted)
+
+
+def _frame_columns(df, index):
+    """Giá trị Python của từng cột (NaN/NaT thành None) kèm data_type của openpyxl.
+
+    Cột số/bool/ngày giờ/chuỗi có sẵn data_type ("n"/"b"/"d"/"s") để gán thẳng cho ô,
+    bỏ qua bước nhận dạng kiểu của Cell.value cho từng ô; cột lẫn kiểu có kind None.
+    """
+    import pandas as pd
+
+    if index:
+        df = df.reset_index()
+    columns = []
+    for j in range(df.shape[1]):
+        series = df.iloc[:, j]
+        if pd.api.types.is_bool_dtype(series.dtype):
+            columns.append((series.tolist(), "b"))
+        elif pd.api.types.is_datetime64_dtype(series.dtype):
+            values = series.astype(object)
+            columns.append((values.where(values.notna(), None).tolist(), "d"))
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            values = series.tolist()
+            if pd.api.types.is_float_dtype(series.dtype):
+                values = [None if v != v else v for v in values]
+            columns.append((values, "n"))
+        else:
+            values = series.astype(object)
+            values = values.where(values.notna(), None)
+            kind = None
+            if pd.api.types.infer_dtype(values, skipna=True) == "string":
+                strings = values.dropna()
+                # Giống Cell.value: ký tự không hợp lệ thì báo lỗi, chuỗi bắt đầu bằng "=" là công thức
+                if not (strings.str.contains(ILLEGAL_CHARACTERS_RE).any() or strings.str.startswith("=").any()):
+                    if strings.empty or strings.str.len().max() <= 32767:
+                        kind = "s"
+            columns.append((values.tolist(), kind))
+    return columns
+
+
+def _frame_header(df, index):
+    names = [str(c) for c in df.columns]
+    if index:
+        names.insert(0, "" if df.index.name is None else str(df.index.name))
+    return names
+
+
+def write_frame(ws, df, index=False, header=True, header_cells=None, body_cells=None, number_formats=None):
+    """Ghi DataFrame vào cuối `ws`, nhanh hơn nhiều so với vòng lặp ws.cell() từng ô.
+
+    Kiểu dữ liệu và định dạng được resolve một lần cho mỗi cột rồi dùng chung cho cả cột;
+    ô trống không có định dạng thì không được tạo.
+
+    Args:
+        index: Ghi cả index của DataFrame thành cột đầu tiên
+        header_cells: Danh sách ô mẫu (mỗi cột một ô, None = bỏ qua) để chép định dạng
+            và độ rộng cột cho dòng tiêu đề, ví dụ `ws_src[1]`
+        body_cells: Như header_cells, cho các ô dữ liệu, ví dụ `ws_src[2]`
+        number_formats: {tên cột: number format} cho ô dữ liệu
+
+    Returns:
+        (dòng đầu tiên, dòng cuối cùng) đã ghi
+    """
+    names = _frame_header(df, index)
+    first_row = ws._current_row + 1
+    if header:
+        ws.append(names)
+        for j, source in enumerate(header_cells or (), start=1):
+            if source is not None and j <= len(names):
+                copy_cell_formatting(source, ws.cell(row=first_row, column=j))
+
+    # StyleArray mẫu của từng cột; mỗi ô nhận một bản copy (không tạo object style mới)
+    templates = [None] * len(names)
+    for j, source in enumerate(body_cells or ()):
+        if source is not None and j < len(names) and source.has_style:
+            templates[j] = source._style
+    for name, number_format in (number_formats or {}).items():
+        if str(name) in names:
+            j = names.index(str(name))
+            template_cell = Cell(ws, style_array=copy(templates[j]) if templates[j] is not None else None)
+            template_cell.number_format = number_format
+            templates[j] = template_cell._style
+
+    columns = _frame_columns(df, index)
+    kinds = [kind for _, kind in columns]
+    # Ô trống chỉ được tạo khi cột có định dạng mẫu
+    keep_empty = [t is not None for t in templates]
+    for j, kind in enumerate(kinds):
+        # Cột ngày giờ cần number format dạng ngày (Cell.value tự gán cho từng ô)
+        if kind == "d":
+            template_cell = Cell(ws, style_array=copy(templates[j]) if templates[j] is not None else None)
+            if not template_cell.is_date:
+                template_cell.number_format = "yyyy-mm-dd h:mm:ss"
+            templates[j] = template_cell._style
+    layout = list(zip(range(1, len(names) + 1), kinds, templates, keep_empty))
+    cells = ws._cells
+    row_idx = ws._current_row
+    # Tạo hàng triệu Cell liên tục làm GC quét lại heap nhiều lần; tạm tắt trong vòng lặp
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for values in zip(*(values for values, _ in columns)):
+            row_idx += 1
+            for (col_idx, kind, template, keep), value in zip(layout, values):
+                if value is None and not keep:
+                    continue
+                cell = Cell(ws, row=row_idx, column=col_idx, style_array=copy(template) if template is not None else None)
+                if kind is not None and value is not None:
+                    cell._value = value
+                    cell.data_type = kind
+                else:
+                    cell.value = value
+                cells[row_idx, col_idx] = cell
+    finally:
+        ws._current_row = row_idx
+        if gc_enabled:
+            gc.enable()
+    return first_row, row_idx
+
+
+def write_frame_file(path, frames, index=False, compresslevel=None):
+    """Ghi một hoặc nhiều DataFrame ({tên sheet: df}) ra file xlsx mới bằng chế độ write-only.
+
+    Workbook write-only ghi thẳng từng dòng ra file nên bộ nhớ không tăng theo số dòng,
+    nhưng chỉ dùng được cho file mới (không giữ định dạng của file có sẵn).
+    compresslevel: mức nén deflate 0-9 như save_atomic.
+    """
+    from openpyxl import Workbook
+
+    if not isinstance(frames, dict):
+        frames = {"Sheet1": frames}
+    wb = Workbook(write_only=True)
+    for sheet_name, df in frames.items():
+        ws = wb.create_sheet(str(sheet_name)[:31])
+        ws.append(_frame_header(df, index))
+        for values in zip(*(values for values, _ in _frame_columns(df, index))):
+            ws.append(values)
+    save_atomic(wb, path, compresslevel)
+    return path
@@ -0,0 +1,61 @@
+"""Zygote: ENTRYPOINT của image python-sandbox.
+
+Import trước pandas/numpy/openpyxl/docx ngay khi container khởi động (trong lúc
+container còn nằm chờ trong warm pool), đợi script xuất hiện rồi fork một process
+con mới cho script đó. Container vẫn chỉ chạy một script nên mức cô lập giữ nguyên.
+
+Cuối cùng in một dòng `[zygote] {...}` ra stderr với thời gian import (cold) và
+thời gian từ lúc nhận script tới lúc process con bắt đầu chạy (warm).
+"""
+import os
+import sys
+import json
+import time
+from sandbox_runtime.runner import preload, exec_script
+
+MARKER = "[zygote]"
+POLL_INTERVAL = 0.01
+
+
+def wait_for(path: str):
+    while not os.path.exists(path):
+        time.sleep(POLL_INTERVAL)
+
+
+def main(script: str = "/app/main.py") -> int:
+    preload_seconds = preload()
+    wait_for(script)
+    received = time.perf_counter()
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.write(write_fd, repr(time.perf_counter()).encode())
+        os.close(write_fd)
+        sys.argv = [script]
+        code = exec_script(script, {"__name__": "__main__", "__file__": script})
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code & 0xFF)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as f:
+        started = float(f.read() or received)
+    _, status = os.waitpid(pid, 0)
+    exit_code = os.waitstatus_to_exitcode(status)
+    if exit_code < 0:
+        exit_code = 128 - exit_code
+
+    timings = {
+        "preload_s": round(preload_seconds, 3),
+        "warm_start_ms": round((started - received) * 1000, 2),
+        "run_s": round(time.perf_counter() - started, 3),
+    }
+    sys.stdout.flush()
+    print(f"{MARKER} {json.dumps(timings)}", file=sys.stderr, flush=True)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:2]))
@@ -0,0 +1,14 @@
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# `import sandbox` chạy sandbox/config.py (kết nối Docker, MinIO...). Unit test chỉ cần các
+# module thuần (validation, excel_operations...), nên đăng ký package rỗng trỏ tới thư mục
+# sandbox/ để import thẳng submodule mà không chạy __init__.py.
+if "sandbox" not in sys.modules:
+    package = types.ModuleType("sandbox")
+    package.__path__ = [os.path.join(ROOT, "sandbox")]
+    sys.modules["sandbox"] = package
@@ -0,0 +1,112 @@
+import openpyxl
+from openpyxl.worksheet.table import Table
+
+from sandbox_runtime import excel_ops
+from sandbox_runtime.worksheet import delete_rows
+
+
+def _sheet(rows=10):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    ws.append(["Name", "Status", "Amount"])
+    for i in range(1, rows):
+        ws.append([f"item{i}", "Error" if i % 3 == 0 else "OK", i])
+    return wb, ws
+
+
+def test_values_match_deleting_one_row_at_a_time():
+    wb, ws = _sheet()
+    expected_wb, expected = _sheet()
+    for r in (9, 6, 3):
+        expected.delete_rows(r)
+    assert delete_rows(ws, [3, 6, 9, 6]) == 3
+    assert list(ws.values) == list(expected.values)
+    assert ws.max_row == expected.max_row
+
+
+def test_formulas_shift_on_same_and_other_sheets():
+    wb, ws = _sheet()
+    ws["E1"] = "=SUM(C2:C10)"
+    ws["E2"] = "=C7*2"
+    ws["E3"] = "=$C$8+C4"
+    ws["E4"] = "=C4"
+    other = wb.create_sheet("Other Sheet")
+    other["A1"] = "=Data!C9"
+    other["A2"] = "=SUM(Data!C2:C5)"
+    other["A3"] = "=C9"
+    wb.create_sheet("Back")["A1"] = "='Other Sheet'!A1"
+
+    delete_rows(ws, [4, 5])
+
+    assert ws["E1"].value == "=SUM(C2:C8)"
+    assert ws["E2"].value == "=C5*2"
+    assert ws["E3"].value == "=$C$6+#REF!"
+    # Dòng 4 đã bị xóa; dòng 6 cũ giờ là dòng 4
+    assert ws["E4"].value is None
+    assert other["A1"].value == "=Data!C7"
+    assert other["A2"].value == "=SUM(Data!C2:C3)"
+    # Không có tên sheet: trỏ tới chính sheet Other, không đổi
+    assert other["A3"].value == "=C9"
+    assert wb["Back"]["A1"].value == "='Other Sheet'!A1"
+
+
+def test_whole_row_reference_deleted_becomes_ref_error():
+    wb, ws = _sheet()
+    ws["F1"] = "=SUM(4:5)"
+    delete_rows(ws, [4, 5])
+    assert ws["F1"].value == "=SUM(#REF!)"
+
+
+def test_merged_cells_shift_shrink_and_disappear():
+    wb, ws = _sheet()
+    ws.merge_cells("D2:E3")   # trên dòng bị xóa: giữ nguyên
+    ws.merge_cells("D4:D7")   # chứa dòng bị xóa: co lại
+    ws.merge_cells("E5:E5")
+    ws.merge_cells("F8:G9")   # dưới dòng bị xóa: dời lên
+    ws.merge_cells("H5:H6")   # bị xóa hết
+    ws["D4"] = "merged"
+
+    delete_rows(ws, [5, 6])
+
+    assert sorted(str(r) for r in ws.merged_cells.ranges) == ["D2:E3", "D4:D5", "F6:G7"]
+    assert ws["D4"].value == "merged"
+
+
+def test_merge_starting_on_deleted_row_keeps_a_writable_top_left_cell():
+    wb, ws = _sheet()
+    ws.merge_cells("D3:D6")
+    delete_rows(ws, [3])
+    assert [str(r) for r in ws.merged_cells.ranges] == ["D3:D5"]
+    ws["D3"] = "ok"
+    assert ws["D3"].value == "ok"
+
+
+def test_table_and_auto_filter_refs_shrink(tmp_path):
+    wb, ws = _sheet()
+    table = Table(displayName="Items", ref="A1:C10")
+    ws.add_table(table)
+    other_wb, other = _sheet()
+    other.auto_filter.ref = "A1:C10"
+
+    delete_rows(ws, [2, 5, 10])
+    delete_rows(other, [3])
+
+    assert ws.tables["Items"].ref == "A1:C7"
+    assert other.auto_filter.ref == "A1:C9"
+    path = tmp_path / "table.xlsx"
+    wb.save(path)
+    assert openpyxl.load_workbook(path)["Data"].tables["Items"].ref == "A1:C7"
+
+
+def test_delete_matching_rows_with_fused_conditions():
+    wb, ws = _sheet()
+    ns = {"wb": wb, "ws": ws, "_headers": None}
+    excel_ops.delete_matching_rows(ns, {"type": "delete_rows", "conditions": [
+        {"column": "Status", "value": "Error"},
+        {"column": "Name", "value": "item1"},
+        {"column": "Missing", "value": "x"},
+    ]})
+    assert [row[0] for row in ws.iter_rows(min_row=2, values_only=True)] == [
+        "item2", "item4", "item5", "item7", "item8",
+    ]
@@ -0,0 +1,113 @@
+import copy
+
+import openpyxl
+import pytest
+from openpyxl.styles import Font, PatternFill
+
+from sandbox.excel_operations.plan import _fuse, _reorder, optimize_plan
+from sandbox_runtime import excel_ops
+from sandbox_runtime.worksheet import worksheet_to_frame
+
+
+def _workbook():
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    ws.append(["Name", "Status", "Amount"])
+    for i in range(1, 9):
+        ws.append([f"item{i}", "Error" if i % 3 == 0 else "OK", i * 10])
+    for cell in ws[1]:
+        cell.font = Font(bold=True)
+    for cell in ws[2]:
+        cell.fill = PatternFill("solid", fgColor="FFFF00")
+    return wb
+
+
+def _run(steps):
+    """Chạy các bước plan lên workbook mẫu như edit_workbook (không lưu file)."""
+    wb = _workbook()
+    ws = wb["Data"]
+    ns = {"wb": wb, "ws": ws, "df": worksheet_to_frame(ws), "_headers": None}
+    for step in steps:
+        excel_ops.OPERATIONS[step["type"]](ns, copy.deepcopy(step))
+        if step["type"] in excel_ops.HEADER_OPERATIONS:
+            ns["_headers"] = None
+    return _snapshot(wb)
+
+
+def _snapshot(wb):
+    sheets = {}
+    for ws in wb.worksheets:
+        sheets[ws.title] = [
+            [(c.value, c.font.b, c.fill.fgColor.rgb, c.number_format) for c in row]
+            for row in ws.iter_rows()
+        ]
+    return sheets
+
+
+def _update(row, column, value):
+    return {"type": "update_cell", "row": row, "column": column, "value": value}
+
+
+def _delete(column, value):
+    return {"type": "delete_rows", "column": column, "value": value}
+
+
+FILTER = {"type": "filter", "column": "Amount", "operator": ">", "value": 20}
+SUMMARY = {"type": "create_summary", "sheet_name": "Summary"}
+
+
+def test_fuse_merges_consecutive_update_cells():
+    steps = [_update(3, "A", 1), _update(4, "B", 2), FILTER, _update(5, "C", 3)]
+    assert _fuse(steps) == [
+        {"type": "update_cells", "cells": [
+            {"row": 3, "column": "A", "value": 1},
+            {"row": 4, "column": "B", "value": 2},
+        ]},
+        FILTER,
+        {"type": "update_cells", "cells": [{"row": 5, "column": "C", "value": 3}]},
+    ]
+
+
+def test_fuse_merges_delete_rows_conditions():
+    steps = [_delete("Status", "Error"), _delete("Name", "item1"), _update(3, "A", 1), _delete("Status", "OK")]
+    assert _fuse(steps) == [
+        {"type": "delete_rows", "conditions": [
+            {"column": "Status", "value": "Error"},
+            {"column": "Name", "value": "item1"},
+        ]},
+        {"type": "update_cells", "cells": [{"row": 3, "column": "A", "value": 1}]},
+        {"type": "delete_rows", "conditions": [{"column": "Status", "value": "OK"}]},
+    ]
+
+
+def test_reorder_moves_readers_after_cell_updates_below_row_2():
+    steps = [_update(3, "A", 1), FILTER, _update(5, "B", 2), SUMMARY, _update(7, "C", 3)]
+    assert _reorder(steps) == [_update(3, "A", 1), _update(5, "B", 2), _update(7, "C", 3), FILTER, SUMMARY]
+
+
+@pytest.mark.parametrize("barrier", [
+    _update(1, "A", "Renamed"),
+    _update(2, "C", 99),
+    _delete("Status", "Error"),
+    {"type": "add_row", "data": {"Name": "new"}, "position": None},
+    {"type": "add_row", "data": {"Name": "new"}, "position": 5},
+    {"type": "add_column", "name": "Double", "formula": "Amount * 2"},
+    {"type": "custom_code", "code": "pass"},
+])
+def test_reorder_keeps_barriers_in_place(barrier):
+    steps = [_update(3, "A", 1), FILTER, barrier, _update(5, "B", 2)]
+    assert _reorder(steps) == [_update(3, "A", 1), FILTER, barrier, _update(5, "B", 2)]
+
+
+@pytest.mark.parametrize("steps", [
+    [_update(3, "Amount", 1), FILTER, _update(5, "Amount", 2), _update(6, "Name", "x")],
+    [FILTER, _update(2, "Amount", 500), _update(4, "Amount", 7), SUMMARY],
+    [FILTER, _update(1, "Name", "Label"), _update(6, "Name", "y")],
+    [FILTER, _delete("Status", "Error"), _update(3, "Amount", 5), _delete("Name", "item1")],
+    [_delete("Name", "item1"), _delete("Status", "Error"), FILTER, _update(4, "Status", "Fixed")],
+    [SUMMARY, {"type": "add_row", "data": {"Name": "new", "Amount": 5}, "position": 2}, FILTER],
+    [FILTER, {"type": "add_row", "data": {"Name": "last", "Amount": 1}}, _update(3, "Amount", 8), SUMMARY],
+])
+def test_optimized_plan_matches_sequential(steps):
+    assert _run(optimize_plan(copy.deepcopy(steps))) == _run(steps)
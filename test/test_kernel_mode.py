@@ -0,0 +1,36 @@
+import asyncio
+import os
+import sys
+import uuid
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+async def main():
+    server_params = StdioServerParameters(
+        command=sys.executable,
+        args=[os.path.abspath("python_sandbox.py")],
+        env=os.environ.copy()
+    )
+    session_id = str(uuid.uuid4())[:8]
+
+    async with stdio_client(server_params) as (read, write), ClientSession(read, write) as session:
+        await session.initialize()
+
+        async def call(arguments):
+            print(f"\n>>> {arguments}")
+            result = await session.call_tool("python_sandbox", arguments=arguments)
+            print(*(c.text for c in result.content if hasattr(c, 'text')), sep="\n")
+
+        # 1. Biến toàn cục được giữ lại giữa các lần gọi
+        await call({"action": "execute", "session_id": session_id, "kernel": True,
+                    "code": "import pandas as pd\ncounter = 1\nprint('counter =', counter)"})
+        await call({"action": "execute", "session_id": session_id, "kernel": True,
+                    "code": "counter += 1\nprint('counter =', counter)  # mong đợi 2"})
+
+        # 2. Reset kernel thì trạng thái bị xóa
+        await call({"action": "reset_kernel", "session_id": session_id})
+        await call({"action": "execute", "session_id": session_id, "kernel": True,
+                    "code": "print('counter' in globals())  # mong đợi False"})
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+import openpyxl
+import pytest
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+from sandbox_runtime.styles import StyleCache, copy_cell_formatting
+
+
+def _styled_source():
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    # Vài style thừa để chỉ số trong StyleArray của B1 không tồn tại ở workbook mới
+    for i, color in enumerate(("FF0000", "00FF00", "0000FF"), start=1):
+        ws.cell(row=2, column=i).font = Font(color=color)
+    source = ws["B1"]
+    source.font = Font(name="Arial", bold=True, size=14)
+    source.fill = PatternFill("solid", fgColor="FFFF00")
+    source.border = Border(left=Side(style="thin"))
+    source.alignment = Alignment(horizontal="center")
+    source.number_format = "0.000%"
+    return wb, source
+
+
+def _style(cell):
+    return (cell.font.name, cell.font.b, cell.font.sz, cell.fill.fgColor.rgb,
+            cell.border.left.style, cell.alignment.horizontal, cell.number_format)
+
+
+@pytest.mark.parametrize("same_workbook", [True, False])
+def test_copy_cell_formatting(same_workbook):
+    wb, source = _styled_source()
+    target_wb = wb if same_workbook else openpyxl.Workbook()
+    target = target_wb.active["D5"]
+    copy_cell_formatting(source, target)
+    assert _style(target) == ("Arial", True, 14, "00FFFF00", "thin", "center", "0.000%")
+    if not same_workbook:
+        # Style mới thêm vào workbook đích không làm đổi style của ô đã copy
+        target_wb.active["D6"].font = Font(italic=True)
+        assert target_wb.active["D6"].font.i and not target.font.i
+
+
+@pytest.mark.parametrize("same_workbook", [True, False])
+def test_style_cache_with_number_format(same_workbook, tmp_path):
+    wb, source = _styled_source()
+    target_wb = wb if same_workbook else openpyxl.Workbook()
+    cache = StyleCache()
+    cells = [target_wb.active.cell(row=r, column=5) for r in range(3, 6)]
+    for cell in cells:
+        cache.copy(source, cell, "#,##0.00")
+    path = tmp_path / "out.xlsx"
+    target_wb.save(path)
+    reloaded = openpyxl.load_workbook(path).active
+    for cell in cells:
+        assert _style(reloaded[cell.coordinate]) == ("Arial", True, 14, "00FFFF00", "thin", "center", "#,##0.00")
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from sandbox.excel_operations import SCHEMAS as EXCEL_SCHEMAS
+from sandbox.validation import format_errors, validate_operations
+from sandbox.word_operations import SCHEMAS as WORD_SCHEMAS
+
+
+def _fields(errors):
+    return [(e["index"], e["field"]) for e in errors]
+
+
+@pytest.mark.parametrize("operations", [
+    [],
+    [{"type": "update_cell", "row": 2, "column": "A", "value": 1}],
+    [{"type": "update_cell", "row": 2, "column": 3, "value": None}],
+    [{"type": "filter", "column": "Age", "operator": "==", "value": "x"}],
+    [{"type": "add_row", "data": {"Name": "a"}}, {"type": "add_row", "data": {"Name": "b"}, "position": None}],
+    [{"type": "delete_rows", "column": "Status", "value": False}],
+    [{"type": "create_summary"}, {"type": "custom_code", "code": "ws['A1'] = 1"}],
+])
+def test_valid_excel_operations(operations):
+    assert validate_operations(operations, EXCEL_SCHEMAS) == []
+
+
+def test_required_fields():
+    errors = validate_operations([
+        {"type": "update_cell", "row": 2},
+        {"type": "add_column", "name": "Total"},
+        {"type": "filter", "column": "Age", "operator": ">"},
+    ], EXCEL_SCHEMAS)
+    assert _fields(errors) == [(0, "column"), (0, "value"), (1, "formula"), (2, "value")]
+    assert {e["error"] for e in errors} == {"is required"}
+
+
+@pytest.mark.parametrize("op, field, message", [
+    ({"type": "update_cell", "row": "2", "column": "A", "value": 1}, "row", "must be integer, got string"),
+    ({"type": "update_cell", "row": True, "column": "A", "value": 1}, "row", "must be integer, got boolean"),
+    ({"type": "update_cell", "row": 2.0, "column": "A", "value": 1}, "row", "must be integer, got number"),
+    ({"type": "update_cell", "row": 0, "column": "A", "value": 1}, "row", "must be >= 1"),
+    ({"type": "update_cell", "row": 2, "column": 0, "value": 1}, "column", "must be >= 1"),
+    ({"type": "update_cell", "row": 2, "column": ["A"], "value": 1}, "column", "must be string | integer, got array"),
+    ({"type": "update_cell", "row": 2, "column": "A", "value": {"x": 1}}, "value",
+     "must be string | integer | number | boolean | null, got object"),
+    ({"type": "filter", "column": "Age", "operator": ">=", "value": 1}, "operator",
+     "must be one of '>', '<', '==', '='"),
+    ({"type": "add_column", "name": "", "formula": "A + B"}, "name", "must not be empty"),
+    ({"type": "add_row", "data": {}}, "data", "must not be empty"),
+    ({"type": "add_row", "data": {"A": 1}, "position": 0}, "position", "must be >= 1"),
+])
+def test_type_and_value_mismatches(op, field, message):
+    assert validate_operations([op], EXCEL_SCHEMAS) == [
+        {"index": 0, "type": op["type"], "field": field, "error": message},
+    ]
+
+
+def test_word_ranges():
+    errors = validate_operations([
+        {"type": "insert_heading", "text": "Title", "level": 10},
+        {"type": "replace_paragraph", "index": -1, "new_text": "x"},
+        {"type": "replace", "old": "", "new": "x"},
+    ], WORD_SCHEMAS)
+    assert [(e["index"], e["field"], e["error"]) for e in errors] == [
+        (0, "level", "must be <= 9"),
+        (1, "index", "must be >= 0"),
+        (2, "old", "must not be empty"),
+    ]
+
+
+def test_unknown_operation_types_and_fields():
+    errors = validate_operations([
+        {"type": "rename_sheet", "name": "x"},
+        {"value": 1},
+        {"type": 3},
+        {"type": "replace", "old": "a", "new": "b", "count": 2},
+    ], WORD_SCHEMAS)
+    assert _fields(errors) == [(0, "type"), (1, "type"), (2, "type"), (3, "count")]
+    assert errors[0]["error"].startswith("unknown operation type, expected one of ")
+    assert "replace_paragraph" in errors[0]["error"]
+    assert errors[3]["error"] == "unknown field, expected old, new"
+
+
+def test_operations_must_be_a_list_of_objects():
+    assert validate_operations({"type": "replace"}, WORD_SCHEMAS) == [
+        {"index": None, "type": None, "field": "operations", "error": "must be an array"},
+    ]
+    assert validate_operations(["replace"], WORD_SCHEMAS) == [
+        {"index": 0, "type": None, "field": None, "error": "operation must be an object, got string"},
+    ]
+
+
+def test_every_error_is_reported():
+    errors = validate_operations([
+        {"type": "update_cell", "row": -1, "colum": "A", "value": 1},
+        {"type": "delete_rows", "column": "Status", "value": "x"},
+        {"type": "nope"},
+    ], EXCEL_SCHEMAS)
+    assert _fields(errors) == [(0, "row"), (0, "column"), (0, "colum"), (2, "type")]
+
+
+def test_format_errors_lists_one_json_error_per_line():
+    errors = validate_operations([{"type": "update_cell", "row": 2}], EXCEL_SCHEMAS)
+    lines = format_errors(errors).splitlines()
+    assert lines[0] == "Lỗi: 2 lỗi trong operations, chưa chạy operation nào:"
+    assert [json.loads(line) for line in lines[1:]] == errors
@@ -0,0 +1,121 @@
+import random
+
+import pytest
+from docx import Document
+
+from sandbox_runtime.word_ops import _passes, replace_text
+
+
+def _document(*paragraphs):
+    """Document có mỗi paragraph là một list run (chuỗi), để chỗ khớp có thể vắt qua nhiều w:t."""
+    doc = Document()
+    for runs in paragraphs:
+        paragraph = doc.add_paragraph()
+        for text in runs:
+            paragraph.add_run(text)
+    return doc
+
+
+def _texts(doc):
+    return [p.text for p in doc.paragraphs]
+
+
+def _sequential(text, pairs):
+    counts = []
+    for old, new in pairs:
+        counts.append(text.count(old))
+        text = text.replace(old, new)
+    return text, counts
+
+
+def test_independent_pairs_share_one_pass():
+    doc = _document(["black cat, brown dog"], ["dog", "cat"])
+    counts, passes, changed = replace_text(doc, [("cat", "CAT"), ("dog", "DOG"), ("owl", "OWL")])
+    assert _texts(doc) == ["black CAT, brown DOG", "DOGCAT"]
+    assert (counts, passes, changed) == ([2, 2, 0], 1, 2)
+
+
+@pytest.mark.parametrize("pairs", [
+    [("cat", "dog"), ("dog", "cow")],          # thay vào text vừa được thay
+    [("ab", "x"), ("b", "y")],                 # old chứa old khác
+    [("b", "y"), ("abc", "z")],
+    [("abc", "1"), ("cd", "2")],               # hai old chồng lấn một phần
+    [("x", ""), ("ab", "Q")],                  # xóa làm hai phía chỗ khớp liền nhau
+    [("a", "b"), ("b", "a")],                  # hoán đổi
+])
+def test_conflicting_patterns_match_sequential_replace(pairs):
+    text = "cat dog abcd axb abc ba"
+    doc = _document([text])
+    counts, passes, _ = replace_text(doc, pairs)
+    expected, expected_counts = _sequential(text, pairs)
+    assert _texts(doc) == [expected]
+    assert counts == expected_counts
+    assert passes == len(_passes(pairs)) > 1
+
+
+def test_random_pairs_match_one_at_a_time_replace():
+    rng = random.Random(0)
+    for _ in range(300):
+        text = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 30)))
+        pairs = [
+            ("".join(rng.choice("abc") for _ in range(rng.randint(1, 3))),
+             "".join(rng.choice("abc") for _ in range(rng.randint(0, 3))))
+            for _ in range(rng.randint(1, 4))
+        ]
+        # Chia text thành vài run để chỗ khớp có thể vắt qua ranh giới run
+        cuts = sorted(rng.sample(range(len(text) + 1), min(3, len(text) + 1)))
+        runs = [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+        doc = _document(runs)
+        counts, _, _ = replace_text(doc, pairs)
+        expected, expected_counts = _sequential(text, pairs)
+        assert (_texts(doc), counts) == ([expected], expected_counts), (runs, pairs)
+
+
+def test_match_spanning_runs_keeps_formatting_of_other_runs():
+    doc = _document(["Hello Wo", "rl", "d and more"])
+    runs = doc.paragraphs[0].runs
+    runs[0].bold = True
+    runs[2].italic = True
+    counts, _, _ = replace_text(doc, [("World", "Earth")])
+    runs = doc.paragraphs[0].runs
+    assert counts == [1]
+    # Text thay thế nằm ở run chứa ký tự đầu tiên của chỗ khớp
+    assert [r.text for r in runs] == ["Hello Earth", "", " and more"]
+    assert runs[0].bold and runs[2].italic
+
+
+def test_matches_do_not_cross_tabs_or_breaks():
+    doc = Document()
+    paragraph = doc.add_paragraph()
+    paragraph.add_run("foo")
+    paragraph.add_run().add_tab()
+    paragraph.add_run("bar")
+    counts, _, _ = replace_text(doc, [("foobar", "X"), ("bar", "baz")])
+    assert counts == [0, 1]
+    assert paragraph.text == "foo\tbaz"
+
+
+def test_tables_headers_and_footers_are_replaced():
+    doc = Document()
+    cell = doc.add_table(rows=1, cols=1).cell(0, 0)
+    cell.paragraphs[0].add_run("inner {name}")
+    cell.add_table(rows=1, cols=1).cell(0, 0).paragraphs[0].add_run("nested {name}")
+    section = doc.sections[0]
+    section.header.paragraphs[0].add_run("head {name}")
+    section.footer.paragraphs[0].add_run("foot {name}")
+
+    counts, passes, changed = replace_text(doc, [("{name}", "ACME")])
+
+    assert counts == [4] and passes == 1 and changed == 4
+    assert cell.paragraphs[0].text == "inner ACME"
+    assert cell.tables[0].cell(0, 0).paragraphs[0].text == "nested ACME"
+    assert section.header.paragraphs[0].text == "head ACME"
+    assert section.footer.paragraphs[0].text == "foot ACME"
+
+
+def test_leading_and_trailing_spaces_are_preserved():
+    doc = _document(["x"])
+    replace_text(doc, [("x", "  padded  ")])
+    t = doc.paragraphs[0].runs[0]._r.t_lst[0]
+    assert t.text == "  padded  "
+    assert t.get("{http://www.w3.org/XML/1998/namespace}space") == "preserve"